@@ -0,0 +1,70 @@
+from auth.verified_token_cache import VerifiedTokenCache
+from helpers.single_flight import SingleFlight
+from threading import Lock
+from typing import Callable, Optional
+import time
+
+
+class IntrospectionCache(VerifiedTokenCache):
+    """
+    Resultados de la introspección de Keycloak por digest del token: los tokens
+    activos valen hasta su exp (como mucho max_ttl) y los inactivos negative_ttl.
+    Los hilos que introspeccionan a la vez el mismo token comparten la llamada
+    """
+    def __init__(self, max_entries: int = 10000, max_ttl: float = 60, negative_ttl: float = 10,
+                 clock=time.time):
+        super().__init__(max_entries=max_entries, max_ttl=max_ttl, clock=clock)
+        self.negative_ttl = negative_ttl
+        self._flight = SingleFlight()
+
+    def get_or_load(self, token: str, loader: Callable[[str], Optional[dict]]) -> Optional[dict]:
+        """
+        Devuelve la respuesta de introspección cacheada o la obtiene con loader(token),
+        que devuelve la respuesta de Keycloak o lanza una excepción (los errores no se cachean)
+        """
+        info = self.get(token)
+        if info is not None:
+            return info if info.get('active') else None
+
+        info = self._flight.do(self.digest(token), lambda: self._load(token, loader))
+        return dict(info) if info.get('active') else None
+
+    def _load(self, token: str, loader) -> dict:
+        started = time.perf_counter()
+        info = loader(token) or {}
+        self.record_verification(time.perf_counter() - started)
+
+        if info.get('active'):
+            self.put(token, info)
+        elif self.negative_ttl > 0:
+            self._entries.set(self.digest(token), {'active': False}, self.negative_ttl)
+        return info
+
+    def stats(self) -> dict:
+        stats = super().stats()
+        stats.update({
+            'negative_ttl_seconds': self.negative_ttl,
+            'coalesced_lookups': self._flight.shared
+        })
+        return stats
+
+
+_introspection_cache = None
+_introspection_cache_lock = Lock()
+
+def get_introspection_cache(app) -> IntrospectionCache:
+    """Caché de introspección del proceso, creada la primera vez"""
+    global _introspection_cache
+    with _introspection_cache_lock:
+        if _introspection_cache is None:
+            _introspection_cache = IntrospectionCache(
+                max_entries = int(app.config.get('INTROSPECTION_CACHE_MAX_ENTRIES', 10000)),
+                max_ttl = float(app.config.get('INTROSPECTION_CACHE_MAX_TTL_SECONDS', 60)),
+                negative_ttl = float(app.config.get('INTROSPECTION_CACHE_NEGATIVE_TTL_SECONDS', 10))
+            )
+        return _introspection_cache
+
+def reset_introspection_cache():
+    global _introspection_cache
+    with _introspection_cache_lock:
+        _introspection_cache = None
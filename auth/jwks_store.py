@@ -0,0 +1,188 @@
+from helpers.single_flight import SingleFlight
+from jose import jwk
+from threading import Lock, Timer
+from typing import Callable, Optional
+import requests
+import logging
+import time
+
+logger = logging.getLogger(__name__)
+
+
+class UnknownKeyError(Exception):
+    """El kid del token no está en el JWKS de Keycloak"""
+    pass
+
+
+class JWKSStore:
+    """
+    Claves públicas de Keycloak indexadas por kid, ya construidas para verificar.
+    Se refrescan en segundo plano cada ttl segundos (si el refresco falla se
+    mantienen las anteriores). Ante un kid desconocido, p.ej. tras rotar las
+    claves, se vuelve a descargar el JWKS una sola vez para todos los hilos y
+    como mucho una vez cada min_refetch_interval
+    """
+    def __init__(self, jwks_url: str, ttl: float = 3600, min_refetch_interval: float = 30,
+                 timeout: float = 10, clock: Callable[[], float] = time.monotonic):
+        self.jwks_url = jwks_url
+        self.ttl = ttl
+        self.min_refetch_interval = min_refetch_interval
+        self.timeout = timeout
+        self._clock = clock
+        self._keys = {} # kid -> clave construida
+        self._jwks = None
+        self._fetched_at = None
+        self._last_attempt = None
+        self._lock = Lock()
+        self._flight = SingleFlight()
+        self._timer = None
+        self._closed = False
+
+        # Métricas
+        self.fetches = 0
+        self.fetch_errors = 0
+        self.unknown_kid_refetches = 0
+        self.rate_limited = 0
+
+    @classmethod
+    def from_config(cls, config) -> 'JWKSStore':
+        keycloak_url = config.get('KEYCLOAK_SERVER_URL', 'http://keycloak:8080')
+        realm = config.get('KEYCLOAK_REALM', 'undersounds')
+        return cls(
+            f"{keycloak_url}/realms/{realm}/protocol/openid-connect/certs",
+            ttl = float(config.get('JWKS_TTL_SECONDS', 3600)),
+            min_refetch_interval = float(config.get('JWKS_MIN_REFETCH_INTERVAL_SECONDS', 30)),
+            timeout = float(config.get('JWKS_FETCH_TIMEOUT_SECONDS', 10))
+        )
+
+    def warm_up(self) -> bool:
+        """Descarga el JWKS al arrancar para que la primera petición no pague la descarga"""
+        try:
+            self.refresh()
+            return True
+        except Exception as e:
+            logger.warning(f"No se pudo precargar el JWKS: {e}")
+            return False
+
+    def get_key(self, kid: str):
+        with self._lock:
+            key = self._keys.get(kid)
+            if key is not None:
+                return key
+            loaded = self._fetched_at is not None
+            now = self._clock()
+            if self._last_attempt is not None and now - self._last_attempt < self.min_refetch_interval:
+                self.rate_limited += 1
+                raise UnknownKeyError(f"No se encontró clave pública para kid: {kid}")
+            if loaded:
+                self.unknown_kid_refetches += 1
+
+        self.refresh()
+
+        with self._lock:
+            key = self._keys.get(kid)
+        if key is None:
+            raise UnknownKeyError(f"No se encontró clave pública para kid: {kid}. Claves disponibles: {list(self._keys)}")
+        return key
+
+    def jwks(self) -> dict:
+        """JWKS tal como lo devuelve Keycloak (descargándolo si aún no se tiene)"""
+        with self._lock:
+            jwks = self._jwks
+        if jwks is None:
+            self.refresh()
+            with self._lock:
+                jwks = self._jwks
+        return jwks
+
+    def refresh(self):
+        """Descarga el JWKS; las llamadas concurrentes comparten la misma descarga"""
+        self._flight.do('jwks', self._fetch)
+
+    def _fetch(self):
+        with self._lock:
+            self._last_attempt = self._clock()
+        try:
+            logger.info(f"Obteniendo JWKS desde: {self.jwks_url}")
+            response = requests.get(self.jwks_url, timeout=self.timeout)
+            response.raise_for_status()
+            jwks = response.json()
+
+            keys = {}
+            for key_data in jwks.get('keys', []):
+                kid = key_data.get('kid')
+                if not kid or key_data.get('use', 'sig') != 'sig':
+                    continue
+                try:
+                    keys[kid] = jwk.construct(key_data, algorithm=key_data.get('alg', 'RS256'))
+                except Exception as e:
+                    logger.warning(f"Clave {kid} del JWKS no válida: {e}")
+        except Exception as e:
+            with self._lock:
+                self.fetch_errors += 1
+                self._schedule_refresh(self.min_refetch_interval) # Se reintenta antes que el ttl
+            logger.error(f"Error obteniendo JWKS: {e}")
+            raise Exception(f"No se puede obtener JWKS: {str(e)}")
+
+        with self._lock:
+            self._keys = keys
+            self._jwks = jwks
+            self._fetched_at = self._clock()
+            self.fetches += 1
+            self._schedule_refresh(self.ttl)
+        logger.info(f"JWKS obtenido correctamente: {len(keys)} claves")
+
+    def _schedule_refresh(self, delay: float):
+        """Programa el siguiente refresco en segundo plano (con el lock tomado)"""
+        if self._closed or delay <= 0:
+            return
+        if self._timer is not None:
+            self._timer.cancel()
+        self._timer = Timer(delay, self._background_refresh)
+        self._timer.daemon = True
+        self._timer.start()
+
+    def _background_refresh(self):
+        try:
+            self.refresh()
+        except Exception:
+            pass # Ya registrado; se siguen usando las claves anteriores
+
+    def stats(self) -> dict:
+        with self._lock:
+            return {
+                'keys': sorted(self._keys),
+                'age_seconds': round(self._clock() - self._fetched_at, 1) if self._fetched_at is not None else None,
+                'ttl_seconds': self.ttl,
+                'fetches': self.fetches,
+                'fetch_errors': self.fetch_errors,
+                'unknown_kid_refetches': self.unknown_kid_refetches,
+                'rate_limited_refetches': self.rate_limited,
+                'coalesced_fetches': self._flight.shared
+            }
+
+    def shutdown(self):
+        with self._lock:
+            self._closed = True
+            if self._timer is not None:
+                self._timer.cancel()
+                self._timer = None
+
+
+_jwks_store = None
+_jwks_store_lock = Lock()
+
+def get_jwks_store(app) -> JWKSStore:
+    """Almacén de claves del proceso, creado la primera vez"""
+    global _jwks_store
+    with _jwks_store_lock:
+        if _jwks_store is None:
+            _jwks_store = JWKSStore.from_config(app.config)
+        return _jwks_store
+
+def reset_jwks_store():
+    global _jwks_store
+    with _jwks_store_lock:
+        if _jwks_store is not None:
+            _jwks_store.shutdown()
+        _jwks_store = None
@@ -1,5 +1,6 @@
 import requests
 from flask import current_app
+from auth.introspection_cache import get_introspection_cache
 import logging
 from typing import Optional, Dict
 
@@ -11,8 +12,15 @@ class KeycloakService:
         self.realm = app.config.get('KEYCLOAK_REALM')
         self.client_id = app.config.get('KEYCLOAK_CLIENT_ID')
         self.client_secret = app.config.get('KEYCLOAK_CLIENT_SECRET')
+        self.introspection_cache = get_introspection_cache(app)
 
-    def _get_token(self, client_id, client_secret) -> Optional[Dict]:
+    def _get_token(self, client_id, client_secret) -> Optional[str]:
+        """Obtener únicamente el access_token del servicio"""
+        token_data = self.get_token_data(client_id, client_secret)
+        return token_data['access_token'] if token_data else None
+
+    def get_token_data(self, client_id, client_secret) -> Optional[Dict]:
+        """Obtener la respuesta completa del endpoint de token (incluye expires_in)"""
         try:
 
             token_url = f"{self.server_url}/realms/{self.realm}/protocol/openid-connect/token"
@@ -37,36 +45,40 @@ class KeycloakService:
             if response.status_code != 200:
                 raise Exception(f"Error obteniendo token del servicio: {response.text}")
             
-            token_data = response.json()
-
-            return token_data['access_token']
+            return response.json()
             
         except requests.exceptions.RequestException as e:
             logger.error(f"Error obteniendo token de Keycloak: {e}")
             return None    
         
-    def validate_token(self, token: str) -> Optional[Dict]:
-        """Validar JWT token"""
+    def validate_token(self, token: str, use_cache: bool = True) -> Optional[Dict]:
+        """Validar token (JWT u opaco) por introspección; el resultado se cachea hasta su exp"""
         try:
-            introspect_url = f"{self.server_url}/realms/{self.realm}/protocol/openid-connect/token/introspect"
-            
-            payload = {
-                'token': token,
-                'client_id': self.client_id,
-                'client_secret': self.client_secret
-            }
-            
-            response = requests.post(
-                introspect_url,
-                data=payload,
-                headers={'Content-Type': 'application/x-www-form-urlencoded'},
-                timeout=5
-            )
-            response.raise_for_status()
-            
-            token_info = response.json()
-            return token_info if token_info.get('active') else None
+            if not use_cache or self.introspection_cache is None:
+                token_info = self.introspect_token(token)
+                return token_info if token_info.get('active') else None
+            return self.introspection_cache.get_or_load(token, self.introspect_token)
             
         except requests.exceptions.RequestException as e:
             logger.error(f"Error validando token: {e}")
-            return None    
\ No newline at end of file
+            return None
+
+    def introspect_token(self, token: str) -> Dict:
+        """Llamada al endpoint de introspección de Keycloak (sin caché)"""
+        introspect_url = f"{self.server_url}/realms/{self.realm}/protocol/openid-connect/token/introspect"
+        
+        payload = {
+            'token': token,
+            'client_id': self.client_id,
+            'client_secret': self.client_secret
+        }
+        
+        response = requests.post(
+            introspect_url,
+            data=payload,
+            headers={'Content-Type': 'application/x-www-form-urlencoded'},
+            timeout=5
+        )
+        response.raise_for_status()
+        
+        return response.json()
@@ -0,0 +1,172 @@
+from auth.keycloak_service import KeycloakService
+from helpers.single_flight import SingleFlight
+from jose import jwt
+from threading import Lock, Timer
+from typing import Optional
+import logging
+import time
+
+logger = logging.getLogger(__name__)
+
+# Margen para no enviar tokens a punto de caducar
+EXPIRY_SKEW_SECONDS = 5
+# Vida asumida si Keycloak no informa ni expires_in ni exp
+DEFAULT_TOKEN_TTL_SECONDS = 60
+
+
+class ServiceTokenManager:
+    """
+    Token de servicio (client_credentials) compartido por todos los clientes.
+    Conoce la expiración del token, lo renueva en segundo plano antes de que
+    caduque y agrupa las peticiones concurrentes en una única llamada a Keycloak.
+    """
+    def __init__(self, keycloak_service, client_id: str, client_secret: str,
+                 refresh_margin: float = 30, min_refresh_interval: float = 5):
+        self.keycloak_service = keycloak_service
+        self.client_id = client_id
+        self.client_secret = client_secret
+        self.refresh_margin = refresh_margin
+        self.min_refresh_interval = min_refresh_interval
+
+        self._token = None
+        self._expires_at = 0.0
+        self._lock = Lock()
+        self._flight = SingleFlight()
+        self._timer = None
+        self._closed = False
+
+        # Métricas
+        self._refreshes = 0
+        self._background_refreshes = 0
+        self._failures = 0
+        self._total_latency_ms = 0.0
+        self._last_latency_ms = None
+        self._max_latency_ms = 0.0
+
+    def get_token(self) -> Optional[str]:
+        """Devuelve el token vigente o lo obtiene si no hay ninguno válido"""
+        with self._lock:
+            if self._token and time.time() < self._expires_at - EXPIRY_SKEW_SECONDS:
+                return self._token
+        return self._refresh()
+
+    def force_refresh(self, rejected_token: Optional[str] = None) -> Optional[str]:
+        """
+        Fuerza la renovación tras un 401. Si otro hilo ya renovó el token
+        rechazado, se devuelve el nuevo sin volver a llamar a Keycloak
+        """
+        with self._lock:
+            if rejected_token and self._token and self._token != rejected_token:
+                return self._token
+            self._expires_at = 0.0
+        return self._refresh()
+
+    def _refresh(self) -> Optional[str]:
+        return self._flight.do('service-token', self._fetch_token)
+
+    def _fetch_token(self) -> Optional[str]:
+        start = time.monotonic()
+        try:
+            token_data = self.keycloak_service.get_token_data(self.client_id, self.client_secret)
+        except Exception as e:
+            logger.error(f"Error renovando el token de servicio: {e}")
+            token_data = None
+        latency_ms = (time.monotonic() - start) * 1000
+
+        with self._lock:
+            self._last_latency_ms = round(latency_ms, 2)
+            self._total_latency_ms += latency_ms
+            self._max_latency_ms = max(self._max_latency_ms, latency_ms)
+
+            if not isinstance(token_data, dict) or not token_data.get('access_token'):
+                self._failures += 1
+                # Se mantiene el token anterior mientras siga siendo válido
+                current = self._token if time.time() < self._expires_at else None
+                if current:
+                    self._schedule_refresh(time.time() + self.min_refresh_interval + self.refresh_margin)
+                return current
+
+            self._refreshes += 1
+            self._token = token_data['access_token']
+            self._expires_at = self._compute_expiry(token_data, self._token)
+            self._schedule_refresh(self._expires_at)
+            return self._token
+
+    @staticmethod
+    def _compute_expiry(token_data: dict, token: str) -> float:
+        """Instante de expiración a partir de expires_in o, en su defecto, del claim exp"""
+        expires_in = token_data.get('expires_in')
+        if expires_in:
+            return time.time() + float(expires_in)
+        try:
+            exp = jwt.get_unverified_claims(token).get('exp')
+            if exp:
+                return float(exp)
+        except Exception:
+            pass
+        return time.time() + DEFAULT_TOKEN_TTL_SECONDS
+
+    def _schedule_refresh(self, expires_at: float):
+        """Programa la renovación en segundo plano antes de la expiración (con el lock tomado)"""
+        if self._closed:
+            return
+        if self._timer is not None:
+            self._timer.cancel()
+        delay = max(expires_at - self.refresh_margin - time.time(), self.min_refresh_interval)
+        self._timer = Timer(delay, self._background_refresh)
+        self._timer.daemon = True
+        self._timer.start()
+
+    def _background_refresh(self):
+        with self._lock:
+            self._background_refreshes += 1
+        self._refresh()
+
+    def stats(self) -> dict:
+        with self._lock:
+            return {
+                'refreshes': self._refreshes,
+                'background_refreshes': self._background_refreshes,
+                'failures': self._failures,
+                'last_latency_ms': self._last_latency_ms,
+                'avg_latency_ms': round(self._total_latency_ms / (self._refreshes + self._failures), 2)
+                    if self._refreshes + self._failures else None,
+                'max_latency_ms': round(self._max_latency_ms, 2),
+                'expires_in_seconds': round(max(self._expires_at - time.time(), 0), 1) if self._token else None,
+                'coalesced_requests': self._flight.shared
+            }
+
+    def shutdown(self):
+        with self._lock:
+            self._closed = True
+            if self._timer is not None:
+                self._timer.cancel()
+                self._timer = None
+
+
+_token_manager = None
+_token_manager_lock = Lock()
+
+def get_token_manager(app) -> ServiceTokenManager:
+    """Devuelve el gestor de tokens del proceso, creándolo la primera vez"""
+    global _token_manager
+    with _token_manager_lock:
+        if _token_manager is None:
+            if not app.config.get('KEYCLOAK_SERVICE_CLIENT_SECRET'):
+                logger.error("KEYCLOAK_SERVICE_CLIENT_SECRET no configurado: Keycloak rechazará el token de servicio")
+            _token_manager = ServiceTokenManager(
+                KeycloakService(app),
+                client_id = app.config.get('KEYCLOAK_SERVICE_CLIENT_ID', 'content-service'),
+                client_secret = app.config.get('KEYCLOAK_SERVICE_CLIENT_SECRET'),
+                refresh_margin = float(app.config.get('TOKEN_REFRESH_MARGIN_SECONDS', 30)),
+                min_refresh_interval = float(app.config.get('TOKEN_MIN_REFRESH_INTERVAL_SECONDS', 5))
+            )
+        return _token_manager
+
+def reset_token_manager():
+    """Detiene y descarta el gestor actual (apagado del proceso y tests)"""
+    global _token_manager
+    with _token_manager_lock:
+        if _token_manager is not None:
+            _token_manager.shutdown()
+        _token_manager = None
@@ -0,0 +1,78 @@
+from helpers.ttl_cache import TTLCache
+from threading import Lock
+from typing import Optional
+import hashlib
+import time
+
+
+class VerifiedTokenCache:
+    """
+    Claims de los JWT ya verificados, indexados por el SHA-256 del token (nunca
+    se guarda el token). Cada entrada vale hasta el exp del token y como mucho
+    max_ttl segundos; los roles se siguen comprobando en cada endpoint
+    """
+    def __init__(self, max_entries: int = 10000, max_ttl: float = 300, clock=time.time):
+        self.max_ttl = max_ttl
+        self._clock = clock
+        self._entries = TTLCache(max_entries=max_entries, default_ttl=max_ttl)
+        self._lock = Lock()
+
+        # Coste de las verificaciones completas (firma RS256)
+        self.verifications = 0
+        self._total_verify_ms = 0.0
+        self._max_verify_ms = 0.0
+
+    @staticmethod
+    def digest(token: str) -> str:
+        return hashlib.sha256(token.encode('utf-8')).hexdigest()
+
+    def get(self, token: str) -> Optional[dict]:
+        claims = self._entries.get(self.digest(token))
+        return dict(claims) if claims is not None else None
+
+    def put(self, token: str, claims: dict):
+        exp = claims.get('exp')
+        ttl = self.max_ttl if exp is None else min(float(exp) - self._clock(), self.max_ttl)
+        if ttl > 0:
+            self._entries.set(self.digest(token), dict(claims), ttl)
+
+    def record_verification(self, elapsed_seconds: float):
+        elapsed_ms = elapsed_seconds * 1000
+        with self._lock:
+            self.verifications += 1
+            self._total_verify_ms += elapsed_ms
+            self._max_verify_ms = max(self._max_verify_ms, elapsed_ms)
+
+    def clear(self):
+        self._entries.clear()
+
+    def stats(self) -> dict:
+        stats = self._entries.stats()
+        with self._lock:
+            stats.update({
+                'max_ttl_seconds': self.max_ttl,
+                'verifications': self.verifications,
+                'avg_verify_ms': round(self._total_verify_ms / self.verifications, 3) if self.verifications else None,
+                'max_verify_ms': round(self._max_verify_ms, 3)
+            })
+        return stats
+
+
+_verified_token_cache = None
+_verified_token_cache_lock = Lock()
+
+def get_verified_token_cache(app) -> VerifiedTokenCache:
+    """Caché de tokens verificados del proceso, creada la primera vez"""
+    global _verified_token_cache
+    with _verified_token_cache_lock:
+        if _verified_token_cache is None:
+            _verified_token_cache = VerifiedTokenCache(
+                max_entries = int(app.config.get('JWT_CACHE_MAX_ENTRIES', 10000)),
+                max_ttl = float(app.config.get('JWT_CACHE_MAX_TTL_SECONDS', 300))
+            )
+        return _verified_token_cache
+
+def reset_verified_token_cache():
+    global _verified_token_cache
+    with _verified_token_cache_lock:
+        _verified_token_cache = None
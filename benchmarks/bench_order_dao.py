@@ -0,0 +1,174 @@
+"""
+Benchmark de lectura de OrderDAO.get_all y OrderDAO.find_by_filter con cada driver de MariaDB.
+
+Siembra (una vez) compras deterministas del usuario bench-user y mide filas/s con cada URI.
+Usar contra una base de datos dedicada:
+
+    python benchmarks/bench_order_dao.py --url mariadb+mariadbconnector://user:pw@localhost/orders_bench
+    python benchmarks/bench_order_dao.py --orders 5000 --output bench_output.txt
+
+Sin --url se compara DATABASE_URL con cada driver de DB_DRIVERS.
+"""
+import argparse
+import os
+import random
+import statistics
+import sys
+import time
+import uuid
+from datetime import datetime, timedelta
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from flask import Flask
+from config import Config
+from db import db
+from dao.order_dao import OrderDAO
+from model.order_model_ import Order, OrderItem, OrderStatus
+from helpers.db_pool import DB_DRIVERS, database_uri_for_driver, engine_options_from_env
+
+BENCH_USER = 'bench-user'
+SELLERS = [f'bench-seller-{i}' for i in range(10)]
+
+
+def make_app(database_uri: str) -> Flask:
+    app = Flask(__name__)
+    app.config.from_object(Config)
+    app.config['SQLALCHEMY_DATABASE_URI'] = database_uri
+    app.config['SQLALCHEMY_ENGINE_OPTIONS'] = engine_options_from_env(database_uri)
+    db.init_app(app)
+    return app
+
+
+def seed(orders: int, items_per_order: int, seed_value: int):
+    """Crea las compras de prueba si aún no existen (mismo contenido en cada ejecución)"""
+    db.create_all()
+    existing = Order.query.filter_by(made_by_username = BENCH_USER).count()
+    if existing >= orders:
+        return existing
+
+    rnd = random.Random(seed_value)
+    statuses = list(OrderStatus)
+    start = datetime(2025, 1, 1)
+    for n in range(existing, orders):
+        order = Order(
+            public_id = str(uuid.UUID(int = rnd.getrandbits(128))),
+            made_by_username = BENCH_USER,
+            status = statuses[n % len(statuses)],
+            total = 0,
+            created_at = start + timedelta(minutes = n)
+        )
+        for _ in range(items_per_order):
+            seller = rnd.choice(SELLERS)
+            price = rnd.randint(5, 50)
+            quantity = rnd.randint(1, 3)
+            order.items.append(OrderItem(
+                product_public_id = str(uuid.UUID(int = rnd.getrandbits(128))),
+                product_name = f'Producto {rnd.randint(1, 10000)}',
+                product_image_src = 'https://cdn.example.com/bench.jpg',
+                product_description = 'x' * 200,
+                seller_username = seller,
+                seller_name = seller.title(),
+                seller_pfp = 'https://cdn.example.com/pfp.jpg',
+                price = price,
+                quantity = quantity,
+                total = price * quantity
+            ))
+            order.total += price * quantity
+        db.session.add(order)
+        if n % 500 == 0:
+            db.session.commit()
+    db.session.commit()
+    return orders
+
+
+def measure(name: str, call, repeat: int, warmup: int) -> dict:
+    """Mediana de repeat ejecuciones de call() -> filas leídas; la sesión se limpia entre ejecuciones"""
+    for _ in range(warmup):
+        call()
+        db.session.remove()
+
+    durations, rows = [], 0
+    for _ in range(repeat):
+        started = time.perf_counter()
+        rows = call()
+        durations.append(time.perf_counter() - started)
+        db.session.remove() # Sin identity map: cada ejecución vuelve a construir los objetos
+    median = statistics.median(durations)
+    return {
+        'case': name,
+        'rows': rows,
+        'median_ms': round(median * 1000, 2),
+        'p90_ms': round(sorted(durations)[int(len(durations) * 0.9) - 1] * 1000, 2),
+        'rows_per_s': round(rows / median) if median else None
+    }
+
+
+def _rows(orders) -> int:
+    return sum(1 + len(order.items) for order in orders)
+
+
+def run(database_uri: str, args) -> list:
+    app = make_app(database_uri)
+    with app.app_context():
+        seed(args.orders, args.items, args.seed)
+
+        def get_all():
+            orders, _, _ = OrderDAO.get_all(args.page_size, 0)
+            return _rows(orders)
+
+        def filter_by_seller():
+            orders, _, _ = OrderDAO.find_by_filter(seller = SELLERS[0], page = 0, size = args.page_size)
+            return _rows(orders)
+
+        def filter_by_status():
+            orders, _, _ = OrderDAO.find_by_filter(status = OrderStatus.PAID.value, page = 0, size = args.page_size)
+            return _rows(orders)
+
+        results = [measure(name, call, args.repeat, args.warmup) for name, call in [
+            ('get_all', get_all),
+            ('find_by_filter(seller)', filter_by_seller),
+            ('find_by_filter(status)', filter_by_status)
+        ]]
+        db.engine.dispose()
+    return results
+
+
+def main():
+    parser = argparse.ArgumentParser(description = __doc__, formatter_class = argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--url', action = 'append', help = 'URI de SQLAlchemy (repetible)')
+    parser.add_argument('--orders', type = int, default = 2000)
+    parser.add_argument('--items', type = int, default = 3, help = 'Items por compra')
+    parser.add_argument('--page-size', type = int, default = 500)
+    parser.add_argument('--repeat', type = int, default = 20)
+    parser.add_argument('--warmup', type = int, default = 3)
+    parser.add_argument('--seed', type = int, default = 42)
+    parser.add_argument('--output', help = 'Fichero donde añadir también los resultados')
+    args = parser.parse_args()
+
+    base_uri = os.getenv("DATABASE_URL", Config.SQLALCHEMY_DATABASE_URI)
+    uris = args.url or [database_uri_for_driver(base_uri, driver) for driver in DB_DRIVERS]
+
+    lines = [f"# {datetime.now().isoformat()} orders={args.orders} items={args.items} "
+             f"page_size={args.page_size} repeat={args.repeat} python={sys.version.split()[0]}"]
+    for uri in uris:
+        label = uri.split('://', 1)[0]
+        try:
+            results = run(uri, args)
+        except ModuleNotFoundError as e:
+            lines.append(f"{label:28} omitido: driver no instalado ({e.name})")
+            continue
+        for result in results:
+            lines.append(f"{label:28} {result['case']:24} rows={result['rows']:<6} "
+                         f"median={result['median_ms']:>8} ms  p90={result['p90_ms']:>8} ms  "
+                         f"{result['rows_per_s']} rows/s")
+
+    report = '\n'.join(lines)
+    print(report)
+    if args.output:
+        with open(args.output, 'a', encoding='utf-8') as f:
+            f.write(report + '\n')
+
+
+if __name__ == '__main__':
+    main()
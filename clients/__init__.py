@@ -1,14 +1,31 @@
 from clients.content_client import ContentClient
 from clients.user_client import UserClient
 from clients.payment_client import PaymentClient
+from clients.notification_client import NotificationClient
 from config import Config
+from helpers.fanout import configure_fanout
+from auth.jwks_store import get_jwks_store
 
 user_client = None
 content_client = None
 payment_client = None
+notification_client = None
 
 def init_client(app):
-    global user_client, content_client, payment_client
+    global user_client, content_client, payment_client, notification_client
+    if not app.config.get('KEYCLOAK_SERVICE_CLIENT_SECRET'):
+        raise RuntimeError("KEYCLOAK_SERVICE_CLIENT_SECRET no configurado: sin él no se puede obtener el token de servicio")
+    configure_fanout(app)
+    get_jwks_store(app).warm_up() # Claves de Keycloak listas antes de la primera petición
     user_client = UserClient(app)
     content_client = ContentClient(app)
-    payment_client = PaymentClient(app)
\ No newline at end of file
+    payment_client = PaymentClient(app)
+    notification_client = NotificationClient(app)
+
+    # Entrega de los efectos secundarios guardados en el outbox junto a cada compra
+    from service.outbox_worker import init_outbox_worker
+    init_outbox_worker(app, notification_client)
+
+    # Sagas de stock que un worker caído dejó a medias y limpieza del diario
+    from service.stock_saga import init_stock_saga_recovery
+    init_stock_saga_recovery(app, content_client)
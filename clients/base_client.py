@@ -1,10 +1,20 @@
 # clients/base_client.py
 import requests
-from flask import current_app
-from auth.keycloak_service import KeycloakService
+from auth.token_manager import get_token_manager
+from helpers.single_flight import SingleFlight
+from clients.retry_policy import RetryPolicy, get_retry_budget
+from clients.latency_tracker import LatencyTracker
+from clients.hedging import HedgePolicy, get_hedge_executor
+from clients.circuit_breaker import get_circuit_store
+from clients.service_registry import get_service_registry
+from helpers.metrics import get_metrics_registry, status_class
+from helpers.request_timing import timed
+from concurrent.futures import wait, FIRST_COMPLETED
 from typing import Optional
 import logging
+import time
 from threading import Lock
+from requests.adapters import HTTPAdapter
 
 logger = logging.getLogger(__name__)
 
@@ -12,22 +22,142 @@ class BaseClient:
     def __init__(self, app, service_name: str):
         self.app = app
         self.service_name = service_name
+        self.base_url = None # Lo fija cada cliente; es el prefijo que se sustituye por la instancia elegida
         self.timeout = 10
-        self.keycloak_service = KeycloakService(app)
-        self._token = None
-        self._token_lock = Lock()
+        self.token_manager = get_token_manager(app) # Compartido por todos los clientes del proceso
+
+        # Pool de conexiones keep-alive propio de cada cliente
+        self.pool_connections = int(app.config.get('HTTP_POOL_CONNECTIONS', 10))
+        self.pool_maxsize = int(app.config.get('HTTP_POOL_MAXSIZE', 20))
+        self.keepalive_seconds = float(app.config.get('HTTP_KEEPALIVE_SECONDS', 60))
+        self._session = None
+        self._session_created_at = 0.0
+        self._session_lock = Lock()
+        self._session_recycles = 0
+        self._retired_pool_stats = {'connections': 0, 'requests': 0}
+
+        # Agrupación de GETs idénticos concurrentes
+        self.coalesce_gets = str(app.config.get('HTTP_COALESCE_GETS', True)).lower() not in ('false', '0', 'no')
+        self._get_flight = SingleFlight()
+
+        # Reintentos: política por defecto, políticas por endpoint y presupuesto del proceso
+        self.default_retry_policy = RetryPolicy.from_config(app.config)
+        self.retry_policies = {}
+        self.retry_budget = get_retry_budget(app)
+
+        # Circuit breakers por endpoint, compartidos entre workers
+        self.circuits = get_circuit_store(app)
+
+        # Balanceo entre instancias del registro (None = URL fija de la configuración)
+        self.registry = get_service_registry(app)
+        if self.registry is not None:
+            self.registry.watch(service_name)
+
+        # Timeouts adaptativos a partir de la latencia observada de cada endpoint
+        self.adaptive_timeouts = str(app.config.get('ADAPTIVE_TIMEOUTS_ENABLED', True)).lower() not in ('false', '0', 'no')
+        self.latency = LatencyTracker.from_config(app.config)
+        self.metrics = get_metrics_registry(app.config)
+
+        # Hedging de lecturas idempotentes; cada cliente indica qué endpoints lo admiten
+        self.hedging = HedgePolicy.from_config(app.config)
+        self.hedged_endpoints = set()
+        self.hedge_max_workers = int(app.config.get('HEDGE_MAX_WORKERS', 16))
+
+    def _build_session(self) -> requests.Session:
+        """Crea una sesión con un adaptador HTTP con pool de conexiones"""
+        session = requests.Session()
+        adapter = HTTPAdapter(
+            pool_connections=self.pool_connections,
+            pool_maxsize=self.pool_maxsize
+        )
+        session.mount('http://', adapter)
+        session.mount('https://', adapter)
+        return session
+
+    def _get_session(self) -> requests.Session:
+        """Devuelve la sesión compartida, renovándola al superar la vida keep-alive"""
+        with self._session_lock:
+            now = time.monotonic()
+            expired = self.keepalive_seconds > 0 and now - self._session_created_at > self.keepalive_seconds
+
+            if self._session is not None and expired:
+                old_stats = self._collect_pool_counters(self._session)
+                self._retired_pool_stats['connections'] += old_stats['connections']
+                self._retired_pool_stats['requests'] += old_stats['requests']
+                self._session.close() # Las conexiones en uso se cierran al devolverse al pool
+                self._session = None
+                self._session_recycles += 1
+
+            if self._session is None:
+                self._session = self._build_session()
+                self._session_created_at = now
+
+            return self._session
+
+    @staticmethod
+    def _collect_pool_counters(session: requests.Session) -> dict:
+        """Suma los contadores de urllib3 de todos los pools de la sesión"""
+        connections = 0
+        requests_count = 0
+        seen = set()
+        for adapter in session.adapters.values():
+            if id(adapter) in seen:
+                continue
+            seen.add(id(adapter))
+            pools = adapter.poolmanager.pools
+            for key in list(pools.keys()):
+                pool = pools.get(key)
+                if pool is None:
+                    continue
+                connections += getattr(pool, 'num_connections', 0)
+                requests_count += getattr(pool, 'num_requests', 0)
+        return {'connections': connections, 'requests': requests_count}
+
+    def get_pool_stats(self) -> dict:
+        """Estadísticas del pool: conexiones nuevas frente a reutilizadas"""
+        with self._session_lock:
+            current = self._collect_pool_counters(self._session) if self._session else {'connections': 0, 'requests': 0}
+            new_connections = self._retired_pool_stats['connections'] + current['connections']
+            total_requests = self._retired_pool_stats['requests'] + current['requests']
+            return {
+                'requests': total_requests,
+                'new_connections': new_connections,
+                'reused_connections': max(total_requests - new_connections, 0),
+                'session_recycles': self._session_recycles,
+                'pool_connections': self.pool_connections,
+                'pool_maxsize': self.pool_maxsize,
+                'keepalive_seconds': self.keepalive_seconds
+            }
+
+    def get_diagnostics(self) -> dict:
+        """Información de diagnóstico del cliente"""
+        return {
+            'service': self.service_name,
+            'pool': self.get_pool_stats(),
+            'coalescing': {
+                'enabled': self.coalesce_gets,
+                'requests_sent': self._get_flight.executed,
+                'requests_collapsed': self._get_flight.shared,
+                'in_flight': self._get_flight.in_flight()
+            },
+            'retry_budget': self.retry_budget.stats(),
+            'timeouts': {
+                'adaptive': self.adaptive_timeouts,
+                'default_timeout_s': self.timeout,
+                'endpoints': self.latency.snapshot(self.timeout)
+            },
+            'hedging': dict(self.hedging.stats(), endpoints=sorted(self.hedged_endpoints)),
+            'circuits': self.circuits.snapshot(f"{self.service_name}:"),
+            'instances': self.registry.snapshot(self.service_name) if self.registry is not None else None
+        }
     
     def _get_token(self) -> Optional[str]:
-        """Obtener token JWT (con cache simple)"""
-        with self._token_lock:
-            if not self._token:
-                self._token = self.keycloak_service._get_token("content-service", "ehAIzr9YpKeHPoqZV2ealDY0gkYE50wy")
-            return self._token
+        """Obtener token JWT del gestor compartido (renovado antes de expirar)"""
+        return self.token_manager.get_token()
     
-    def _refresh_token(self):
-        """Forzar refresh del token"""
-        with self._token_lock:
-            self._token = self.keycloak_service._get_token();
+    def _refresh_token(self, rejected_token: Optional[str] = None):
+        """Forzar refresh del token tras un 401"""
+        self.token_manager.force_refresh(rejected_token)
     
     def _get_headers(self) -> dict:
         """Headers con JWT para requests a otros microservicios"""
@@ -43,54 +173,214 @@ class BaseClient:
         
         return headers
     
-    def _make_request(self, method: str, url: str, **kwargs) -> Optional[requests.Response]:
-        """Realizar request con manejo de token"""
+    def _make_request(self, method: str, url: str, endpoint: Optional[str] = None,
+                      idempotency_key: Optional[str] = None, raise_errors: bool = False,
+                      **kwargs) -> Optional[requests.Response]:
+        """
+        Realizar request con manejo de token y reintentos.
+        endpoint es el nombre lógico de la operación (p.ej. 'product.get') y selecciona su política.
+        Con raise_errors el error de red del último intento se propaga en vez de devolver None
+        (escrituras que necesitan distinguir un timeout de una petición que no llegó a enviarse)
+        """
         
         url = url.strip()  # Elimina espacios y caracteres de control al inicio/final
         url = ''.join(char for char in url if ord(char) >= 32)  # Elimina caracteres de control
+        endpoint = endpoint or method.upper()
 
-        headers = self._get_headers()
-        
-        print("\n========== REQUEST DEBUG ==========", flush=True)
-        print("METHOD:", method, flush=True)
-        print("URL:", url, flush=True)
-        print("HEADERS:", headers, flush=True)
-        print("KWARGS:", kwargs, flush=True)
+        # Tiempo total (reintentos incluidos) en la cabecera Server-Timing de la petición en curso
+        with timed(self.service_name):
+            # GETs idénticos y simultáneos comparten una única petición en vuelo
+            if self.coalesce_gets and method.upper() == 'GET' and not kwargs.get('stream'):
+                key = (url, self._freeze_params(kwargs.get('params')), self._freeze_params(kwargs.get('headers')), raise_errors)
+                return self._get_flight.do(key, lambda: self._send_request(method, url, endpoint, idempotency_key, raise_errors, **kwargs))
+
+            return self._send_request(method, url, endpoint, idempotency_key, raise_errors, **kwargs)
+
+    @staticmethod
+    def _freeze_params(params) -> tuple:
+        """Convierte los query params en una clave hashable"""
+        if not params:
+            return ()
+        items = params.items() if isinstance(params, dict) else params
+        return tuple(sorted((str(key), str(value)) for key, value in items))
+
+    def set_retry_policy(self, endpoint: str, policy: RetryPolicy):
+        """Política de reintentos específica para un endpoint lógico"""
+        self.retry_policies[endpoint] = policy
+
+    def _send_request(self, method: str, url: str, endpoint: str, idempotency_key: Optional[str],
+                      raise_errors: bool = False, **kwargs) -> Optional[requests.Response]:
+        """Envía la petición aplicando la política de reintentos y el presupuesto global"""
+        circuit_name = f"{self.service_name}:{endpoint}"
+        if not self.circuits.allow(circuit_name):
+            logger.warning(f"Circuito {circuit_name} abierto, no se envía {method} {url}")
+            return None
 
-        if "json" in kwargs:
-            print("JSON BODY:", kwargs["json"], flush=True)
-        if "data" in kwargs:
-            print("DATA BODY:", kwargs["data"], flush=True)
-        if "params" in kwargs:
-            print("QUERY PARAMS:", kwargs["params"], flush=True)
+        policy = self.retry_policies.get(endpoint, self.default_retry_policy)
+        can_retry = policy.allows_method(method, idempotency_key)
+        self.retry_budget.record_request()
 
-        print("===================================\n", flush=True)
+        attempt = 1
+        while True:
+            response, error = None, None
+            try:
+                if self._can_hedge(method, endpoint, kwargs):
+                    response = self._send_hedged(method, url, endpoint, idempotency_key, **kwargs)
+                else:
+                    response = self._send_once(method, url, endpoint, idempotency_key, **kwargs)
+            except requests.exceptions.RequestException as e:
+                error = e
 
+            if not can_retry or attempt >= policy.max_attempts or not policy.is_retryable(response, error):
+                break
+
+            delay = policy.retry_after(response)
+            if delay is None:
+                delay = policy.backoff(attempt)
+            elif delay > policy.max_retry_after:
+                break # El servidor pide esperar más de lo razonable para una petición de usuario
+
+            if not self.retry_budget.try_acquire_retry():
+                logger.warning(f"Presupuesto de reintentos agotado, no se reintenta {method} {url}")
+                break
+
+            logger.info(f"Reintento {attempt} de {method} {url} en {delay:.2f}s")
+            time.sleep(delay)
+            attempt += 1
+
+        if error is not None or response.status_code >= 500:
+            self.circuits.record_failure(circuit_name)
+        else:
+            self.circuits.record_success(circuit_name)
+
+        if error is not None:
+            logger.error(f"Error en request a {url} , error: {error}")
+            if raise_errors:
+                raise error
+            return None
+        return response
+
+    def _can_hedge(self, method: str, endpoint: str, kwargs: dict) -> bool:
+        return (self.hedging.enabled and endpoint in self.hedged_endpoints
+                and method.upper() == 'GET' and not kwargs.get('stream'))
+
+    def _send_hedged(self, method: str, url: str, endpoint: str,
+                     idempotency_key: Optional[str], **kwargs) -> requests.Response:
+        """
+        Si la primera petición no ha respondido al llegar al percentil del endpoint,
+        envía una segunda idéntica y devuelve la primera respuesta que llegue
+        """
+        delay = self.hedging.hedge_delay(endpoint, self.latency)
+        if delay is None:
+            self.hedging.record(False)
+            return self._send_once(method, url, endpoint, idempotency_key, **kwargs)
+
+        executor = get_hedge_executor(self.hedge_max_workers)
+        primary = executor.submit(self._send_once, method, url, endpoint, idempotency_key, **kwargs)
+        done, _ = wait([primary], timeout=delay)
+        if done or not self.hedging.try_hedge(endpoint, self.latency):
+            if done:
+                self.hedging.record(False)
+            return primary.result()
+
+        logger.info(f"Hedging de {method} {url}: sin respuesta tras {delay * 1000:.0f}ms")
+        backup = executor.submit(self._send_once, method, url, endpoint, idempotency_key, **kwargs)
+        pending = {primary, backup}
+        while pending:
+            done, pending = wait(pending, return_when=FIRST_COMPLETED)
+            for future in done:
+                if future.exception() is None:
+                    for loser in pending:
+                        loser.add_done_callback(self._discard_response)
+                    if future is backup:
+                        self.hedging.record_win()
+                    return future.result()
+        return primary.result() # Ambas fallaron: se propaga el error de la original
+
+    @staticmethod
+    def _discard_response(future):
+        """Cierra la respuesta perdedora para devolver su conexión al pool"""
+        if not future.cancelled() and future.exception() is None:
+            future.result().close()
+
+    def _get_timeout(self, endpoint: str):
+        """Timeout (connect, read) del endpoint; el fijo si los timeouts adaptativos están desactivados"""
+        if not self.adaptive_timeouts:
+            return self.timeout
+        return self.latency.timeouts_for(endpoint, self.timeout)
+
+    def _timed_request(self, session: requests.Session, endpoint: str, **kwargs) -> requests.Response:
+        """Envía la petición a una instancia del registro registrando su latencia en la ventana del endpoint"""
+        instance = self._acquire_instance(kwargs['url'])
+        if instance is not None:
+            kwargs['url'] = instance + kwargs['url'][len(self.base_url):]
+
+        start = time.monotonic()
         try:
+            response = session.request(timeout=self._get_timeout(endpoint), **kwargs)
+        except requests.exceptions.RequestException:
+            elapsed = time.monotonic() - start
+            self.latency.record(endpoint, elapsed, error=True)
+            self.metrics.observe_client_call(self.service_name, endpoint, 'error', elapsed)
+            if instance is not None:
+                self.registry.release(self.service_name, instance, success=False)
+            raise
+        elapsed = time.monotonic() - start
+        failed = response.status_code >= 500
+        self.latency.record(endpoint, elapsed, error=failed)
+        self.metrics.observe_client_call(self.service_name, endpoint, status_class(response.status_code), elapsed)
+        if instance is not None:
+            self.registry.release(self.service_name, instance, success=not failed)
+        return response
+
+    def _acquire_instance(self, url: str) -> Optional[str]:
+        """Instancia elegida para las URLs que apuntan al base_url del cliente"""
+        if self.registry is None or not self.base_url or not url.startswith(self.base_url):
+            return None
+        return self.registry.acquire(self.service_name)
+
+    def _request_headers(self, idempotency_key: Optional[str], extra_headers: Optional[dict]) -> dict:
+        """Headers comunes más la clave de idempotencia y los propios de la petición (p.ej. condicionales)"""
+        headers = self._get_headers()
+        if idempotency_key:
+            headers['Idempotency-Key'] = idempotency_key
+        if extra_headers:
+            headers.update(extra_headers)
+        return headers
+
+    def _send_once(self, method: str, url: str, endpoint: str, idempotency_key: Optional[str], **kwargs) -> requests.Response:
+        """Un intento: envía la petición por la sesión del pool (con refresh del token tras un 401)"""
+        extra_headers = kwargs.pop('headers', None)
+        headers = self._request_headers(idempotency_key, extra_headers)
+        if logger.isEnabledFor(logging.DEBUG):
+            # Sin el token de servicio ni los cuerpos (pueden llevar datos de pago)
+            safe_headers = {name: ('<redacted>' if name.lower() == 'authorization' else value) for name, value in headers.items()}
+            logger.debug(f"{method} {url} headers={safe_headers} params={kwargs.get('params')}")
+
+        session = self._get_session()
 
-            response = requests.request(
+        response = self._timed_request(
+            session,
+            endpoint,
+            method=method,
+            url=url,
+            headers=headers,
+            **kwargs
+        )
+        
+        # Si el token expiró (401), refrescar y reintentar
+        if response.status_code == 401:
+            logger.info("Token expirado, refrescando...")
+            rejected_token = headers.get('Authorization', '').removeprefix('Bearer ') or None
+            self._refresh_token(rejected_token)
+            headers = self._request_headers(idempotency_key, extra_headers)
+            response = self._timed_request(
+                session,
+                endpoint,
                 method=method,
                 url=url,
-                timeout=self.timeout,
                 headers=headers,
                 **kwargs
             )
-            
-            # Si el token expiró (401), refrescar y reintentar
-            if response.status_code == 401:
-                logger.info("Token expirado, refrescando...")
-                self._refresh_token()
-                headers = self._get_headers()
-                response = requests.request(
-                    method=method,
-                    url=url,
-                    timeout=self.timeout,
-                    headers=headers,
-                    **kwargs
-                )
-            
-            return response
-            
-        except requests.exceptions.RequestException as e:
-            logger.error(f"Error en request a {url} , error: {e}")
-            return None
\ No newline at end of file
+        
+        return response
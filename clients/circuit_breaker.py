@@ -0,0 +1,187 @@
+import os
+import sqlite3
+import tempfile
+import threading
+import time
+import logging
+
+logger = logging.getLogger(__name__)
+
+CLOSED = 'closed'
+OPEN = 'open'
+HALF_OPEN = 'half_open'
+
+DEFAULT_STATE_PATH = os.path.join(tempfile.gettempdir(), 'orders-service-circuits.db')
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS circuits (
+    name TEXT PRIMARY KEY,
+    state TEXT NOT NULL DEFAULT 'closed',
+    failures INTEGER NOT NULL DEFAULT 0,
+    opened_at REAL NOT NULL DEFAULT 0,
+    probe_started_at REAL NOT NULL DEFAULT 0,
+    times_opened INTEGER NOT NULL DEFAULT 0,
+    times_half_opened INTEGER NOT NULL DEFAULT 0,
+    times_closed INTEGER NOT NULL DEFAULT 0
+)
+"""
+
+
+class CircuitBreakerStore:
+    """
+    Circuit breakers por microservicio y endpoint con el estado en un fichero
+    SQLite local, compartido por todos los workers del contenedor: basta con que
+    entre todos acumulen el umbral de fallos para que todos abran el circuito.
+    En semiabierto solo un worker envía la petición de prueba. Un circuito cerrado
+    se recuerda en memoria closed_cache_seconds para no leer SQLite en cada llamada,
+    así que un worker tarda como mucho ese tiempo en ver que otro lo ha abierto
+    """
+    def __init__(self, path: str = DEFAULT_STATE_PATH, failure_threshold: int = 7,
+                 recovery_timeout: float = 60, closed_cache_seconds: float = 1, clock=time.time):
+        self.path = path
+        self.failure_threshold = failure_threshold
+        self.recovery_timeout = recovery_timeout
+        self.closed_cache_seconds = closed_cache_seconds
+        self._clock = clock
+        self._closed_until = {} # name -> instante hasta el que se da por cerrado sin consultar
+        self._local = threading.local()
+        self._rejected = {} # Llamadas rechazadas por este proceso
+        self._lock = threading.Lock()
+        self._connection().execute(_SCHEMA)
+
+    def _connection(self) -> sqlite3.Connection:
+        """Una conexión por hilo; autocommit y transacciones explícitas"""
+        conn = getattr(self._local, 'conn', None)
+        if conn is None:
+            conn = sqlite3.connect(self.path, timeout=5, isolation_level=None)
+            conn.execute('PRAGMA journal_mode=WAL')
+            conn.execute('PRAGMA synchronous=NORMAL')
+            self._local.conn = conn
+        return conn
+
+    def _ensure(self, conn: sqlite3.Connection, name: str):
+        conn.execute('INSERT OR IGNORE INTO circuits (name) VALUES (?)', (name,))
+
+    def allow(self, name: str) -> bool:
+        """Indica si se puede enviar la llamada; en semiabierto reserva la prueba para un único llamante"""
+        now = self._clock()
+        if now < self._closed_until.get(name, 0):
+            return True # Camino habitual: cerrado hace menos de closed_cache_seconds
+
+        conn = self._connection()
+        row = conn.execute('SELECT state, opened_at, probe_started_at FROM circuits WHERE name = ?', (name,)).fetchone()
+        if row is None or row[0] == CLOSED:
+            if self.closed_cache_seconds > 0:
+                self._closed_until[name] = now + self.closed_cache_seconds
+            return True
+
+        self._closed_until.pop(name, None)
+        state, opened_at, probe_started_at = row
+        if state == OPEN and now - opened_at >= self.recovery_timeout:
+            claimed = conn.execute(
+                "UPDATE circuits SET state = ?, probe_started_at = ?, times_half_opened = times_half_opened + 1 "
+                "WHERE name = ? AND state = ? AND opened_at = ?",
+                (HALF_OPEN, now, name, OPEN, opened_at)
+            ).rowcount
+            if claimed:
+                logger.info(f"Circuito {name} semiabierto: enviando petición de prueba")
+                return True
+        elif state == HALF_OPEN and now - probe_started_at >= self.recovery_timeout:
+            # La petición de prueba no informó de su resultado (worker caído): se reintenta
+            claimed = conn.execute(
+                "UPDATE circuits SET probe_started_at = ? WHERE name = ? AND state = ? AND probe_started_at = ?",
+                (now, name, HALF_OPEN, probe_started_at)
+            ).rowcount
+            if claimed:
+                return True
+
+        with self._lock:
+            self._rejected[name] = self._rejected.get(name, 0) + 1
+        return False
+
+    def record_success(self, name: str):
+        conn = self._connection()
+        row = conn.execute('SELECT state, failures FROM circuits WHERE name = ?', (name,)).fetchone()
+        if row is None or (row[0] == CLOSED and row[1] == 0):
+            return # Camino habitual: sin escrituras
+        conn.execute('BEGIN IMMEDIATE')
+        try:
+            state = conn.execute('SELECT state FROM circuits WHERE name = ?', (name,)).fetchone()[0]
+            if state == CLOSED:
+                conn.execute('UPDATE circuits SET failures = 0 WHERE name = ?', (name,))
+            else:
+                conn.execute(
+                    'UPDATE circuits SET state = ?, failures = 0, times_closed = times_closed + 1 WHERE name = ?',
+                    (CLOSED, name)
+                )
+                logger.info(f"Circuito {name} cerrado")
+            conn.execute('COMMIT')
+        except Exception:
+            conn.execute('ROLLBACK')
+            raise
+
+    def record_failure(self, name: str):
+        conn = self._connection()
+        conn.execute('BEGIN IMMEDIATE')
+        try:
+            self._ensure(conn, name)
+            state, failures = conn.execute('SELECT state, failures FROM circuits WHERE name = ?', (name,)).fetchone()
+            failures += 1
+            if state == HALF_OPEN or (state == CLOSED and failures >= self.failure_threshold):
+                conn.execute(
+                    'UPDATE circuits SET state = ?, failures = ?, opened_at = ?, times_opened = times_opened + 1 WHERE name = ?',
+                    (OPEN, failures, self._clock(), name)
+                )
+                self._closed_until.pop(name, None) # Este proceso deja de enviar de inmediato
+                logger.warning(f"Circuito {name} abierto tras {failures} fallos")
+            else:
+                conn.execute('UPDATE circuits SET failures = ? WHERE name = ?', (failures, name))
+            conn.execute('COMMIT')
+        except Exception:
+            conn.execute('ROLLBACK')
+            raise
+
+    def state(self, name: str) -> str:
+        row = self._connection().execute('SELECT state FROM circuits WHERE name = ?', (name,)).fetchone()
+        return row[0] if row else CLOSED
+
+    def snapshot(self, prefix: str = '') -> dict:
+        """Estado y contadores de transiciones de los circuitos cuyo nombre empieza por prefix"""
+        rows = self._connection().execute(
+            'SELECT name, state, failures, opened_at, times_opened, times_half_opened, times_closed '
+            'FROM circuits WHERE name LIKE ? ORDER BY name', (prefix + '%',)
+        ).fetchall()
+        with self._lock:
+            rejected = dict(self._rejected)
+        return {
+            name: {
+                'state': state,
+                'failures': failures,
+                'opened_at': opened_at or None,
+                'transitions': {'opened': opened, 'half_opened': half_opened, 'closed': closed},
+                'rejected_calls': rejected.get(name, 0)
+            }
+            for name, state, failures, opened_at, opened, half_opened, closed in rows
+        }
+
+
+_circuit_store = None
+_circuit_store_lock = threading.Lock()
+
+def get_circuit_store(app) -> CircuitBreakerStore:
+    """Almacén de circuitos compartido por todos los clientes del proceso"""
+    global _circuit_store
+    with _circuit_store_lock:
+        if _circuit_store is None:
+            _circuit_store = CircuitBreakerStore(
+                path = app.config.get('CIRCUIT_STATE_PATH') or DEFAULT_STATE_PATH,
+                failure_threshold = int(app.config.get('CIRCUIT_FAILURE_THRESHOLD', 7)),
+                recovery_timeout = float(app.config.get('CIRCUIT_RECOVERY_TIMEOUT', 60)),
+                closed_cache_seconds = float(app.config.get('CIRCUIT_CLOSED_CACHE_SECONDS', 1))
+            )
+        return _circuit_store
+
+def reset_circuit_store():
+    global _circuit_store
+    with _circuit_store_lock:
+        _circuit_store = None
@@ -1,31 +1,112 @@
 import requests
+from urllib3.exceptions import NewConnectionError
 from typing import Optional
 from flask import current_app
-from circuitbreaker import circuit
-from config import CircuitBreakerPersonalizado
 from clients.base_client import BaseClient
+from clients.product_cache import ProductCache
+from helpers.fanout import fan_out, FanOutTimeout, FanOutCancelled
+from typing import Dict, Iterable, List
+from threading import Lock
 import logging
+import time
 
 logger = logging.getLogger(__name__)
 
+# Campos que la lectura exige frescos: por defecto el precio (compras); con STATIC_FIELDS
+# (nombre, imagen, artista...) el documento se sirve de caché durante PRODUCT_CACHE_STATIC_TTL
+PRICE_FIELDS = ('price',)
+STATIC_FIELDS = ()
+
 class ContentClient(BaseClient):
 
     def __init__(self, app):
         super().__init__(app, "content-service")
         self.base_url = app.config.get('CONTENT_SERVICE_URL')
         self.timeout = 5
+        # Endpoint de consulta múltiple (opcional); si no existe se hacen GETs en paralelo
+        self.bulk_products_path = app.config.get('CONTENT_BULK_PRODUCTS_PATH') or None
+        self.bulk_max_ids = int(app.config.get('CONTENT_BULK_MAX_IDS', 50))
+        self.lookup_max_concurrency = int(app.config.get('CONTENT_LOOKUP_MAX_CONCURRENCY', 8))
+        self.lookup_timeout = float(app.config.get('CONTENT_LOOKUP_DEADLINE_SECONDS', 8))
+        self.product_cache = ProductCache.from_config(app.config)
+        # Lecturas idempotentes que admiten hedging (si HEDGE_ENABLED)
+        self.hedged_endpoints = {'product.get', 'product.stock.get', 'product.bulk.get', 'song.get', 'album.get'}
+        # Lecturas por endpoint: servidas de caché, revalidadas con 304 o descargadas con 200
+        self.read_stats = {}
+        self._read_stats_lock = Lock()
+
+    def get_diagnostics(self) -> dict:
+        diagnostics = super().get_diagnostics()
+        diagnostics['product_cache'] = self.product_cache.stats()
+        with self._read_stats_lock:
+            diagnostics['conditional_gets'] = {endpoint: dict(counters) for endpoint, counters in self.read_stats.items()}
+        return diagnostics
+
+    def _record_read(self, endpoint: str, outcome: str):
+        with self._read_stats_lock:
+            counters = self.read_stats.setdefault(endpoint, {'cache_hits': 0, 'not_modified': 0, 'full_responses': 0})
+            counters[outcome] += 1
+
+    def _conditional_get(self, product_id: str, endpoint: str):
+        """
+        GET del producto con los validadores cacheados (If-None-Match / If-Modified-Since).
+        Devuelve (response, documento); el documento solo viene tras un 304 y es el de la caché
+        """
+        url = f"{self.base_url}/products/public/{product_id}"
+        headers = self.product_cache.conditional_headers(product_id)
+        response = self._make_request('GET', url, endpoint = endpoint, headers = headers or None)
+
+        if response is not None and response.status_code == 304:
+            document = self.product_cache.revalidate(product_id)
+            if document is not None:
+                self._record_read(endpoint, 'not_modified')
+                return response, document
+            # La entrada desapareció de la caché entre tanto: se pide completa
+            response = self._make_request('GET', url, endpoint = endpoint)
+
+        if response is not None and response.status_code == 200:
+            self._record_read(endpoint, 'full_responses')
+        return response, None
+
+    def _store_product(self, product_id: str, document: dict, response: requests.Response):
+        """Cachea el documento junto con sus validadores HTTP"""
+        headers = getattr(response, 'headers', None)
+        etag = headers.get('ETag') if headers is not None else None
+        last_modified = headers.get('Last-Modified') if headers is not None else None
+        self.product_cache.put(
+            product_id,
+            document,
+            etag = etag if isinstance(etag, str) else None,
+            last_modified = last_modified if isinstance(last_modified, str) else None
+        )
+
+    def invalidate_product(self, product_id: str):
+        """Hook de invalidación explícita de un producto cacheado"""
+        self.product_cache.invalidate(product_id)
+
+    def invalidate_all_products(self):
+        self.product_cache.clear()
+
+    def get_product_by_id(self, publicId: str, fields: Iterable[str] = PRICE_FIELDS) -> Optional[dict]:
+        """Obtains product info (fields: campos volátiles que deben estar frescos, ver PRICE_FIELDS)"""
+        found, cached = self.product_cache.lookup(publicId, fields=fields)
+        if found:
+            self._record_read('product.get', 'cache_hits')
+            return cached
 
-    @circuit(cls=CircuitBreakerPersonalizado)
-    def get_product_by_id(self, publicId: str) -> Optional[dict]:
-        """Obtains product info"""
         try:
 
-            url = f"{self.base_url}/products/public/{publicId}"
-            
-            response = self._make_request('GET', url)
+            response, revalidated = self._conditional_get(publicId, 'product.get')
+            if revalidated is not None:
+                return revalidated
             
+            if response is None: # Circuito abierto o presupuesto de reintentos agotado
+                logger.error(f"Servicio de contenido no disponible al obtener el producto {publicId}")
+                return None
+
             # Control if content's microservice is down or in panic
             if response.status_code == 404:
+                self.product_cache.put_not_found(publicId)
                 return None # Non existing user
             if response.status_code >= 500: # Microservice internal server error
                 logger.error(f"Error al intentar comunicarte con el microservicio de contenido {response.status_code}")
@@ -36,6 +117,8 @@ class ContentClient(BaseClient):
             # Response comes as a JSON format
             data = response.json()
             if data.get('success'):
+                if data.get('data'):
+                    self._store_product(publicId, data.get('data'), response)
                 return data.get('data') # Contains the product's info
             return None
     
@@ -45,16 +128,37 @@ class ContentClient(BaseClient):
             current_app.logger.error(f"Error al intentar obtener el pedido {publicId}")
             return None
         
-    @circuit(cls=CircuitBreakerPersonalizado)
     def  get_product_stock_by_id(self, product_id: str) -> Optional[dict]:
+        # El stock solo se sirve de caché si PRODUCT_CACHE_STOCK_TTL > 0
+        found, cached = self.product_cache.lookup(product_id, fields=('stock',))
+        if found and cached is not None:
+            self._record_read('product.stock.get', 'cache_hits')
+            return {
+                'success': True,
+                'stock_product': cached.get('stock'),
+                'message': f'Recuperación de stock para el producto {product_id} exitosa'
+            }
+
         try:
-            url = f"{self.base_url}/products/public/{product_id}"
+            response, revalidated = self._conditional_get(product_id, 'product.stock.get')
+            if revalidated is not None:
+                return {
+                    'success': True,
+                    'stock_product': revalidated.get('stock'),
+                    'message': f'Recuperación de stock para el producto {product_id} exitosa'
+                }
 
-            response = self._make_request('GET', url)
+            if response is None: # Circuito abierto o presupuesto de reintentos agotado
+                return {
+                    'success': False,
+                    'error': 'Servicio de contenido no disponible'
+                }
 
             data = response.json()
 
             if data.get('success') is True:
+                if data.get('data'):
+                    self._store_product(product_id, data.get('data'), response)
                 return {
                     'success': True,
                     'stock_product': data.get('data').get('stock'),
@@ -84,8 +188,13 @@ class ContentClient(BaseClient):
                 'error': f'Error inesperado: {str(e)}'
             }       
         
-    @circuit(cls=CircuitBreakerPersonalizado)
     def update_product_stock_by_id(self, productId: str, newStock: int) -> Optional[dict]:
+        """
+        PATCH /products/{id}/stock?newStock=n. Pese al nombre, el microservicio de contenido
+        suma newStock al stock actual (es una variación, no el nuevo total): el servicio de
+        compras siempre ha enviado -quantity para descontar y +quantity para reponer, y un
+        total negativo no tendría sentido. Las compensaciones de StockSaga dependen de ello
+        """
         try:
             url = f"{self.base_url}/products/{productId}/stock"
 
@@ -93,9 +202,17 @@ class ContentClient(BaseClient):
                 'newStock': newStock
             }
 
-            response = self._make_request('PATCH', url, params = params)   
+            response = self._make_request('PATCH', url, endpoint = 'product.stock.patch', params = params, raise_errors = True)
+
+            if response is None:
+                # Circuito abierto: la petición no se llegó a enviar
+                return {
+                    'success': False,
+                    'error': 'Servicio de contenido no disponible'
+                }
 
             if response.status_code == 200:
+                self.product_cache.invalidate_fields(productId, ('stock',))
                 product_info = response.json()
                 return {
                     'success': True,
@@ -109,11 +226,19 @@ class ContentClient(BaseClient):
                     'error': response.json().get('error', 'Error actualizando stock'),
                     'status_code': response.status_code
                 }
-        except requests.exceptions.ConnectionError as e:
-            logger.error(f"Error de conexión con servicio de contenido: {str(e)}")
+        except requests.exceptions.RequestException as e:
+            if not _may_have_reached_server(e):
+                logger.error(f"Error de conexión con servicio de contenido: {str(e)}")
+                return {
+                    'success': False,
+                    'error': 'No se pudo conectar con el servicio de contenido'
+                }
+            # Timeout de lectura o conexión cortada: el PATCH pudo aplicarse sin que llegara la respuesta
+            logger.error(f"Resultado desconocido actualizando el stock de {productId}: {str(e)}")
             return {
                 'success': False,
-                'error': 'No se pudo conectar con el servicio de contenido'
+                'outcome_unknown': True,
+                'error': f'Sin respuesta del servicio de contenido: {str(e)}'
             }
         except Exception as e:
             logger.error(f"Error inesperado actualizando stock: {str(e)}")
@@ -122,14 +247,24 @@ class ContentClient(BaseClient):
                 'error': f'Error inesperado: {str(e)}'
             }    
 
-    @circuit(cls=CircuitBreakerPersonalizado)    
-    def get_songs_by_id(self, songId: str) -> Optional[dict]:
+    def get_songs_by_id(self, songId: str, fields: Iterable[str] = PRICE_FIELDS) -> Optional[dict]:
+        found, cached = self.product_cache.lookup(songId, fields=fields)
+        if found:
+            self._record_read('song.get', 'cache_hits')
+            return cached
+
         try:
-            url = f"{self.base_url}/products/public/{songId}"
-            response = self._make_request('GET', url)  
+            response, revalidated = self._conditional_get(songId, 'song.get')
+            if revalidated is not None:
+                return revalidated
+
+            if response is None: # Circuito abierto o presupuesto de reintentos agotado
+                logger.error(f"Servicio de contenido no disponible al obtener la canción {songId}")
+                return None
 
             # Control if content's microservice is down or in panic
             if response.status_code == 404:
+                self.product_cache.put_not_found(songId)
                 return None # Non existing product
             if response.status_code >= 500: # Microservice internal server error
                 current_app.logger.error(f"Error al intentar comunicarte con el microservicio de contenido {response.status_code}")
@@ -139,6 +274,8 @@ class ContentClient(BaseClient):
 
             data = response.json()
             if data.get('success'):
+                if data.get('data'):
+                    self._store_product(songId, data.get('data'), response)
                 return data.get('data')
             return None
         
@@ -148,14 +285,24 @@ class ContentClient(BaseClient):
             current_app.logger.error(f"Error al intentar obtener la cancion {songId}")
             return None
 
-    @circuit(cls=CircuitBreakerPersonalizado)
-    def get_albums_by_id(self, albumId: str) -> Optional[dict]:
+    def get_albums_by_id(self, albumId: str, fields: Iterable[str] = PRICE_FIELDS) -> Optional[dict]:
+        found, cached = self.product_cache.lookup(albumId, fields=fields)
+        if found:
+            self._record_read('album.get', 'cache_hits')
+            return cached
+
         try:
-            url = f"{self.base_url}/products/public/{albumId}"
-            response = self._make_request('GET', url)  
+            response, revalidated = self._conditional_get(albumId, 'album.get')
+            if revalidated is not None:
+                return revalidated
+
+            if response is None: # Circuito abierto o presupuesto de reintentos agotado
+                logger.error(f"Servicio de contenido no disponible al obtener el álbum {albumId}")
+                return None
 
             # Control if content's microservice is down or in panic
             if response.status_code == 404:
+                self.product_cache.put_not_found(albumId)
                 return None # Non existing product
             if response.status_code >= 500: # Microservice internal server error
                 current_app.logger.error(f"Error al intentar comunicarte con el microservicio de contenido {response.status_code}")
@@ -165,6 +312,8 @@ class ContentClient(BaseClient):
 
             data = response.json()
             if data.get('success'):
+                if data.get('data'):
+                    self._store_product(albumId, data.get('data'), response)
                 return data.get('data')
             return None
         
@@ -173,3 +322,129 @@ class ContentClient(BaseClient):
         except requests.exceptions.RequestException as e:
             current_app.logger.error(f"Error al intentar obtener el album {albumId}")
             return None
+
+    def get_products_by_ids(self, ids: Iterable[str], timeout: Optional[float] = None,
+                            fields: Iterable[str] = PRICE_FIELDS) -> Dict[str, dict]:
+        """
+        Obtiene varios productos a la vez, sin repetir ids.
+        Devuelve {id: {'success': True, 'data': {...}}} o {id: {'success': False, 'error': ...}}
+        """
+        unique_ids = list(dict.fromkeys(product_id for product_id in ids if product_id))
+        if not unique_ids:
+            return {}
+
+        timeout = self.lookup_timeout if timeout is None else timeout
+
+        # Primero la caché; solo se piden al microservicio los que falten
+        results = {}
+        missing_ids = []
+        for product_id in unique_ids:
+            found, cached = self.product_cache.lookup(product_id, fields=fields)
+            if not found:
+                missing_ids.append(product_id)
+                continue
+            self._record_read('product.get', 'cache_hits')
+            if cached is None:
+                results[product_id] = {'success': False, 'error': 'Producto no encontrado', 'status_code': 404}
+            else:
+                results[product_id] = {'success': True, 'data': cached}
+
+        if missing_ids:
+            results.update(self._fetch_products(missing_ids, timeout))
+
+        # Los encontrados ya se cachean al recibirlos (con sus validadores); aquí los 404
+        for product_id in missing_ids:
+            if results[product_id].get('status_code') == 404:
+                self.product_cache.put_not_found(product_id)
+
+        return {product_id: results[product_id] for product_id in unique_ids}
+
+    def _fetch_products(self, product_ids: List[str], timeout: float) -> Dict[str, dict]:
+        """
+        Pide los productos al microservicio: endpoint bulk o GETs individuales en paralelo.
+        timeout es el plazo total: si el bulk falla, las individuales solo tienen lo que quede
+        """
+        deadline = time.monotonic() + timeout
+        if self.bulk_products_path:
+            results = self._get_products_bulk(product_ids, timeout)
+            if results is not None:
+                return results
+            remaining = deadline - time.monotonic()
+            if remaining <= 0:
+                logger.warning("Consulta múltiple de productos fallida sin tiempo para consultas individuales")
+                return {product_id: {'success': False, 'error': 'Tiempo límite de consulta agotado'} for product_id in product_ids}
+            logger.warning("Consulta múltiple de productos no disponible, se usan consultas individuales")
+            timeout = remaining
+
+        entries = fan_out(
+            self._get_product_entry,
+            product_ids,
+            max_concurrency=self.lookup_max_concurrency,
+            timeout=timeout
+        )
+
+        results = {}
+        for product_id, entry in zip(product_ids, entries):
+            if isinstance(entry, FanOutTimeout):
+                entry = {'success': False, 'error': 'Tiempo límite de consulta agotado'}
+            elif isinstance(entry, (FanOutCancelled, Exception)):
+                entry = {'success': False, 'error': str(entry) or 'Consulta cancelada'}
+            results[product_id] = entry
+        return results
+
+    def _get_product_entry(self, product_id: str) -> dict:
+        """Consulta individual de un producto con el error detallado"""
+        response, revalidated = self._conditional_get(product_id, 'product.get')
+        if revalidated is not None:
+            return {'success': True, 'data': revalidated}
+
+        if response is None:
+            return {'success': False, 'error': 'Servicio de contenido no disponible'}
+        if response.status_code == 404:
+            return {'success': False, 'error': 'Producto no encontrado', 'status_code': 404}
+        if response.status_code != 200:
+            return {'success': False, 'error': 'Error del servicio de contenido', 'status_code': response.status_code}
+
+        data = response.json()
+        if data.get('success') and data.get('data'):
+            self._store_product(product_id, data.get('data'), response)
+            return {'success': True, 'data': data.get('data')}
+        return {'success': False, 'error': 'Respuesta sin datos del producto'}
+
+    def _get_products_bulk(self, unique_ids: List[str], timeout: float) -> Optional[Dict[str, dict]]:
+        """Consulta múltiple contra el endpoint bulk; None si el endpoint falla"""
+        chunks = [unique_ids[i:i + self.bulk_max_ids] for i in range(0, len(unique_ids), self.bulk_max_ids)]
+        url = f"{self.base_url}{self.bulk_products_path}"
+
+        def fetch_chunk(chunk):
+            response = self._make_request('GET', url, endpoint = 'product.bulk.get', params={'ids': ','.join(chunk)})
+            if response is None or response.status_code != 200:
+                return None
+            data = response.json()
+            return data.get('data') if data.get('success') else None
+
+        pages = fan_out(fetch_chunk, chunks, max_concurrency=self.lookup_max_concurrency, timeout=timeout)
+        if any(page is None or isinstance(page, Exception) for page in pages):
+            return None
+
+        found = {}
+        for page in pages:
+            for product in page:
+                found[product.get('id')] = product
+                self.product_cache.put(product.get('id'), product)
+
+        return {
+            product_id: {'success': True, 'data': found[product_id]} if product_id in found
+                        else {'success': False, 'error': 'Producto no encontrado', 'status_code': 404}
+            for product_id in unique_ids
+        }
+
+
+def _may_have_reached_server(error: requests.exceptions.RequestException) -> bool:
+    """False solo si es seguro que la petición no llegó al servidor (no se pudo abrir la conexión)"""
+    if isinstance(error, requests.exceptions.ConnectTimeout):
+        return False
+    if isinstance(error, requests.exceptions.ConnectionError):
+        reason = getattr(error.args[0], 'reason', None) if error.args else None
+        return not isinstance(reason, NewConnectionError)
+    return isinstance(error, requests.exceptions.Timeout)
@@ -0,0 +1,104 @@
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+from threading import Lock
+from typing import Optional
+
+DEFAULT_HEDGE_WORKERS = 16
+
+_hedge_executor = None
+_hedge_executor_lock = Lock()
+
+
+def get_hedge_executor(max_workers: int = DEFAULT_HEDGE_WORKERS) -> ThreadPoolExecutor:
+    """
+    Pool propio de las peticiones con hedging. Es distinto del pool de fan-out
+    porque las lecturas con hedging se lanzan desde hilos de ese mismo pool
+    """
+    global _hedge_executor
+    with _hedge_executor_lock:
+        if _hedge_executor is None:
+            _hedge_executor = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix='hedge')
+        return _hedge_executor
+
+
+class HedgePolicy:
+    """
+    Decide si una lectura idempotente lanza una segunda petición idéntica cuando
+    la primera supera el percentil de latencia del endpoint. El hedging se
+    suspende solo si el endpoint falla demasiado o si ya se duplican demasiadas
+    peticiones, para no amplificar la carga de un microservicio degradado
+    """
+    def __init__(self, enabled: bool = False, percentile: float = 95, min_delay: float = 0.01,
+                 max_ratio: float = 0.1, max_error_rate: float = 0.2, window: int = 100):
+        self.enabled = enabled
+        self.percentile = percentile
+        self.min_delay = min_delay
+        self.max_ratio = max_ratio
+        self.max_error_rate = max_error_rate
+        self.window = window
+        self._recent = deque(maxlen=window) # True = la petición se duplicó
+        self._lock = Lock()
+
+        # Métricas
+        self.hedges_sent = 0
+        self.hedge_wins = 0
+        self.suppressed = 0
+
+    @classmethod
+    def from_config(cls, config) -> 'HedgePolicy':
+        return cls(
+            enabled = str(config.get('HEDGE_ENABLED', False)).lower() in ('true', '1', 'yes'),
+            percentile = float(config.get('HEDGE_PERCENTILE', 95)),
+            min_delay = float(config.get('HEDGE_MIN_DELAY_SECONDS', 0.01)),
+            max_ratio = float(config.get('HEDGE_MAX_RATIO', 0.1)),
+            max_error_rate = float(config.get('HEDGE_MAX_ERROR_RATE', 0.2)),
+            window = int(config.get('HEDGE_WINDOW', 100))
+        )
+
+    def hedge_delay(self, endpoint: str, latency) -> Optional[float]:
+        """Espera antes de duplicar la petición, o None si el endpoint aún no tiene percentil"""
+        if not self.enabled:
+            return None
+        observed = latency.percentile_of(endpoint, self.percentile)
+        if observed is None:
+            return None
+        return max(observed, self.min_delay)
+
+    def hedge_ratio(self) -> float:
+        with self._lock:
+            # Con la ventana aún sin llenar se divide por su tamaño: no basta un hedge para cortar
+            return sum(self._recent) / max(len(self._recent), self.window)
+
+    def record(self, hedged: bool):
+        with self._lock:
+            self._recent.append(hedged)
+            if hedged:
+                self.hedges_sent += 1
+
+    def try_hedge(self, endpoint: str, latency) -> bool:
+        """Comprueba los límites en el momento de duplicar la petición"""
+        if latency.error_rate(endpoint) > self.max_error_rate or self.hedge_ratio() >= self.max_ratio:
+            with self._lock:
+                self.suppressed += 1
+                self._recent.append(False)
+            return False
+        self.record(True)
+        return True
+
+    def record_win(self):
+        with self._lock:
+            self.hedge_wins += 1
+
+    def stats(self) -> dict:
+        ratio = self.hedge_ratio()
+        with self._lock:
+            return {
+                'enabled': self.enabled,
+                'percentile': self.percentile,
+                'hedges_sent': self.hedges_sent,
+                'hedge_wins': self.hedge_wins,
+                'suppressed': self.suppressed,
+                'hedge_ratio': round(ratio, 4),
+                'max_ratio': self.max_ratio,
+                'max_error_rate': self.max_error_rate
+            }
@@ -0,0 +1,116 @@
+from collections import deque
+from threading import Lock
+from typing import Optional, Tuple
+import math
+
+
+class _EndpointWindow:
+    def __init__(self, window_size: int):
+        self.samples = deque(maxlen=window_size) # Latencias (s) de las últimas llamadas
+        self.outcomes = deque(maxlen=window_size) # True = error
+        self.total = 0
+        self.errors = 0
+        self.sorted_cache = None
+
+
+class LatencyTracker:
+    """
+    Ventana deslizante de latencias por endpoint lógico. A partir de un percentil
+    configurable calcula los timeouts de conexión y lectura de cada endpoint,
+    acotados entre un suelo y un techo
+    """
+    def __init__(self, window_size: int = 200, percentile: float = 99, multiplier: float = 2.0,
+                 min_samples: int = 20, floor: float = 0.5, ceiling: Optional[float] = None,
+                 connect_timeout: float = 1.0):
+        self.window_size = window_size
+        self.percentile = percentile
+        self.multiplier = multiplier
+        self.min_samples = min_samples
+        self.floor = floor
+        self.ceiling = ceiling
+        self.connect_timeout = connect_timeout
+        self._windows = {}
+        self._lock = Lock()
+
+    @classmethod
+    def from_config(cls, config) -> 'LatencyTracker':
+        return cls(
+            window_size = int(config.get('ADAPTIVE_TIMEOUT_WINDOW', 200)),
+            percentile = float(config.get('ADAPTIVE_TIMEOUT_PERCENTILE', 99)),
+            multiplier = float(config.get('ADAPTIVE_TIMEOUT_MULTIPLIER', 2.0)),
+            min_samples = int(config.get('ADAPTIVE_TIMEOUT_MIN_SAMPLES', 20)),
+            floor = float(config.get('ADAPTIVE_TIMEOUT_FLOOR_SECONDS', 0.5)),
+            ceiling = float(config.get('ADAPTIVE_TIMEOUT_CEILING_SECONDS', 0)) or None,
+            connect_timeout = float(config.get('HTTP_CONNECT_TIMEOUT_SECONDS', 1.0))
+        )
+
+    def record(self, endpoint: str, seconds: float, error: bool = False):
+        with self._lock:
+            window = self._windows.get(endpoint)
+            if window is None:
+                window = self._windows[endpoint] = _EndpointWindow(self.window_size)
+            window.samples.append(seconds)
+            window.outcomes.append(error)
+            window.total += 1
+            window.errors += int(error)
+            window.sorted_cache = None
+
+    def _percentile_locked(self, window: _EndpointWindow, percentile: float) -> Optional[float]:
+        if not window.samples:
+            return None
+        if window.sorted_cache is None:
+            window.sorted_cache = sorted(window.samples)
+        ordered = window.sorted_cache
+        index = min(len(ordered) - 1, max(0, math.ceil(percentile / 100 * len(ordered)) - 1))
+        return ordered[index]
+
+    def percentile_of(self, endpoint: str, percentile: float) -> Optional[float]:
+        """Percentil de latencia (s) del endpoint o None si no hay muestras suficientes"""
+        with self._lock:
+            window = self._windows.get(endpoint)
+            if window is None or len(window.samples) < self.min_samples:
+                return None
+            return self._percentile_locked(window, percentile)
+
+    def error_rate(self, endpoint: str) -> float:
+        with self._lock:
+            window = self._windows.get(endpoint)
+            if window is None or not window.outcomes:
+                return 0.0
+            return sum(window.outcomes) / len(window.outcomes)
+
+    def timeouts_for(self, endpoint: str, default_timeout: float) -> Tuple[float, float]:
+        """(connect, read) para el endpoint; sin muestras suficientes se usa el timeout fijo"""
+        ceiling = self.ceiling or default_timeout
+        observed = self.percentile_of(endpoint, self.percentile)
+        if observed is None:
+            read_timeout = ceiling
+        else:
+            read_timeout = min(max(observed * self.multiplier, self.floor), ceiling)
+        return min(self.connect_timeout, read_timeout), read_timeout
+
+    def snapshot(self, default_timeout: float) -> dict:
+        """Estado actual de cada endpoint para el endpoint de diagnóstico"""
+        with self._lock:
+            endpoints = list(self._windows)
+        result = {}
+        for endpoint in endpoints:
+            connect_timeout, read_timeout = self.timeouts_for(endpoint, default_timeout)
+            with self._lock:
+                window = self._windows[endpoint]
+                p50 = self._percentile_locked(window, 50)
+                p95 = self._percentile_locked(window, 95)
+                p99 = self._percentile_locked(window, 99)
+                samples = len(window.samples)
+                total, errors = window.total, window.errors
+            result[endpoint] = {
+                'samples': samples,
+                'calls': total,
+                'errors': errors,
+                'p50_ms': round(p50 * 1000, 2) if p50 is not None else None,
+                'p95_ms': round(p95 * 1000, 2) if p95 is not None else None,
+                'p99_ms': round(p99 * 1000, 2) if p99 is not None else None,
+                'connect_timeout_s': round(connect_timeout, 3),
+                'read_timeout_s': round(read_timeout, 3)
+            }
+        return result
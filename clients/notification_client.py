@@ -1,8 +1,5 @@
 import requests
-from typing import Optional
-from flask import current_app
-from circuitbreaker import circuit
-from config import CircuitBreakerPersonalizado
+from typing import List, Optional
 from clients.base_client import BaseClient
 import logging
 
@@ -14,15 +11,18 @@ class NotificationClient(BaseClient):
         super().__init__(app, "notification-service")
         self.base_url = app.config.get('NOTIFICATION_SERVICE_URL')
         self.timeout = 5
+        self.batch_path = app.config.get('NOTIFICATION_BATCH_PATH', '/batch')
+        self.batch_supported = bool(self.batch_path)
 
-    @circuit(cls=CircuitBreakerPersonalizado)
     def realizar_notificacion(self, contenido: dict):
         """Envía una notificación de acción realizada"""
         try:
             url = f"{self.base_url}/"
 
-            response = self._make_request('POST', url, json = contenido)
+            response = self._make_request('POST', url, endpoint = 'notification.create', json = contenido)
 
+            if response is None:
+                return None
             if response.status_code == 404:
                 return None
             if response.status_code >= 500:
@@ -35,7 +35,32 @@ class NotificationClient(BaseClient):
             return data    
 
         except requests.exceptions.ConnectionError as e:
-            raise Exception("Servicio de contenido no disponible")
+            raise Exception("Servicio de notificaciones no disponible")
         except requests.exceptions.RequestException as e:
-            current_app.logger.error(f"Error insertar una notificacion al microservicio")
-            return None
\ No newline at end of file
+            logger.error(f"Error insertar una notificacion al microservicio")
+            return None
+
+    def realizar_notificaciones(self, contenidos: List[dict]) -> bool:
+        """
+        Envía un lote de notificaciones en un solo POST. Si el microservicio no
+        expone el endpoint de lotes (404/405) se envían una a una a partir de entonces
+        """
+        if self.batch_supported and len(contenidos) > 1:
+            try:
+                url = f"{self.base_url}{self.batch_path}"
+                response = self._make_request('POST', url, endpoint = 'notification.batch', json = contenidos)
+
+                if response is None:
+                    return False
+                if response.status_code in (404, 405):
+                    logger.warning("El microservicio de notificaciones no admite lotes: se envían una a una")
+                    self.batch_supported = False
+                else:
+                    response.raise_for_status()
+                    return True
+
+            except requests.exceptions.RequestException as e:
+                logger.error(f"Error enviando un lote de {len(contenidos)} notificaciones: {e}")
+                return False
+
+        return all([self.realizar_notificacion(contenido) is not None for contenido in contenidos])
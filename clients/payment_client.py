@@ -1,7 +1,5 @@
 import requests
 from typing import Optional
-from circuitbreaker import circuit
-from config import CircuitBreakerPersonalizado, eureka_client
 from clients.base_client import BaseClient
 import logging
 
@@ -14,26 +12,17 @@ class PaymentClient(BaseClient):
         self.base_url = app.config.get('PAYMENT_SERVICE_URL')
         self.timeout = 5
     
-    def _get_payment_service_url(self) -> str:
-        try:
-            return eureka_client.get_app_url(self.service_name)
-        except Exception as e:
-            logger.error(f"Error obteniendo la URL para {self.service_name}: {e}")
-            return ""
-
-
-    @circuit(cls=CircuitBreakerPersonalizado)
-    def procesamiento_pagos(self, order_data: dict) -> Optional[dict]:
+    def procesamiento_pagos(self, order_data: dict, idempotency_key: Optional[str] = None) -> Optional[dict]:
         """
         Procesamiento de un pago a través del microservicio de pagos
-        Utiliza el método POST /api/payments
+        Utiliza el método POST /api/payments. Con idempotency_key el POST se puede reintentar
         """
         try:
             
             url = f"{self.base_url}/api/payments"
             
-            response = self._make_request('POST', url, json = order_data)
-            #baseUrl = self._get_user_service_url() -> Eureka
+            response = self._make_request('POST', url, endpoint = 'payment.create',
+                                          idempotency_key = idempotency_key, json = order_data)
             logger.info(f"Enviado pago al microservicio: {url}")
 
             if response.status_code == 200:
@@ -73,7 +62,6 @@ class PaymentClient(BaseClient):
                 'error': f'Error inesperado: {str(e)}'
             }
         
-    @circuit(cls=CircuitBreakerPersonalizado)
     def update_payment_status(self, purchase_id: str, status: str) -> Optional[dict]:
         """
         Actualizar el estado de un pago
@@ -87,7 +75,10 @@ class PaymentClient(BaseClient):
                 'status': 'COMPLETED'
             }
 
-            response = self._make_request('PATCH', url, json = payment_payload)
+            # Fijar un estado absoluto es idempotente: se puede reintentar con seguridad
+            response = self._make_request('PATCH', url, endpoint = 'payment.status.patch',
+                                          idempotency_key = f"{purchase_id}:{payment_payload['status']}",
+                                          json = payment_payload)
 
             if response.status_code == 200:
                 logger.info(f"Modificado correctamente el estado de pago en el que se encuentra {purchase_id}")
@@ -125,7 +116,6 @@ class PaymentClient(BaseClient):
                 'error': f'Error inesperado: {str(e)}'
             }
         
-    @circuit(cls=CircuitBreakerPersonalizado)    
     def get_payment_satus(self, purchase_id : str) -> Optional[dict]:
         """
         Comprobación del estado de un pago
@@ -139,7 +129,7 @@ class PaymentClient(BaseClient):
                 'purchaseId' : purchase_id
             }
 
-            response = self._make_request('GET', url, params = params)
+            response = self._make_request('GET', url, endpoint = 'payment.get', params = params)
 
             if response.status_code == 200:
                 logger.info(f"Respuesta satisfactoria con parámetro: {purchase_id}")
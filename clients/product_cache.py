@@ -0,0 +1,136 @@
+from helpers.ttl_cache import TTLCache
+from threading import Lock
+from typing import Iterable, Optional, Tuple
+import time
+
+class _ProductEntry:
+    def __init__(self, document: Optional[dict], fetched_at: float,
+                 etag: Optional[str] = None, last_modified: Optional[str] = None):
+        self.document = document # None = producto inexistente (404)
+        self.fetched_at = fetched_at
+        self.stale_fields = set()
+        # Validadores HTTP para revalidar con un GET condicional
+        self.etag = etag
+        self.last_modified = last_modified
+
+
+class ProductCache:
+    """
+    Caché de productos del microservicio de contenido con TTL por campo:
+    los datos descriptivos (nombre, imagen, artista...) viven mucho y el precio
+    o el stock poco o nada. Incluye caché negativa para los 404. Las entradas con
+    ETag/Last-Modified se conservan validator_ttl para revalidarlas con un GET
+    condicional aunque ya estén caducadas
+    """
+    def __init__(self, max_entries: int = 2048, static_ttl: float = 600, price_ttl: float = 30,
+                 stock_ttl: float = 0, negative_ttl: float = 30, validator_ttl: float = 3600,
+                 clock=time.monotonic):
+        self.static_ttl = static_ttl
+        self.validator_ttl = validator_ttl
+        self.field_ttls = {'price': price_ttl, 'stock': stock_ttl} # Campos volátiles con TTL propio
+        self.negative_ttl = negative_ttl
+        self._clock = clock
+        self._entries = TTLCache(max_entries=max_entries, default_ttl=static_ttl, clock=clock)
+        self._lock = Lock()
+
+        # Métricas
+        self.hits = 0
+        self.misses = 0
+        self.negative_hits = 0
+
+    @classmethod
+    def from_config(cls, config) -> 'ProductCache':
+        return cls(
+            max_entries = int(config.get('PRODUCT_CACHE_MAX_ENTRIES', 2048)),
+            static_ttl = float(config.get('PRODUCT_CACHE_STATIC_TTL', 600)),
+            price_ttl = float(config.get('PRODUCT_CACHE_PRICE_TTL', 30)),
+            stock_ttl = float(config.get('PRODUCT_CACHE_STOCK_TTL', 0)),
+            negative_ttl = float(config.get('PRODUCT_CACHE_NEGATIVE_TTL', 30)),
+            validator_ttl = float(config.get('PRODUCT_CACHE_VALIDATOR_TTL', 3600))
+        )
+
+    def lookup(self, product_id: str, fields: Iterable[str] = ()) -> Tuple[bool, Optional[dict]]:
+        """
+        Busca un producto exigiendo que los campos volátiles indicados estén frescos.
+        Devuelve (encontrado, documento); (True, None) indica un 404 cacheado
+        """
+        entry = self._entries.get(product_id)
+        now = self._clock()
+
+        with self._lock:
+            if entry is None:
+                self.misses += 1
+                return False, None
+
+            if entry.document is None:
+                self.negative_hits += 1
+                return True, None
+
+            age = now - entry.fetched_at
+            if age >= self.static_ttl:
+                self.misses += 1
+                return False, None
+            for field in fields:
+                if field in entry.stale_fields or age >= self.field_ttls.get(field, self.static_ttl):
+                    self.misses += 1
+                    return False, None
+
+            self.hits += 1
+            return True, dict(entry.document)
+
+    def put(self, product_id: str, document: dict, etag: Optional[str] = None, last_modified: Optional[str] = None):
+        entry = _ProductEntry(dict(document), self._clock(), etag, last_modified)
+        ttl = max(self.static_ttl, self.validator_ttl) if (etag or last_modified) else self.static_ttl
+        self._entries.set(product_id, entry, ttl)
+
+    def conditional_headers(self, product_id: str) -> dict:
+        """Cabeceras If-None-Match / If-Modified-Since del producto cacheado, si tiene validadores"""
+        entry = self._entries.get(product_id)
+        headers = {}
+        if entry is None or entry.document is None:
+            return headers
+        if entry.etag:
+            headers['If-None-Match'] = entry.etag
+        if entry.last_modified:
+            headers['If-Modified-Since'] = entry.last_modified
+        return headers
+
+    def revalidate(self, product_id: str) -> Optional[dict]:
+        """Tras un 304 el documento cacheado vuelve a estar fresco; None si ya no está en caché"""
+        entry = self._entries.get(product_id)
+        if entry is None or entry.document is None:
+            return None
+        self.put(product_id, entry.document, entry.etag, entry.last_modified)
+        return dict(entry.document)
+
+    def put_not_found(self, product_id: str):
+        self._entries.set(product_id, _ProductEntry(None, self._clock()), self.negative_ttl)
+
+    def invalidate(self, product_id: str):
+        """Descarta el producto completo (p.ej. tras editarse en contenido)"""
+        self._entries.invalidate(product_id)
+
+    def invalidate_fields(self, product_id: str, fields: Iterable[str]):
+        """Marca como caducados solo algunos campos (p.ej. el stock tras un PATCH)"""
+        entry = self._entries.get(product_id)
+        if entry is not None:
+            with self._lock:
+                entry.stale_fields.update(fields)
+
+    def clear(self):
+        self._entries.clear()
+
+    def stats(self) -> dict:
+        entries_stats = self._entries.stats()
+        with self._lock:
+            lookups = self.hits + self.misses + self.negative_hits
+            return {
+                'entries': entries_stats['entries'],
+                'max_entries': entries_stats['max_entries'],
+                'hits': self.hits,
+                'negative_hits': self.negative_hits,
+                'misses': self.misses,
+                'hit_ratio': round((self.hits + self.negative_hits) / lookups, 4) if lookups else None,
+                'evictions': entries_stats['evictions'],
+                'expirations': entries_stats['expirations']
+            }
@@ -0,0 +1,149 @@
+from collections import deque
+from email.utils import parsedate_to_datetime
+from datetime import datetime, timezone
+from threading import Lock
+from typing import Optional
+import random
+import time
+import requests
+
+# Estados que indican un fallo transitorio del microservicio destino
+RETRYABLE_STATUS = frozenset({429, 502, 503, 504})
+IDEMPOTENT_METHODS = frozenset({'GET', 'HEAD', 'OPTIONS', 'PUT', 'DELETE'})
+
+
+class RetryPolicy:
+    """
+    Política de reintentos de un endpoint: backoff exponencial con jitter
+    completo, respetando Retry-After. Los métodos no idempotentes (POST, PATCH)
+    solo se reintentan si la petición lleva clave de idempotencia
+    """
+    def __init__(self, max_attempts: int = 3, base_delay: float = 0.1, max_delay: float = 2.0,
+                 retry_statuses=RETRYABLE_STATUS, max_retry_after: Optional[float] = None):
+        self.max_attempts = max(1, int(max_attempts))
+        self.base_delay = base_delay
+        self.max_delay = max_delay
+        self.retry_statuses = frozenset(retry_statuses)
+        # Un Retry-After mayor que esto no se espera: se devuelve la respuesta tal cual
+        self.max_retry_after = max_delay if max_retry_after is None else max_retry_after
+
+    @classmethod
+    def from_config(cls, config) -> 'RetryPolicy':
+        return cls(
+            max_attempts = int(config.get('RETRY_MAX_ATTEMPTS', 3)),
+            base_delay = float(config.get('RETRY_BASE_DELAY_SECONDS', 0.1)),
+            max_delay = float(config.get('RETRY_MAX_DELAY_SECONDS', 2.0))
+        )
+
+    def allows_method(self, method: str, idempotency_key: Optional[str]) -> bool:
+        return method.upper() in IDEMPOTENT_METHODS or bool(idempotency_key)
+
+    def is_retryable(self, response: Optional[requests.Response], error: Optional[Exception]) -> bool:
+        if error is not None:
+            return isinstance(error, (requests.exceptions.ConnectionError, requests.exceptions.Timeout))
+        return response is not None and response.status_code in self.retry_statuses
+
+    def backoff(self, attempt: int) -> float:
+        """Espera antes del reintento nº attempt (1, 2, ...) con jitter completo"""
+        return random.uniform(0, min(self.max_delay, self.base_delay * (2 ** (attempt - 1))))
+
+    @staticmethod
+    def retry_after(response: Optional[requests.Response]) -> Optional[float]:
+        """Segundos indicados por la cabecera Retry-After (segundos o fecha HTTP)"""
+        if response is None:
+            return None
+        value = response.headers.get('Retry-After') if hasattr(response, 'headers') else None
+        if not value or not isinstance(value, str):
+            return None
+        try:
+            return max(float(value), 0.0)
+        except ValueError:
+            pass
+        try:
+            retry_at = parsedate_to_datetime(value)
+            return max((retry_at - datetime.now(timezone.utc)).total_seconds(), 0.0)
+        except (TypeError, ValueError):
+            return None
+
+
+class RetryBudget:
+    """
+    Presupuesto de reintentos del proceso: en la ventana deslizante los
+    reintentos no pueden superar ratio * peticiones (más un mínimo fijo), así los
+    reintentos no multiplican la carga de un microservicio caído
+    """
+    def __init__(self, ratio: float = 0.1, window_seconds: float = 10, min_retries: int = 5):
+        self.ratio = ratio
+        self.window_seconds = window_seconds
+        self.min_retries = min_retries
+        self._events = deque() # (instante, es_reintento)
+        self._requests = 0
+        self._retries = 0
+        self._lock = Lock()
+
+        # Métricas acumuladas
+        self.total_requests = 0
+        self.total_retries = 0
+        self.rejected_retries = 0
+
+    def _expire(self, now: float):
+        while self._events and now - self._events[0][0] > self.window_seconds:
+            _, is_retry = self._events.popleft()
+            if is_retry:
+                self._retries -= 1
+            else:
+                self._requests -= 1
+
+    def record_request(self):
+        with self._lock:
+            now = time.monotonic()
+            self._expire(now)
+            self._events.append((now, False))
+            self._requests += 1
+            self.total_requests += 1
+
+    def try_acquire_retry(self) -> bool:
+        with self._lock:
+            now = time.monotonic()
+            self._expire(now)
+            if self._retries >= self.min_retries + self.ratio * self._requests:
+                self.rejected_retries += 1
+                return False
+            self._events.append((now, True))
+            self._retries += 1
+            self.total_retries += 1
+            return True
+
+    def stats(self) -> dict:
+        with self._lock:
+            self._expire(time.monotonic())
+            return {
+                'ratio': self.ratio,
+                'window_seconds': self.window_seconds,
+                'window_requests': self._requests,
+                'window_retries': self._retries,
+                'total_requests': self.total_requests,
+                'total_retries': self.total_retries,
+                'rejected_retries': self.rejected_retries
+            }
+
+
+_retry_budget = None
+_retry_budget_lock = Lock()
+
+def get_retry_budget(app) -> RetryBudget:
+    """Presupuesto de reintentos compartido por todos los clientes del proceso"""
+    global _retry_budget
+    with _retry_budget_lock:
+        if _retry_budget is None:
+            _retry_budget = RetryBudget(
+                ratio = float(app.config.get('RETRY_BUDGET_RATIO', 0.1)),
+                window_seconds = float(app.config.get('RETRY_BUDGET_WINDOW_SECONDS', 10)),
+                min_retries = int(app.config.get('RETRY_BUDGET_MIN_RETRIES', 5))
+            )
+        return _retry_budget
+
+def reset_retry_budget():
+    global _retry_budget
+    with _retry_budget_lock:
+        _retry_budget = None
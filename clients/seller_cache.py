@@ -0,0 +1,144 @@
+from helpers.ttl_cache import TTLCache
+from helpers.single_flight import SingleFlight
+from helpers.fanout import get_executor
+from threading import Lock
+from typing import Callable, Optional, Tuple
+import time
+import logging
+
+logger = logging.getLogger(__name__)
+
+# Resultado de consultar un vendedor al microservicio de usuarios
+SELLER_FOUND = 'found'
+SELLER_NOT_FOUND = 'not_found'
+SELLER_ERROR = 'error' # Fallo transitorio: no se cachea
+
+
+class _SellerEntry:
+    def __init__(self, seller: Optional[dict], fetched_at: float):
+        self.seller = seller # None = vendedor inexistente (404)
+        self.fetched_at = fetched_at
+
+
+class SellerCache:
+    """
+    Caché de vendedores (username -> datos del artista) con stale-while-revalidate:
+    pasado ttl la entrada se sigue sirviendo durante stale_ttl mientras se refresca
+    en segundo plano. Los vendedores inexistentes se cachean negative_ttl
+    """
+    def __init__(self, max_entries: int = 4096, ttl: float = 3600, stale_ttl: float = 86400,
+                 negative_ttl: float = 60, clock=time.monotonic):
+        self.ttl = ttl
+        self.stale_ttl = stale_ttl
+        self.negative_ttl = negative_ttl
+        self._clock = clock
+        self._entries = TTLCache(max_entries=max_entries, default_ttl=ttl + stale_ttl, clock=clock)
+        self._loads = SingleFlight() # Una sola consulta en vuelo por vendedor
+        self._refreshing = set()
+        self._lock = Lock()
+
+        # Métricas
+        self.hits = 0
+        self.stale_hits = 0
+        self.negative_hits = 0
+        self.misses = 0
+        self.refreshes = 0
+        self.refresh_errors = 0
+
+    @classmethod
+    def from_config(cls, config) -> 'SellerCache':
+        return cls(
+            max_entries = int(config.get('SELLER_CACHE_MAX_ENTRIES', 4096)),
+            ttl = float(config.get('SELLER_CACHE_TTL', 3600)),
+            stale_ttl = float(config.get('SELLER_CACHE_STALE_TTL', 86400)),
+            negative_ttl = float(config.get('SELLER_CACHE_NEGATIVE_TTL', 60))
+        )
+
+    def get(self, username: str, loader: Callable[[str], Tuple[str, Optional[dict]]]) -> Optional[dict]:
+        """
+        Devuelve el vendedor cacheado o lo carga con loader(username) -> (resultado, vendedor).
+        Una entrada caducada pero dentro de stale_ttl se devuelve al momento y se refresca aparte
+        """
+        entry = self._entries.get(username)
+        if entry is not None:
+            age = self._clock() - entry.fetched_at
+            if entry.seller is None:
+                if age < self.negative_ttl:
+                    with self._lock:
+                        self.negative_hits += 1
+                    return None
+            elif age < self.ttl:
+                with self._lock:
+                    self.hits += 1
+                return dict(entry.seller)
+            else:
+                with self._lock:
+                    self.stale_hits += 1
+                self._refresh_in_background(username, loader)
+                return dict(entry.seller)
+
+        with self._lock:
+            self.misses += 1
+        _, seller = self._loads.do(username, lambda: self._load(username, loader))
+        return dict(seller) if seller is not None else None
+
+    def is_fresh(self, username: str) -> bool:
+        entry = self._entries.get(username)
+        if entry is None:
+            return False
+        ttl = self.negative_ttl if entry.seller is None else self.ttl
+        return self._clock() - entry.fetched_at < ttl
+
+    def _load(self, username: str, loader) -> Tuple[str, Optional[dict]]:
+        outcome, seller = loader(username)
+        if outcome == SELLER_FOUND and seller is not None:
+            self._entries.set(username, _SellerEntry(dict(seller), self._clock()))
+        elif outcome == SELLER_NOT_FOUND:
+            self._entries.set(username, _SellerEntry(None, self._clock()), self.negative_ttl)
+        return outcome, seller
+
+    def _refresh_in_background(self, username: str, loader):
+        with self._lock:
+            if username in self._refreshing:
+                return
+            self._refreshing.add(username)
+            self.refreshes += 1
+
+        def refresh():
+            try:
+                outcome, _ = self._load(username, loader)
+                if outcome == SELLER_ERROR:
+                    with self._lock:
+                        self.refresh_errors += 1 # Se sigue sirviendo la copia antigua
+            except Exception as e:
+                with self._lock:
+                    self.refresh_errors += 1
+                logger.warning(f"Error refrescando el vendedor {username}: {e}")
+            finally:
+                with self._lock:
+                    self._refreshing.discard(username)
+
+        get_executor().submit(refresh)
+
+    def invalidate(self, username: str):
+        self._entries.invalidate(username)
+
+    def clear(self):
+        self._entries.clear()
+
+    def stats(self) -> dict:
+        entries_stats = self._entries.stats()
+        with self._lock:
+            lookups = self.hits + self.stale_hits + self.negative_hits + self.misses
+            return {
+                'entries': entries_stats['entries'],
+                'max_entries': entries_stats['max_entries'],
+                'hits': self.hits,
+                'stale_hits': self.stale_hits,
+                'negative_hits': self.negative_hits,
+                'misses': self.misses,
+                'hit_ratio': round((lookups - self.misses) / lookups, 4) if lookups else None,
+                'background_refreshes': self.refreshes,
+                'refresh_errors': self.refresh_errors,
+                'evictions': entries_stats['evictions']
+            }
@@ -0,0 +1,232 @@
+import json
+import os
+import random
+import threading
+import time
+import logging
+from typing import Dict, Iterable, List, Optional
+
+logger = logging.getLogger(__name__)
+
+STRATEGY_P2C = 'p2c'
+STRATEGY_LEAST_OUTSTANDING = 'least_outstanding'
+
+
+class FileRegistrySource:
+    """
+    Registro falso leído de un fichero JSON, para pruebas sin Eureka:
+    {"content-service": ["http://localhost:8080", "http://localhost:8090"]}
+    """
+    def __init__(self, path: str):
+        self.path = path
+
+    def fetch(self, service_names: Iterable[str]) -> Dict[str, List[str]]:
+        with open(self.path, encoding='utf-8') as registry_file:
+            registry = {name.lower(): urls for name, urls in json.load(registry_file).items()}
+        return {name: list(registry.get(name, [])) for name in service_names}
+
+
+class EurekaRegistrySource:
+    """Instancias UP de cada aplicación según el registro descargado por el cliente de Eureka"""
+    def fetch(self, service_names: Iterable[str]) -> Dict[str, List[str]]:
+        from config import eureka_client
+        client = eureka_client.get_client()
+        if client is None:
+            raise RuntimeError("Cliente de Eureka no inicializado")
+        snapshot = {}
+        for name in service_names:
+            urls = []
+            for instance in client.applications.get_application(name).up_instances:
+                if instance.securePort.enabled:
+                    urls.append(f"https://{instance.ipAddr}:{instance.securePort.port}")
+                else:
+                    urls.append(f"http://{instance.ipAddr}:{instance.port.port}")
+            snapshot[name] = urls
+        return snapshot
+
+
+class _InstanceState:
+    def __init__(self, url: str):
+        self.url = url
+        self.outstanding = 0
+        self.consecutive_failures = 0
+        self.ejected_until = 0.0
+        self.requests = 0
+        self.failures = 0
+        self.ejections = 0
+
+
+class ServiceRegistry:
+    """
+    Copia local del registro de instancias, refrescada en segundo plano, con
+    balanceo en cliente (power-of-two-choices o menos peticiones en curso) y
+    expulsión temporal de las instancias que fallan seguido
+    """
+    def __init__(self, source, refresh_interval: float = 30, strategy: str = STRATEGY_P2C,
+                 eject_after_failures: int = 3, eject_seconds: float = 30,
+                 max_ejected_ratio: float = 0.5, clock=time.monotonic):
+        self.source = source
+        self.refresh_interval = refresh_interval
+        self.strategy = strategy
+        self.eject_after_failures = eject_after_failures
+        self.eject_seconds = eject_seconds
+        self.max_ejected_ratio = max_ejected_ratio
+        self._clock = clock
+        self._services = set()
+        self._instances = {} # servicio -> {url: _InstanceState}
+        self._lock = threading.Lock()
+        self._stop = threading.Event()
+        self._thread = None
+        self.last_refresh = None
+        self.refresh_errors = 0
+
+    def watch(self, service_name: str):
+        """Registra un servicio a resolver y arranca el refresco en segundo plano"""
+        service_name = service_name.lower()
+        with self._lock:
+            is_new = service_name not in self._services
+            self._services.add(service_name)
+        if is_new:
+            self.refresh()
+        self._start()
+
+    def _start(self):
+        with self._lock:
+            if self._thread is not None or self.refresh_interval <= 0:
+                return
+            self._thread = threading.Thread(target=self._refresh_loop, name='service-registry', daemon=True)
+            self._thread.start()
+
+    def _refresh_loop(self):
+        while not self._stop.wait(self.refresh_interval):
+            self.refresh()
+
+    def refresh(self):
+        """Descarga la lista de instancias; si falla se conserva la copia anterior"""
+        with self._lock:
+            services = set(self._services)
+        try:
+            snapshot = self.source.fetch(services)
+        except Exception as e:
+            self.refresh_errors += 1
+            logger.warning(f"No se pudo refrescar el registro de servicios: {e}")
+            return
+
+        with self._lock:
+            for name in services:
+                current = self._instances.get(name, {})
+                # Se conserva el estado (peticiones en curso, expulsiones) de las que siguen
+                self._instances[name] = {url: current.get(url) or _InstanceState(url) for url in snapshot.get(name, [])}
+            self.last_refresh = time.time()
+
+    def stop(self):
+        self._stop.set()
+
+    def acquire(self, service_name: str) -> Optional[str]:
+        """Elige una instancia para la petición; None si el registro no tiene ninguna"""
+        with self._lock:
+            instances = list(self._instances.get(service_name.lower(), {}).values())
+            if not instances:
+                return None
+
+            now = self._clock()
+            candidates = [instance for instance in instances if instance.ejected_until <= now]
+            if not candidates:
+                # Todas expulsadas: mejor probar la que antes vuelve que no enviar nada
+                candidates = [min(instances, key=lambda instance: instance.ejected_until)]
+
+            if self.strategy == STRATEGY_LEAST_OUTSTANDING or len(candidates) <= 2:
+                chosen = min(candidates, key=lambda instance: instance.outstanding)
+            else:
+                first, second = random.sample(candidates, 2)
+                chosen = first if first.outstanding <= second.outstanding else second
+
+            chosen.outstanding += 1
+            chosen.requests += 1
+            return chosen.url
+
+    def release(self, service_name: str, url: str, success: bool):
+        """Informa del resultado de la petición enviada a la instancia"""
+        with self._lock:
+            instances = self._instances.get(service_name.lower(), {})
+            instance = instances.get(url)
+            if instance is None:
+                return # La instancia desapareció del registro mientras tanto
+            instance.outstanding = max(instance.outstanding - 1, 0)
+            if success:
+                instance.consecutive_failures = 0
+                return
+
+            instance.failures += 1
+            instance.consecutive_failures += 1
+            if instance.consecutive_failures < self.eject_after_failures:
+                return
+
+            now = self._clock()
+            ejected = sum(1 for other in instances.values() if other.ejected_until > now)
+            if ejected + 1 > self.max_ejected_ratio * len(instances):
+                return # No se expulsan tantas que el resto quede saturado
+            instance.ejected_until = now + self.eject_seconds
+            instance.consecutive_failures = 0
+            instance.ejections += 1
+            logger.warning(f"Instancia {url} de {service_name} expulsada durante {self.eject_seconds}s")
+
+    def snapshot(self, service_name: str) -> dict:
+        now = self._clock()
+        with self._lock:
+            return {
+                'strategy': self.strategy,
+                'last_refresh': self.last_refresh,
+                'refresh_errors': self.refresh_errors,
+                'instances': {
+                    url: {
+                        'outstanding': instance.outstanding,
+                        'requests': instance.requests,
+                        'failures': instance.failures,
+                        'ejections': instance.ejections,
+                        'ejected': instance.ejected_until > now
+                    }
+                    for url, instance in self._instances.get(service_name.lower(), {}).items()
+                }
+            }
+
+
+_service_registry = None
+_service_registry_lock = threading.Lock()
+
+def get_service_registry(app) -> Optional[ServiceRegistry]:
+    """
+    Registro compartido por los clientes del proceso según SERVICE_DISCOVERY_MODE:
+    'static' (URLs fijas, sin registro), 'eureka' o 'file' (EUREKA_REGISTRY_FILE)
+    """
+    global _service_registry
+    mode = str(app.config.get('SERVICE_DISCOVERY_MODE', 'static')).lower()
+    if mode not in ('eureka', 'file'):
+        return None
+
+    with _service_registry_lock:
+        if _service_registry is None:
+            if mode == 'file':
+                source = FileRegistrySource(app.config.get('EUREKA_REGISTRY_FILE') or os.path.join(os.getcwd(), 'registry.json'))
+            else:
+                from config import eureka_client
+                if eureka_client.get_client() is None:
+                    # Sin cliente todas las llamadas irían en silencio a las URLs fijas
+                    raise RuntimeError("SERVICE_DISCOVERY_MODE=eureka pero el cliente de Eureka no está inicializado (EurekaConfig.init_eureka)")
+                source = EurekaRegistrySource()
+            _service_registry = ServiceRegistry(
+                source,
+                refresh_interval = float(app.config.get('SERVICE_REGISTRY_REFRESH_SECONDS', 30)),
+                strategy = str(app.config.get('LB_STRATEGY', STRATEGY_P2C)).lower(),
+                eject_after_failures = int(app.config.get('LB_EJECT_AFTER_FAILURES', 3)),
+                eject_seconds = float(app.config.get('LB_EJECT_SECONDS', 30)),
+                max_ejected_ratio = float(app.config.get('LB_MAX_EJECTED_RATIO', 0.5))
+            )
+        return _service_registry
+
+def reset_service_registry():
+    global _service_registry
+    with _service_registry_lock:
+        if _service_registry is not None:
+            _service_registry.stop()
+        _service_registry = None
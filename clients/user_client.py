@@ -1,8 +1,8 @@
 import requests
-from typing import Optional
-from circuitbreaker import circuit
-from config import CircuitBreakerPersonalizado, eureka_client
+from typing import Dict, Iterable, Optional, Tuple
 from clients.base_client import BaseClient
+from clients.seller_cache import SellerCache, SELLER_FOUND, SELLER_NOT_FOUND, SELLER_ERROR
+from helpers.fanout import fan_out
 import logging
 
 logger = logging.getLogger(__name__)
@@ -13,35 +13,57 @@ class UserClient(BaseClient):
         #self.service_name = "user-service"  # Nombre que tiene registrado Eureka para el microservicio de usuarios
         self.base_url = app.config.get('USERS_SERVICE_URL')
         self.timeout = 5
+        self.lookup_max_concurrency = int(app.config.get('SELLER_LOOKUP_MAX_CONCURRENCY', 8))
+        self.seller_cache = SellerCache.from_config(app.config)
     
-    def _get_user_service_url(self) -> str:
-        try:
-            return eureka_client.get_app_url(self.service_name)
-        except Exception as e:
-            logger.error(f"Error obteniendo la URL para {self.service_name}: {e}")
-            return ""
-
+    def get_diagnostics(self) -> dict:
+        diagnostics = super().get_diagnostics()
+        diagnostics['seller_cache'] = self.seller_cache.stats()
+        return diagnostics
 
-    @circuit(cls=CircuitBreakerPersonalizado)
     def get_seller_by_username(self, username: str) -> Optional[dict]:
+        """Datos del artista a partir de su username (cacheados, ver SellerCache)"""
+        return self.seller_cache.get(username, self._fetch_seller)
+
+    def prefetch_sellers(self, usernames: Iterable[str]) -> Dict[str, Optional[dict]]:
+        """Resuelve a la vez todos los vendedores de una compra; solo consulta los que no están frescos en caché"""
+        unique = list(dict.fromkeys(username for username in usernames if username))
+        sellers = {}
+        missing = []
+        for username in unique:
+            if self.seller_cache.is_fresh(username):
+                sellers[username] = self.get_seller_by_username(username)
+            else:
+                missing.append(username)
+
+        if missing:
+            results = fan_out(self.get_seller_by_username, missing, max_concurrency=self.lookup_max_concurrency)
+            for username, seller in zip(missing, results):
+                sellers[username] = None if isinstance(seller, Exception) else seller
+
+        return {username: sellers[username] for username in unique}
+
+    def _fetch_seller(self, username: str) -> Tuple[str, Optional[dict]]:
         
         try:
             
             url = f"{self.base_url}/api/artist/public/{username}"
-            response = self._make_request('GET', url)
-            #baseUrl = self._get_user_service_url() -> Eureka
+            response = self._make_request('GET', url, endpoint = 'seller.get')
+
+            if response is None:
+                return SELLER_ERROR, None
 
             if response.status_code == 404:
                 logger.error("No retorna nada")
-                return None
+                return SELLER_NOT_FOUND, None
 
             response.raise_for_status()
 
-            return response.json()
+            return SELLER_FOUND, response.json()
 
         except requests.exceptions.ConnectionError as e:
             logger.error("Servidor de usuarios no disponible")
-            return None
+            return SELLER_ERROR, None
         except requests.exceptions.RequestException as e:
             logger.error(f"Error al intentar obtener el usuario {username}: {e}")    
-            return None    
\ No newline at end of file
+            return SELLER_ERROR, None
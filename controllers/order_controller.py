@@ -5,6 +5,7 @@ from decorator.tokenDecorator import token_required
 from decorator.logRequestDecorator import log
 from datetime import datetime
 from helpers.ApiExceptions import APIException
+from helpers.request_timing import start_request_timing, current_timing, end_request_timing
 import json
 import requests
 import boto3
@@ -15,6 +16,22 @@ logger = logging.getLogger(__name__)
 
 order_bp = Blueprint('order_bp', __name__)
 
+@order_bp.before_request
+def start_timing():
+    # Contexto de tiempos de la petición: auth, db y microservicios registran en él
+    start_request_timing()
+
+@order_bp.after_request
+def add_server_timing(response):
+    timing = current_timing()
+    if timing is not None:
+        response.headers['Server-Timing'] = timing.header()
+    return response
+
+@order_bp.teardown_request
+def end_timing(exc):
+    end_request_timing()
+
 lambda_client = boto3.client('lambda', region_name = 'us-east-1')
 
 @order_bp.route('/orders/stats/lambda', methods=['GET'])
@@ -336,7 +353,7 @@ def confirm_order(orderId: str):
         # 7. Obtenemos la información del pedido actualizada
         order_info = payment_result['transaction_data']
         
-        if not order_info['success']:
+        if not payment_result['success']:
 
             raise APIException(
                 message=f'Error en el procesamiento del pago',
@@ -1,4 +1,5 @@
 from model.order_model_ import Order, OrderItem, OrderStatus
+from dao.outbox_dao import OutboxDAO
 from typing import Optional, Tuple, List
 from sqlalchemy import desc
 from datetime import datetime
@@ -114,17 +115,25 @@ class OrderDAO:
             return None    
 
     @staticmethod
-    def mark_order_as_paid(order_id: str) -> Optional[Order]:
+    def mark_order_as_paid(order_id: str, outbox_events: Optional[List[dict]] = None) -> Optional[Order]:
+        """Marca la compra como pagada; outbox_events se guardan en la misma transacción"""
 
         order = OrderDAO.find_by_public_id(order_id)
         if not order:
             raise Exception(f"Order {order_id} no encontrado")
 
-        # Actualizo estado y timestamp de confirmacion
-        order.status = OrderStatus.PAID
-        order.updated_at = datetime.now()    
-        
-        db.session.commit()
+        try:
+            # Actualizo estado y timestamp de confirmacion
+            order.status = OrderStatus.PAID
+            order.updated_at = datetime.now()    
+
+            for event in outbox_events or []:
+                OutboxDAO.add(aggregate_id = order_id, **event)
+            
+            db.session.commit()
+        except Exception as e:
+            db.session.rollback()
+            raise e
 
         # Refrescar el contenido del order actualizado 
         db.session.refresh(order)
@@ -158,10 +167,12 @@ class OrderDAO:
         return Order.query.filter(Order.public_id == order_id)
     
     @staticmethod
-    def add_order(order: Order, username: str) -> Order:
+    def add_order(order: Order, username: str, outbox_events: Optional[List[dict]] = None) -> Order:
         try:
             order.made_by_username = username
             db.session.add(order)
+            for event in outbox_events or []:
+                OutboxDAO.add(aggregate_id = order.public_id, **event)
             db.session.commit()
             return order
         except Exception as e:
@@ -0,0 +1,43 @@
+from model.order_payment_model import OrderPayment
+from typing import Dict, List
+from db import db
+
+PAYMENT_COMPLETED = 'COMPLETED'
+
+class OrderPaymentDAO:
+
+    @staticmethod
+    def find_completed(order_id: str) -> Dict[str, OrderPayment]:
+        """Pagos ya completados de la compra, por vendedor"""
+        payments = db.session.query(OrderPayment) \
+            .filter(OrderPayment.order_public_id == order_id, OrderPayment.status == PAYMENT_COMPLETED) \
+            .all()
+        return {payment.seller_username: payment for payment in payments}
+
+    @staticmethod
+    def record(order_id: str, outcomes: List[dict]):
+        """Guarda (o actualiza) el resultado del pago de cada vendedor: {seller, amount, idempotency_key, payment_id, status, error}"""
+        if not outcomes:
+            return
+        try:
+            existing = {payment.seller_username: payment for payment in db.session.query(OrderPayment)
+                        .filter(OrderPayment.order_public_id == order_id).all()}
+            for outcome in outcomes:
+                payment = existing.get(outcome['seller'])
+                if payment is None:
+                    payment = OrderPayment(
+                        order_public_id = order_id,
+                        seller_username = outcome['seller'],
+                        idempotency_key = outcome['idempotency_key'],
+                        attempts = 0
+                    )
+                    db.session.add(payment)
+                payment.amount = outcome['amount']
+                payment.payment_id = outcome.get('payment_id')
+                payment.status = outcome.get('status') if outcome.get('success') else (outcome.get('status') or 'FAILED')
+                payment.error = (outcome.get('error') or '')[:500] or None
+                payment.attempts += 1
+            db.session.commit()
+        except Exception as e:
+            db.session.rollback()
+            raise e
@@ -0,0 +1,126 @@
+from model.outbox_model import OutboxMessage, OutboxStatus
+from typing import List, Optional
+from datetime import datetime, timedelta
+from sqlalchemy import func, or_
+from db import db
+
+class OutboxDAO:
+
+    @staticmethod
+    def add(destination: str, event_type: str, aggregate_id: str, payload: dict,
+            idempotency_key: Optional[str] = None) -> OutboxMessage:
+        """
+        Añade el mensaje a la sesión SIN hacer commit: se guarda en la misma
+        transacción que el cambio de la compra que lo origina
+        """
+        message = OutboxMessage(
+            destination = destination,
+            event_type = event_type,
+            aggregate_id = aggregate_id,
+            payload = payload,
+            idempotency_key = idempotency_key,
+            status = OutboxStatus.PENDING,
+            attempts = 0,
+            available_at = datetime.now()
+        )
+        db.session.add(message)
+        return message
+
+    @staticmethod
+    def claim_batch(destination: str, worker_id: str, limit: int, lease_seconds: float) -> List[dict]:
+        """
+        Reserva hasta limit mensajes pendientes del destino para este worker durante
+        lease_seconds. Si el worker cae, al vencer el lease otro los vuelve a tomar
+        (entrega al menos una vez). En MariaDB las filas bloqueadas por otro worker se saltan
+        """
+        now = datetime.now()
+        try:
+            messages = db.session.query(OutboxMessage) \
+                .filter(OutboxMessage.status == OutboxStatus.PENDING,
+                        OutboxMessage.destination == destination,
+                        OutboxMessage.available_at <= now,
+                        or_(OutboxMessage.locked_until.is_(None), OutboxMessage.locked_until < now)) \
+                .order_by(OutboxMessage.id) \
+                .limit(limit) \
+                .with_for_update(skip_locked=True) \
+                .all()
+
+            claimed = []
+            for message in messages:
+                message.locked_by = worker_id
+                message.locked_until = now + timedelta(seconds=lease_seconds)
+                message.attempts += 1
+                claimed.append({
+                    'id': message.id,
+                    'event_type': message.event_type,
+                    'aggregate_id': message.aggregate_id,
+                    'payload': message.payload,
+                    'idempotency_key': message.idempotency_key,
+                    'attempts': message.attempts,
+                    'created_at': message.created_at
+                })
+            db.session.commit()
+            return claimed
+        except Exception as e:
+            db.session.rollback()
+            raise e
+
+    @staticmethod
+    def mark_sent(ids: List[int], worker_id: str):
+        if not ids:
+            return
+        try:
+            db.session.query(OutboxMessage) \
+                .filter(OutboxMessage.id.in_(ids), OutboxMessage.locked_by == worker_id) \
+                .update({'status': OutboxStatus.SENT, 'sent_at': datetime.now(),
+                         'locked_by': None, 'locked_until': None, 'last_error': None},
+                        synchronize_session=False)
+            db.session.commit()
+        except Exception as e:
+            db.session.rollback()
+            raise e
+
+    @staticmethod
+    def mark_failed(ids: List[int], worker_id: str, error: str, retry_in: float, max_attempts: int):
+        """Libera los mensajes para reintentarlos tras retry_in segundos, o los da por fallidos"""
+        if not ids:
+            return
+        try:
+            values = {
+                'locked_by': None,
+                'locked_until': None,
+                'last_error': error[:500],
+                'available_at': datetime.now() + timedelta(seconds=retry_in)
+            }
+            query = db.session.query(OutboxMessage) \
+                .filter(OutboxMessage.id.in_(ids), OutboxMessage.locked_by == worker_id)
+            query.filter(OutboxMessage.attempts >= max_attempts) \
+                .update({**values, 'status': OutboxStatus.FAILED}, synchronize_session=False)
+            query.filter(OutboxMessage.attempts < max_attempts) \
+                .update(values, synchronize_session=False)
+            db.session.commit()
+        except Exception as e:
+            db.session.rollback()
+            raise e
+
+    @staticmethod
+    def pending_stats() -> dict:
+        """Mensajes pendientes por destino y antigüedad del más viejo (lag del outbox)"""
+        rows = db.session.query(OutboxMessage.destination, func.count(OutboxMessage.id), func.min(OutboxMessage.created_at)) \
+            .filter(OutboxMessage.status == OutboxStatus.PENDING) \
+            .group_by(OutboxMessage.destination) \
+            .all()
+        failed = db.session.query(func.count(OutboxMessage.id)) \
+            .filter(OutboxMessage.status == OutboxStatus.FAILED) \
+            .scalar()
+        now = datetime.now()
+        return {
+            'pending': {
+                destination: {
+                    'messages': count,
+                    'lag_seconds': round((now - oldest).total_seconds(), 3) if oldest else 0.0
+                }
+                for destination, count, oldest in rows
+            },
+            'failed': failed or 0
+        }
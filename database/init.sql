@@ -60,4 +60,41 @@ INSERT IGNORE INTO order_items (order_id, product_public_id, product_name, selle
 (5, 'prod-008', 'Bufanda', 'fashionhub', 'FashionHub', 1, 25.00, 25.00);
 
 INSERT IGNORE INTO order_items (order_id, product_public_id, product_name, seller_username, seller_name, quantity, price, total) VALUES
-(6, 'prod-009', 'Libro "Aprendiendo SQL"', 'bookstore', 'BookStore', 1, 34.99, 34.99);
\ No newline at end of file
+(6, 'prod-009', 'Libro "Aprendiendo SQL"', 'bookstore', 'BookStore', 1, 34.99, 34.99);
+
+-- Outbox transaccional: efectos secundarios de cada compra, entregados por el worker del outbox
+CREATE TABLE IF NOT EXISTS outbox (
+    id INT AUTO_INCREMENT PRIMARY KEY,
+    destination VARCHAR(50) NOT NULL,
+    event_type VARCHAR(100) NOT NULL,
+    aggregate_id VARCHAR(36) NOT NULL,
+    payload JSON NOT NULL,
+    idempotency_key VARCHAR(100) UNIQUE,
+    status ENUM('PENDING', 'SENT', 'FAILED') NOT NULL DEFAULT 'PENDING',
+    attempts INT NOT NULL DEFAULT 0,
+    available_at DATETIME NOT NULL DEFAULT CURRENT_TIMESTAMP,
+    locked_by VARCHAR(100),
+    locked_until DATETIME,
+    last_error VARCHAR(500),
+    created_at DATETIME NOT NULL DEFAULT CURRENT_TIMESTAMP,
+    sent_at DATETIME,
+    INDEX ix_outbox_aggregate_id (aggregate_id),
+    INDEX ix_outbox_pending (status, destination, available_at)
+);
+
+-- Resultado del pago de cada vendedor de una compra (un reintento solo paga a los que faltan)
+CREATE TABLE IF NOT EXISTS order_payments (
+    id INT AUTO_INCREMENT PRIMARY KEY,
+    order_public_id VARCHAR(36) NOT NULL,
+    seller_username VARCHAR(50) NOT NULL,
+    idempotency_key VARCHAR(100) NOT NULL UNIQUE,
+    payment_id VARCHAR(100),
+    status VARCHAR(20),
+    amount DOUBLE NOT NULL,
+    error VARCHAR(500),
+    attempts INT NOT NULL DEFAULT 0,
+    created_at DATETIME NOT NULL DEFAULT CURRENT_TIMESTAMP,
+    updated_at DATETIME DEFAULT CURRENT_TIMESTAMP ON UPDATE CURRENT_TIMESTAMP,
+    UNIQUE KEY uq_order_payments_seller (order_public_id, seller_username),
+    INDEX ix_order_payments_order_public_id (order_public_id)
+);
@@ -1,4 +1,25 @@
 from flask_sqlalchemy import SQLAlchemy
+from sqlalchemy import event
+from sqlalchemy.engine import Engine
+from helpers.metrics import get_metrics_registry
+from helpers.request_timing import record_timing
+import time
 
 # Centralization of component db
-db = SQLAlchemy()
\ No newline at end of file
+db = SQLAlchemy()
+
+
+# Tiempo de cada consulta para el histograma db_query_duration_seconds (/metrics) y el Server-Timing
+@event.listens_for(Engine, 'before_cursor_execute')
+def _start_query_timer(conn, cursor, statement, parameters, context, executemany):
+    conn.info.setdefault('query_start_time', []).append(time.perf_counter())
+
+@event.listens_for(Engine, 'after_cursor_execute')
+def _record_query_time(conn, cursor, statement, parameters, context, executemany):
+    started = conn.info.get('query_start_time')
+    if not started:
+        return
+    elapsed = time.perf_counter() - started.pop()
+    operation = statement.lstrip().split(None, 1)[0].upper() if statement.strip() else 'UNKNOWN'
+    get_metrics_registry().observe_db_query(operation, elapsed)
+    record_timing('db', elapsed) # Server-Timing de la petición en curso
@@ -1,30 +1,32 @@
 from functools import wraps
 from datetime import datetime
 import time
-from flask import request
-import json
+from flask import request, current_app
+from helpers.async_log_writer import get_log_writer
+from helpers.metrics import get_metrics_registry
+from helpers.request_timing import current_timing
 import os
 
 def log(fichero_log):
+    # Relative route into absolute route
+    if not os.path.isabs(fichero_log):
+        base_dir = os.path.dirname(os.path.abspath(__file__))
+        fichero_log_abs = os.path.normpath(os.path.join(base_dir, fichero_log))
+    else:
+        fichero_log_abs = fichero_log 
+
     def decorator(f):
         @wraps(f)
         def decorated(*args, **kwargs):
             start_time = time.time()
-            
-            # Relative route into absolute route
-            if not os.path.isabs(fichero_log):
-                base_dir = os.path.dirname(os.path.abspath(__file__))
-                fichero_log_abs = os.path.join(base_dir, fichero_log)
-            else:
-                fichero_log_abs = fichero_log 
                 
             try:
                 # Function exec
                 response = f(*args, **kwargs)
-                status_code = response[1] if isinstance(response, tuple) else 200
+                status_code = response[1] if isinstance(response, tuple) else getattr(response, 'status_code', 200)
                 success = True
             except Exception as e:
-                status_code = 500
+                status_code = getattr(e, 'status', 500) # APIException lleva su propio código
                 success = False
                 response = {"error": str(e)}, 500
                 raise 
@@ -53,10 +55,17 @@ def log(fichero_log):
                     "user_agent": request.headers.get('User-Agent', ''),
                     "query_params": dict(request.args)
                 }
+
+                # Desglose del tiempo (auth, db, microservicios) como en la cabecera Server-Timing
+                timing = current_timing()
+                if timing is not None:
+                    log_entry["timings"] = timing.breakdown()
                 
-                # Write in log
-                with open(fichero_log_abs, 'a', encoding='utf-8') as opened_file:
-                    opened_file.write(f"{json.dumps(log_entry, ensure_ascii=False)}\n")
+                # Write in log: solo se encola, lo escribe en segundo plano AsyncLogWriter
+                get_log_writer(fichero_log_abs, current_app.config).write(log_entry)
+
+                # Histogramas de latencia por endpoint y clase de estado (/metrics)
+                get_metrics_registry(current_app.config).observe_request(f.__name__, request.method, status_code, duration)
             
             return response
         return decorated
@@ -1,67 +1,89 @@
 from functools import wraps
 from flask import request, jsonify, current_app
 from jose import jwt
-from jose.backends import RSAKey
-from jose.utils import base64url_decode
 from helpers.ApiExceptions import APIException
-import requests
-import json
-
-# Cache para JWKS
-_jwks_cache = None
+from auth.jwks_store import get_jwks_store
+from auth.verified_token_cache import get_verified_token_cache
+from auth.keycloak_service import KeycloakService
+from helpers.request_timing import timed
+from typing import Optional
+import time
 
 def get_jwks_keys():
     """
-    Obtiene las claves JWKS de Keycloak
+    Obtiene las claves JWKS de Keycloak (ver JWKSStore)
     """
-    global _jwks_cache
-    if _jwks_cache is None:
-        try:
-            keycloak_url = current_app.config.get('KEYCLOAK_SERVER_URL', 'http://keycloak:8080')
-            realm = current_app.config.get('KEYCLOAK_REALM', 'undersounds')
-            
-            jwks_url = f"{keycloak_url}/realms/{realm}/protocol/openid-connect/certs"
-            current_app.logger.info(f"Obteniendo JWKS desde: {jwks_url}")
-            
-            response = requests.get(jwks_url, timeout=10)
-            response.raise_for_status()
-            _jwks_cache = response.json()
-            current_app.logger.info("JWKS obtenido correctamente")
-        except Exception as e:
-            current_app.logger.error(f"Error obteniendo JWKS: {e}")
-            raise Exception(f"No se puede obtener JWKS: {str(e)}")
-    
-    return _jwks_cache
+    return get_jwks_store(current_app).jwks()
 
-def get_public_key(token, jwks):
+def get_public_key(token):
     """
-    Obtiene la clave pública correcta para verificar el token
+    Obtiene la clave pública correcta para verificar el token, ya construida e indexada por kid
     """
     try:
         # Obtener el header del token sin verificar
         header = jwt.get_unverified_header(token)
         kid = header.get('kid')
         
-        current_app.logger.info(f"Buscando clave para kid: {kid}")
-        
         if not kid:
             raise Exception("Token no contiene kid en el header")
         
-        # Buscar la clave correspondiente
-        for key in jwks.get('keys', []):
-            if key.get('kid') == kid:
-                current_app.logger.info(f"Clave encontrada para kid: {kid}")
-                return key
-        
-        raise Exception(f"No se encontró clave pública para kid: {kid}. Claves disponibles: {[k.get('kid') for k in jwks.get('keys', [])]}")
+        return get_jwks_store(current_app).get_key(kid)
     
     except Exception as e:
         current_app.logger.error(f"Error obteniendo public key: {e}")
         raise
 
-def token_required(roles: list = None):
+# Modos de verificación del token por endpoint
+VERIFY_JWT = 'jwt' # Firma local con el JWKS de Keycloak
+VERIFY_INTROSPECTION = 'introspection' # Introspección en Keycloak (tokens opacos), cacheada
+
+def verify_jwt(token: str) -> dict:
+    """
+    Verifica la firma y los claims del JWT; los tokens ya verificados se sirven de caché hasta su exp
+    """
+    client_id = current_app.config.get('KEYCLOAK_CLIENT_ID', 'orders-service')
+
+    # Token ya verificado en una petición anterior (hasta su exp)
+    token_cache = get_verified_token_cache(current_app)
+    claims = token_cache.get(token)
+    if claims is not None:
+        return claims
+
+    current_app.logger.info(f"Verificando token para client: {client_id}")
+    started = time.perf_counter()
+    
+    # Obtener clave pública específica (JWKS cacheado por kid)
+    public_key = get_public_key(token)
+    
+    # Decodificar y verificar JWT
+    current_app.logger.info("Decodificando token...")
+    claims = jwt.decode(
+        token=token,
+        key=public_key,
+        algorithms=['RS256'],
+        audience=client_id,
+        options={
+            "verify_aud": True, 
+            "verify_exp": True,
+            "verify_iss": True,
+            "verify_signature": True
+        }
+    )
+    token_cache.record_verification(time.perf_counter() - started)
+    token_cache.put(token, claims)
+
+    current_app.logger.info(f"Token válido para usuario: {claims.get('username', 'Unknown')}")
+    current_app.logger.info(f"Roles en token: {claims.get('roles', [])}")
+    return claims
+
+def introspect_token(token: str) -> Optional[dict]:
+    """Claims del token según la introspección de Keycloak (cacheada); None si no está activo"""
+    return KeycloakService(current_app).validate_token(token)
+
+def token_required(roles: list = None, verification: Optional[str] = None):
     """
-    Decorador para proteger endpoints con JWT
+    Decorador para proteger endpoints con JWT. verification elige cómo se valida el
+    token en este endpoint (VERIFY_JWT o VERIFY_INTROSPECTION); por defecto TOKEN_VERIFICATION_MODE
     """
     def decorator(f):
         @wraps(f)
@@ -82,37 +104,12 @@ def token_required(roles: list = None):
                     return jsonify({'message': 'Formato inválido. Usa: Bearer <token>'}), 401
                 
                 token = auth_header.split(" ")[1]
-                
-                # Obtener configuración
-                #keycloak_url = current_app.config.get('KEYCLOAK_SERVER_URL', 'http://localhost:8090')
-                #realm = current_app.config.get('KEYCLOAK_REALM', 'undersounds')
-                client_id = current_app.config.get('KEYCLOAK_CLIENT_ID', 'orders-service')
-                
-                current_app.logger.info(f"Verificando token para client: {client_id}")
-                
-                # Obtener JWKS
-                jwks = get_jwks_keys()
-                
-                # Obtener clave pública específica
-                public_key = get_public_key(token, jwks)
-                
-                # Decodificar y verificar JWT
-                current_app.logger.info("Decodificando token...")
-                claims = jwt.decode(
-                    token=token,
-                    key=public_key,
-                    algorithms=['RS256'],
-                    audience=client_id,
-                    options={
-                        "verify_aud": True, 
-                        "verify_exp": True,
-                        "verify_iss": True,
-                        "verify_signature": True
-                    }
-                )
-                
-                current_app.logger.info(f"Token válido para usuario: {claims.get('username', 'Unknown')}")
-                current_app.logger.info(f"Roles en token: {claims.get('roles', [])}")
+
+                mode = verification or current_app.config.get('TOKEN_VERIFICATION_MODE', VERIFY_JWT)
+                with timed('auth'):
+                    claims = introspect_token(token) if mode == VERIFY_INTROSPECTION else verify_jwt(token)
+                if claims is None:
+                    return jsonify({'error': 'No autorizado', 'details': 'Token inactivo o no válido'}), 401
                 
                 # Validar roles si se especificaron
                 if roles:
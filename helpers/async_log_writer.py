@@ -0,0 +1,277 @@
+import atexit
+import gzip
+import json
+import os
+import queue
+import re
+import shutil
+import threading
+import time
+import logging
+from datetime import datetime
+from typing import Dict, List, Optional
+
+logger = logging.getLogger(__name__)
+
+
+class AsyncLogWriter:
+    """
+    Escritor de ficheros de log en segundo plano: los hilos de las peticiones solo
+    encolan el registro (sin bloquear; con la cola llena se descarta y se cuenta) y
+    un hilo lo serializa y escribe por lotes en un fichero abierto con buffer grande.
+    El fichero se rota por tamaño o antigüedad y las copias rotadas pueden comprimirse.
+    Con per_process cada proceso escribe en su propio fichero (sufijo con el PID): la
+    rotación de un worker no puede dejar a otro escribiendo en un fichero ya renombrado.
+    Al arrancar, el worker adopta como copias rotadas suyas los ficheros de PIDs que ya
+    no existen (reinicios), así que entran en su backup_count en vez de acumularse.
+    Para leer todos los registros basta con juntar <nombre>.*.log y sus copias
+    """
+    def __init__(self, path: str, max_queue_size: int = 10000, batch_size: int = 500,
+                 flush_interval: float = 1.0, max_bytes: int = 50 * 1024 * 1024,
+                 rotate_seconds: float = 0, backup_count: int = 5, compress: bool = False,
+                 buffer_size: int = 256 * 1024, per_process: bool = False):
+        self.base_path = path
+        self.per_process = per_process
+        self.path = process_log_path(path) if per_process else path
+        self.batch_size = max(1, batch_size)
+        self.flush_interval = flush_interval
+        self.max_bytes = max_bytes
+        self.rotate_seconds = rotate_seconds
+        self.backup_count = backup_count
+        self.compress = compress
+        self.buffer_size = buffer_size
+        self._queue = queue.Queue(maxsize=max_queue_size)
+        self._lock = threading.Lock()
+        self._stop = threading.Event()
+        self._thread = None
+        self._file = None
+        self._opened_at = None
+
+        # Métricas
+        self.enqueued = 0
+        self.dropped = 0
+        self.written = 0
+        self.batches = 0
+        self.rotations = 0
+        self.write_errors = 0
+
+    @classmethod
+    def from_config(cls, path: str, config) -> 'AsyncLogWriter':
+        return cls(
+            path,
+            max_queue_size = int(config.get('REQUEST_LOG_QUEUE_SIZE', 10000)),
+            batch_size = int(config.get('REQUEST_LOG_BATCH_SIZE', 500)),
+            flush_interval = float(config.get('REQUEST_LOG_FLUSH_SECONDS', 1.0)),
+            max_bytes = int(config.get('REQUEST_LOG_MAX_BYTES', 50 * 1024 * 1024)),
+            rotate_seconds = float(config.get('REQUEST_LOG_ROTATE_SECONDS', 0)),
+            backup_count = int(config.get('REQUEST_LOG_BACKUP_COUNT', 5)),
+            compress = bool(config.get('REQUEST_LOG_COMPRESS', False)),
+            per_process = bool(config.get('REQUEST_LOG_PER_PROCESS', True))
+        )
+
+    def start(self):
+        with self._lock:
+            if self._thread is not None:
+                return
+            self._thread = threading.Thread(target=self._run, name='request-log-writer', daemon=True)
+            self._thread.start()
+        atexit.register(self.close)
+
+    def write(self, record: dict) -> bool:
+        """Encola el registro sin bloquear; False si se ha descartado"""
+        if self._stop.is_set():
+            with self._lock:
+                self.dropped += 1
+            return False
+        try:
+            self._queue.put_nowait(record)
+        except queue.Full:
+            with self._lock:
+                self.dropped += 1
+            return False
+        with self._lock:
+            self.enqueued += 1
+        return True
+
+    def _run(self):
+        if self.per_process:
+            try:
+                self._adopt_dead_workers_files()
+            except Exception as e:
+                logger.warning(f"No se pudieron adoptar los logs de workers terminados: {e}")
+        while not self._stop.is_set():
+            batch = self._next_batch(self.flush_interval)
+            if batch:
+                self._write_batch(batch)
+        # Al cerrar se escribe lo que quede en la cola
+        while True:
+            batch = self._next_batch(0)
+            if not batch:
+                break
+            self._write_batch(batch)
+        self._close_file()
+
+    def _next_batch(self, timeout: float) -> List[dict]:
+        try:
+            batch = [self._queue.get(timeout=timeout) if timeout > 0 else self._queue.get_nowait()]
+        except queue.Empty:
+            return []
+        while len(batch) < self.batch_size:
+            try:
+                batch.append(self._queue.get_nowait())
+            except queue.Empty:
+                break
+        return batch
+
+    def _write_batch(self, batch: List[dict]):
+        try:
+            lines = ''.join(f"{json.dumps(record, ensure_ascii=False, default=str)}\n" for record in batch)
+            self._rotate_if_needed()
+            log_file = self._open_file()
+            log_file.write(lines)
+            log_file.flush() # Una escritura grande por lote
+            with self._lock:
+                self.written += len(batch)
+                self.batches += 1
+        except Exception as e:
+            with self._lock:
+                self.write_errors += 1
+            logger.error(f"Error escribiendo {len(batch)} registros en {self.path}: {e}")
+            self._close_file()
+
+    def _open_file(self):
+        if self._file is None:
+            os.makedirs(os.path.dirname(self.path) or '.', exist_ok=True)
+            self._file = open(self.path, 'a', encoding='utf-8', buffering=self.buffer_size)
+            self._opened_at = time.monotonic()
+        return self._file
+
+    def _close_file(self):
+        if self._file is not None:
+            try:
+                self._file.close()
+            except Exception:
+                pass
+            self._file = None
+
+    def _rotate_if_needed(self):
+        if self._file is None and not os.path.exists(self.path):
+            return
+        too_big = self.max_bytes > 0 and os.path.exists(self.path) and os.path.getsize(self.path) >= self.max_bytes
+        too_old = self.rotate_seconds > 0 and self._opened_at is not None \
+            and time.monotonic() - self._opened_at >= self.rotate_seconds
+        if not (too_big or too_old):
+            return
+
+        self._close_file()
+        rotated = f"{self.path}.{datetime.now().strftime('%Y%m%d-%H%M%S-%f')}"
+        os.replace(self.path, rotated)
+        if self.compress:
+            with open(rotated, 'rb') as source, gzip.open(f"{rotated}.gz", 'wb') as target:
+                shutil.copyfileobj(source, target)
+            os.remove(rotated)
+        with self._lock:
+            self.rotations += 1
+        self._remove_old_backups()
+
+    def _remove_old_backups(self):
+        directory = os.path.dirname(self.path) or '.'
+        prefix = f"{os.path.basename(self.path)}."
+        backups = sorted(name for name in os.listdir(directory) if name.startswith(prefix))
+        for name in backups[:max(len(backups) - self.backup_count, 0)]:
+            os.remove(os.path.join(directory, name))
+
+    def _adopt_dead_workers_files(self):
+        """Renombra los ficheros (y sus copias) de PIDs muertos como copias rotadas de este worker"""
+        directory = os.path.dirname(self.path) or '.'
+        if not os.path.isdir(directory):
+            return
+        base, extension = os.path.splitext(os.path.basename(self.base_path))
+        pattern = re.compile(rf"{re.escape(base)}\.(\d+){re.escape(extension)}(\..+)?$")
+        adopted = 0
+        for name in sorted(os.listdir(directory)):
+            match = pattern.match(name)
+            if not match or int(match.group(1)) == os.getpid() or _pid_alive(int(match.group(1))):
+                continue
+            source = os.path.join(directory, name)
+            try:
+                # El fichero activo del worker muerto pasa a copia con la fecha de su última escritura
+                suffix = match.group(2) or f".{datetime.fromtimestamp(os.path.getmtime(source)).strftime('%Y%m%d-%H%M%S-%f')}"
+                target = f"{self.path}{suffix}"
+                if os.path.exists(target):
+                    continue
+                os.replace(source, target)
+            except FileNotFoundError:
+                continue # Lo ha adoptado otro worker
+            if self.compress and not target.endswith('.gz'):
+                with open(target, 'rb') as source_file, gzip.open(f"{target}.gz", 'wb') as compressed:
+                    shutil.copyfileobj(source_file, compressed)
+                os.remove(target)
+            adopted += 1
+        if adopted:
+            logger.info(f"Adoptados {adopted} ficheros de log de workers terminados en {self.path}")
+            self._remove_old_backups()
+
+    def close(self, timeout: float = 5):
+        """Deja de aceptar registros y espera a que se escriban los encolados"""
+        self._stop.set()
+        thread = self._thread
+        if thread is not None and thread is not threading.current_thread():
+            thread.join(timeout)
+
+    def stats(self) -> dict:
+        with self._lock:
+            return {
+                'path': self.path,
+                'queue_depth': self._queue.qsize(),
+                'max_queue_size': self._queue.maxsize,
+                'enqueued': self.enqueued,
+                'dropped': self.dropped,
+                'written': self.written,
+                'batches': self.batches,
+                'rotations': self.rotations,
+                'write_errors': self.write_errors
+            }
+
+
+def _pid_alive(pid: int) -> bool:
+    try:
+        os.kill(pid, 0)
+    except ProcessLookupError:
+        return False
+    except PermissionError:
+        return True
+    return True
+
+def process_log_path(path: str) -> str:
+    """logs/peticiones.log -> logs/peticiones.<pid>.log"""
+    base, extension = os.path.splitext(path)
+    return f"{base}.{os.getpid()}{extension}"
+
+
+_writers: Dict[str, AsyncLogWriter] = {}
+_writers_lock = threading.Lock()
+
+# Un hijo creado con fork hereda los escritores pero no sus hilos: crea los suyos
+os.register_at_fork(after_in_child=_writers.clear)
+
+def get_log_writer(path: str, config: Optional[dict] = None) -> AsyncLogWriter:
+    """Escritor del fichero (uno por ruta y proceso), arrancado la primera vez"""
+    with _writers_lock:
+        writer = _writers.get(path)
+        if writer is None:
+            writer = AsyncLogWriter.from_config(path, config or {})
+            writer.start()
+            _writers[path] = writer
+        return writer
+
+def log_writers_stats() -> List[dict]:
+    with _writers_lock:
+        return [writer.stats() for writer in _writers.values()]
+
+def reset_log_writers():
+    with _writers_lock:
+        writers = list(_writers.values())
+        _writers.clear()
+    for writer in writers:
+        writer.close()
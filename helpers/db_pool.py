@@ -0,0 +1,86 @@
+from sqlalchemy import exc, text
+from sqlalchemy.engine import make_url
+from sqlalchemy.pool import QueuePool
+from helpers.metrics import get_metrics_registry
+from helpers.request_timing import record_timing
+import os
+import time
+import logging
+
+logger = logging.getLogger(__name__)
+
+
+class TimedQueuePool(QueuePool):
+    """QueuePool que mide la espera para obtener conexión y cuenta las veces que el pool se agota"""
+
+    def connect(self):
+        started = time.perf_counter()
+        try:
+            return super().connect()
+        except exc.TimeoutError:
+            get_metrics_registry().inc('db_pool_exhausted_total', {})
+            logger.error(f"Pool de conexiones agotado: {self.status()}")
+            raise
+        finally:
+            elapsed = time.perf_counter() - started
+            get_metrics_registry().observe('db_pool_checkout_seconds', {}, elapsed)
+            record_timing('db_pool', elapsed)
+
+
+# Drivers de MariaDB soportados por el ORM (DB_DRIVER)
+DB_DRIVERS = {
+    'pymysql': 'mysql+pymysql', # Python puro
+    'mariadbconnector': 'mariadb+mariadbconnector' # Conector nativo en C (paquete mariadb); exige servidor MariaDB
+}
+
+
+def database_uri_for_driver(database_uri: str, driver: str) -> str:
+    """Cambia el driver de una URI de MariaDB/MySQL por el de DB_DRIVER; sin driver la URI no cambia"""
+    if not driver:
+        return database_uri
+    if driver not in DB_DRIVERS:
+        raise ValueError(f"DB_DRIVER desconocido: {driver} (opciones: {', '.join(DB_DRIVERS)})")
+    url = make_url(database_uri)
+    if url.get_backend_name() not in ('mysql', 'mariadb'):
+        return database_uri
+    return url.set(drivername=DB_DRIVERS[driver]).render_as_string(hide_password=False)
+
+
+def engine_options_from_env(database_uri: str) -> dict:
+    """
+    SQLALCHEMY_ENGINE_OPTIONS a partir del entorno: tamaño del pool, reciclado de
+    conexiones por debajo del wait_timeout de MariaDB, pre-ping y timeouts del driver
+    """
+    if database_uri.startswith('sqlite'):
+        return {} # SQLite (tests) usa su propio pool
+    return {
+        'poolclass': TimedQueuePool,
+        'pool_size': int(os.getenv("DB_POOL_SIZE", 10)),
+        'max_overflow': int(os.getenv("DB_MAX_OVERFLOW", 10)),
+        'pool_timeout': float(os.getenv("DB_POOL_TIMEOUT_SECONDS", 10)), # Espera máxima por una conexión libre
+        'pool_recycle': int(os.getenv("DB_POOL_RECYCLE_SECONDS", 1800)), # Menor que el wait_timeout del servidor
+        'pool_pre_ping': os.getenv("DB_POOL_PRE_PING", "true").lower() == "true",
+        'pool_use_lifo': os.getenv("DB_POOL_USE_LIFO", "true").lower() == "true", # Las ociosas sobrantes caducan
+        # PyMySQL y el conector de MariaDB aceptan los mismos timeouts
+        'connect_args': {
+            'connect_timeout': int(os.getenv("DB_CONNECT_TIMEOUT_SECONDS", 5)),
+            'read_timeout': int(os.getenv("DB_READ_TIMEOUT_SECONDS", 30)),
+            'write_timeout': int(os.getenv("DB_WRITE_TIMEOUT_SECONDS", 30))
+        }
+    }
+
+
+def warm_up_pool(engine, connections: int) -> int:
+    """Abre al arrancar hasta `connections` conexiones para que las primeras peticiones no paguen el connect"""
+    opened = []
+    try:
+        for _ in range(max(connections, 0)):
+            conn = engine.connect()
+            opened.append(conn)
+            conn.execute(text("SELECT 1"))
+    except Exception as e:
+        logger.warning(f"Calentamiento del pool incompleto ({len(opened)}/{connections}): {e}")
+    finally:
+        for conn in opened:
+            conn.close() # Vuelven al pool abiertas
+    return len(opened)
@@ -0,0 +1,132 @@
+from concurrent.futures import ThreadPoolExecutor, wait, FIRST_COMPLETED
+from flask import current_app, has_app_context
+from helpers.request_timing import current_timing, bind_timing
+from threading import Lock
+from typing import Any, Callable, Iterable, List, Optional
+import time
+
+# Pool de hilos compartido por todas las peticiones del proceso
+DEFAULT_MAX_WORKERS = 32
+DEFAULT_MAX_CONCURRENCY = 8
+
+_executor = None
+_executor_lock = Lock()
+_max_workers = DEFAULT_MAX_WORKERS
+
+
+class FanOutTimeout(Exception):
+    """La tarea no terminó antes del deadline de la petición"""
+    pass
+
+class FanOutCancelled(Exception):
+    """La tarea se canceló porque otra ya determinó el resultado"""
+    pass
+
+
+def configure_fanout(app):
+    """Ajusta el tamaño del pool compartido según la configuración"""
+    global _max_workers
+    with _executor_lock:
+        _max_workers = int(app.config.get('FANOUT_MAX_WORKERS', DEFAULT_MAX_WORKERS))
+
+def get_executor() -> ThreadPoolExecutor:
+    global _executor
+    with _executor_lock:
+        if _executor is None:
+            _executor = ThreadPoolExecutor(max_workers=_max_workers, thread_name_prefix='fanout')
+        return _executor
+
+def _bind_app_context(fn: Callable) -> Callable:
+    """Propaga el contexto de Flask (logger, config...) y los tiempos de la petición a los hilos del pool"""
+    timing = current_timing()
+    if not has_app_context():
+        if timing is None:
+            return fn
+
+        def run_timed(item):
+            with bind_timing(timing):
+                return fn(item)
+        return run_timed
+    app = current_app._get_current_object()
+
+    def run(item):
+        with app.app_context(), bind_timing(timing):
+            return fn(item)
+    return run
+
+def fan_out(
+    fn: Callable[[Any], Any],
+    items: Iterable[Any],
+    max_concurrency: Optional[int] = None,
+    timeout: Optional[float] = None,
+    stop_when: Optional[Callable[[Any], bool]] = None,
+    drain: bool = False
+) -> List[Any]:
+    """
+    Ejecuta fn sobre cada item con concurrencia acotada.
+
+    Devuelve los resultados en el mismo orden que items. Si una tarea lanza una
+    excepción, su posición contiene esa excepción. Al cumplirse stop_when sobre
+    algún resultado o al agotarse timeout, las tareas pendientes se cancelan y su
+    posición contiene FanOutCancelled o FanOutTimeout respectivamente.
+    Con drain=True, las tareas que ya estaban en ejecución se esperan y se
+    devuelve su resultado real (necesario si tienen efectos que haya que deshacer).
+    """
+    items = list(items)
+    results = [None] * len(items)
+    if not items:
+        return results
+
+    limit = max(1, max_concurrency or DEFAULT_MAX_CONCURRENCY)
+    deadline = time.monotonic() + timeout if timeout is not None else None
+    executor = get_executor()
+    task = _bind_app_context(fn)
+
+    in_flight = {} # future -> posición del item
+    next_index = 0
+    stopped = False
+
+    def submit_next():
+        nonlocal next_index
+        while next_index < len(items) and len(in_flight) < limit:
+            future = executor.submit(task, items[next_index])
+            in_flight[future] = next_index
+            next_index += 1
+
+    submit_next()
+    while in_flight:
+        remaining = None if deadline is None else deadline - time.monotonic()
+        if remaining is not None and remaining <= 0:
+            break
+
+        done, _ = wait(list(in_flight), timeout=remaining, return_when=FIRST_COMPLETED)
+        if not done:
+            break # Deadline agotado
+
+        for future in done:
+            index = in_flight.pop(future)
+            try:
+                results[index] = future.result()
+            except Exception as e:
+                results[index] = e
+            if stop_when is not None and not stopped and stop_when(results[index]):
+                stopped = True
+
+        if stopped:
+            break
+        submit_next()
+
+    # Lo que no ha terminado se cancela (las que ya se ejecutan se ignoran)
+    pending_error = FanOutCancelled if stopped else FanOutTimeout
+    for future, index in in_flight.items():
+        if future.cancel() or not drain:
+            results[index] = pending_error()
+            continue
+        try:
+            results[index] = future.result()
+        except Exception as e:
+            results[index] = e
+    for index in range(next_index, len(items)):
+        results[index] = pending_error()
+
+    return results
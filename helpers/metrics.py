@@ -0,0 +1,404 @@
+import atexit
+import glob
+import json
+import os
+import tempfile
+import threading
+import time
+import uuid
+import re
+import sqlite3
+import logging
+from typing import Dict, Iterable, Optional, Tuple
+
+logger = logging.getLogger(__name__)
+
+# Límites (segundos) de los histogramas de latencia; el último bucket es +Inf
+DEFAULT_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+DEFAULT_METRICS_DIR = os.path.join(tempfile.gettempdir(), 'orders-service-metrics')
+
+# Un snapshot sin actualizar en este número de volcados es de un worker que ya no existe
+STALE_FLUSH_INTERVALS = 3
+_WORKER_FILE_PID = re.compile(r'metrics-(\d+)-[0-9a-f]+\.json$')
+
+# Acumulado de los workers que ya terminaron, para que los contadores de /metrics no bajen
+RETIRED_DB_NAME = 'metrics-retired.db'
+_RETIRED_SCHEMA = """
+CREATE TABLE IF NOT EXISTS retired_values (
+    kind TEXT NOT NULL,
+    name TEXT NOT NULL,
+    labels TEXT NOT NULL,
+    position INTEGER NOT NULL,
+    value REAL NOT NULL,
+    PRIMARY KEY (kind, name, labels, position)
+);
+CREATE TABLE IF NOT EXISTS retired_files (
+    file TEXT PRIMARY KEY
+);
+"""
+
+_HELP = {
+    'http_requests_total': 'Peticiones HTTP atendidas',
+    'http_request_duration_seconds': 'Duración de las peticiones HTTP atendidas',
+    'client_request_duration_seconds': 'Duración de las llamadas a otros microservicios',
+    'db_query_duration_seconds': 'Duración de las consultas a la base de datos',
+    'db_pool_checkout_seconds': 'Espera para obtener una conexión del pool',
+    'db_pool_exhausted_total': 'Veces que no hubo conexión libre en el pool antes del timeout'
+}
+
+
+def status_class(status_code) -> str:
+    try:
+        return f"{int(status_code) // 100}xx"
+    except (TypeError, ValueError):
+        return 'unknown'
+
+
+class _Shard:
+    """Métricas de un hilo: solo las escribe ese hilo, así que no necesitan lock"""
+    def __init__(self):
+        self.counters = {} # (nombre, labels) -> valor
+        self.histograms = {} # (nombre, labels) -> [cuentas por bucket..., +Inf, suma]
+
+    def merge(self, other: '_Shard'):
+        for key, value in list(other.counters.items()):
+            self.counters[key] = self.counters.get(key, 0) + value
+        for key, values in list(other.histograms.items()):
+            total = self.histograms.setdefault(key, [0] * len(values))
+            for position, value in enumerate(list(values)):
+                total[position] += value
+
+
+class MetricsRegistry:
+    """
+    Contadores e histogramas de buckets fijos en memoria. Cada hilo acumula en su
+    propio shard (sin locks en el camino de la petición) y al exportar se suman;
+    los shards de hilos terminados se funden en uno solo para que no crezcan sin límite.
+    Cada worker vuelca su snapshot en metrics_dir y /metrics agrega los de todos.
+    Al salir, o si el worker murió o dejó de actualizarlo, su último snapshot se suma
+    a un acumulado persistente (SQLite en metrics_dir) y solo entonces se borra, así
+    que los contadores nunca bajan al reiniciar un worker (como el modo multiproceso
+    de prometheus_client). metrics_dir debe ser local al contenedor y vaciarse en cada despliegue
+    """
+    def __init__(self, metrics_dir: Optional[str] = DEFAULT_METRICS_DIR, buckets: Iterable[float] = DEFAULT_BUCKETS,
+                 flush_interval: float = 5):
+        self.metrics_dir = metrics_dir
+        self.buckets = tuple(sorted(buckets))
+        self.flush_interval = flush_interval
+        self._local = threading.local()
+        self._shards = [] # (hilo, shard) de los hilos vivos
+        self._finished = _Shard() # Acumulado de los hilos que ya terminaron
+        self._lock = threading.Lock()
+        self._worker_file = None
+        self._thread = None
+        self._stop = threading.Event()
+        if metrics_dir:
+            self._worker_file = os.path.join(metrics_dir, f"metrics-{os.getpid()}-{uuid.uuid4().hex[:8]}.json")
+
+    @classmethod
+    def from_config(cls, config) -> 'MetricsRegistry':
+        return cls(
+            metrics_dir = config.get('METRICS_DIR') or DEFAULT_METRICS_DIR,
+            flush_interval = float(config.get('METRICS_FLUSH_SECONDS', 5))
+        )
+
+    def _shard(self) -> _Shard:
+        shard = getattr(self._local, 'shard', None)
+        if shard is None:
+            shard = _Shard()
+            with self._lock:
+                self._prune_shards()
+                self._shards.append((threading.current_thread(), shard))
+            self._local.shard = shard
+        return shard
+
+    def _prune_shards(self):
+        """Funde en _finished los shards de hilos terminados (ya no los escribe nadie). Con el lock tomado"""
+        alive = []
+        for thread, shard in self._shards:
+            if thread.is_alive():
+                alive.append((thread, shard))
+            else:
+                self._finished.merge(shard)
+        self._shards = alive
+
+    @staticmethod
+    def _key(name: str, labels: Dict[str, str]) -> Tuple[str, Tuple[Tuple[str, str], ...]]:
+        return name, tuple(sorted((key, str(value)) for key, value in labels.items()))
+
+    def inc(self, name: str, labels: Dict[str, str], value: float = 1):
+        counters = self._shard().counters
+        key = self._key(name, labels)
+        counters[key] = counters.get(key, 0) + value
+
+    def observe(self, name: str, labels: Dict[str, str], seconds: float):
+        histograms = self._shard().histograms
+        key = self._key(name, labels)
+        values = histograms.get(key)
+        if values is None:
+            values = histograms[key] = [0] * (len(self.buckets) + 2)
+        index = len(self.buckets)
+        for position, bound in enumerate(self.buckets):
+            if seconds <= bound:
+                index = position
+                break
+        values[index] += 1
+        values[-1] += seconds
+
+    # Métricas de la aplicación
+
+    def observe_request(self, endpoint: str, method: str, status_code, seconds: float):
+        labels = {'endpoint': endpoint, 'method': method, 'status': status_class(status_code)}
+        self.inc('http_requests_total', labels)
+        self.observe('http_request_duration_seconds', labels, seconds)
+
+    def observe_client_call(self, service: str, endpoint: str, outcome: str, seconds: float):
+        self.observe('client_request_duration_seconds', {'service': service, 'endpoint': endpoint, 'outcome': outcome}, seconds)
+
+    def observe_db_query(self, operation: str, seconds: float):
+        self.observe('db_query_duration_seconds', {'operation': operation}, seconds)
+
+    # Exportación
+
+    def snapshot(self) -> dict:
+        """Suma de los shards de todos los hilos del proceso"""
+        total = _Shard()
+        with self._lock:
+            self._prune_shards()
+            shards = [shard for _, shard in self._shards]
+            total.merge(self._finished)
+        for shard in shards:
+            total.merge(shard)
+        return {
+            'buckets': list(self.buckets),
+            'counters': [[name, list(labels), value] for (name, labels), value in total.counters.items()],
+            'histograms': [[name, list(labels), values] for (name, labels), values in total.histograms.items()]
+        }
+
+    def flush(self):
+        """Vuelca el snapshot del worker en metrics_dir (escritura atómica)"""
+        if not self._worker_file:
+            return
+        os.makedirs(self.metrics_dir, exist_ok=True)
+        tmp_path = f"{self._worker_file}.tmp"
+        with open(tmp_path, 'w', encoding='utf-8') as snapshot_file:
+            json.dump(self.snapshot(), snapshot_file)
+        os.replace(tmp_path, self._worker_file)
+
+    def start(self):
+        """Vuelca periódicamente el snapshot para que otros workers lo agreguen"""
+        with self._lock:
+            if self._thread is not None or not self._worker_file or self.flush_interval <= 0:
+                return
+            self._thread = threading.Thread(target=self._flush_loop, name='metrics-flush', daemon=True)
+            self._thread.start()
+        atexit.register(self.close)
+
+    def _flush_loop(self):
+        while not self._stop.wait(self.flush_interval):
+            try:
+                self.flush()
+            except Exception as e:
+                logger.warning(f"No se pudieron volcar las métricas: {e}")
+
+    def stop(self):
+        self._stop.set()
+
+    def close(self):
+        """Deja de volcar, suma el último snapshot del worker al acumulado y borra su fichero"""
+        self.stop()
+        with self._lock:
+            if self._thread is not None:
+                self._thread.join(1)
+        if self._worker_file:
+            try:
+                self.flush()
+                self._retire(self._worker_file)
+            except Exception as e:
+                logger.warning(f"No se pudieron guardar las métricas del worker al cerrar: {e}")
+            try:
+                os.remove(f"{self._worker_file}.tmp")
+            except FileNotFoundError:
+                pass
+
+    def _retired_connection(self) -> sqlite3.Connection:
+        conn = sqlite3.connect(os.path.join(self.metrics_dir, RETIRED_DB_NAME), timeout=5, isolation_level=None)
+        conn.executescript(_RETIRED_SCHEMA)
+        return conn
+
+    def _retire(self, path: str):
+        """
+        Suma el snapshot de un worker terminado al acumulado y borra el fichero. El nombre
+        queda en retired_files en la misma transacción: nunca se suma dos veces y collect()
+        ignora el fichero aunque aún no se haya borrado
+        """
+        file_name = os.path.basename(path)
+        conn = self._retired_connection()
+        try:
+            conn.execute('BEGIN IMMEDIATE') # Un solo worker suma cada fichero
+            try:
+                if conn.execute('SELECT 1 FROM retired_files WHERE file = ?', (file_name,)).fetchone() is None:
+                    with open(path, encoding='utf-8') as snapshot_file:
+                        snapshot = json.load(snapshot_file)
+                    if snapshot.get('buckets') == list(self.buckets):
+                        rows = [('counter', name, json.dumps(labels), 0, value) for name, labels, value in snapshot['counters']]
+                        rows += [('histogram', name, json.dumps(labels), position, value)
+                                 for name, labels, values in snapshot['histograms'] for position, value in enumerate(values)]
+                        conn.executemany(
+                            'INSERT INTO retired_values (kind, name, labels, position, value) VALUES (?, ?, ?, ?, ?) '
+                            'ON CONFLICT (kind, name, labels, position) DO UPDATE SET value = value + excluded.value', rows
+                        )
+                    conn.execute('INSERT INTO retired_files (file) VALUES (?)', (file_name,))
+                conn.execute('COMMIT')
+            except Exception:
+                conn.execute('ROLLBACK')
+                raise
+        finally:
+            conn.close()
+        try:
+            os.remove(path)
+        except FileNotFoundError:
+            pass
+
+    def _retired(self) -> Tuple[dict, set]:
+        """Snapshot con el acumulado de los workers terminados y los ficheros ya sumados"""
+        conn = self._retired_connection()
+        try:
+            conn.execute('BEGIN')
+            rows = conn.execute('SELECT kind, name, labels, position, value FROM retired_values').fetchall()
+            files = {file_name for file_name, in conn.execute('SELECT file FROM retired_files')}
+            conn.execute('COMMIT')
+        finally:
+            conn.close()
+        counters, histograms = [], {}
+        for kind, name, labels, position, value in rows:
+            if kind == 'counter':
+                counters.append([name, json.loads(labels), value])
+            else:
+                values = histograms.setdefault((name, labels), [0] * (len(self.buckets) + 2))
+                values[position] = value
+        return {
+            'buckets': list(self.buckets),
+            'counters': counters,
+            'histograms': [[name, json.loads(labels), values] for (name, labels), values in histograms.items()]
+        }, files
+
+    def _is_stale(self, path: str) -> bool:
+        """Snapshot de un proceso que ya no existe o que lleva varios volcados sin actualizarse"""
+        match = _WORKER_FILE_PID.search(os.path.basename(path))
+        if match and not _process_alive(int(match.group(1))):
+            return True
+        max_age = max(self.flush_interval, 1) * STALE_FLUSH_INTERVALS
+        return time.time() - os.path.getmtime(path) > max_age
+
+    def collect(self) -> dict:
+        """Snapshot agregado de todos los workers (el propio, al momento) y de los ya terminados"""
+        snapshots = [self.snapshot()]
+        if self._worker_file:
+            try:
+                self.flush()
+            except Exception as e:
+                logger.warning(f"No se pudieron volcar las métricas: {e}")
+            workers = {}
+            for path in glob.glob(os.path.join(self.metrics_dir, 'metrics-*.json')):
+                if path == self._worker_file:
+                    continue
+                try:
+                    if self._is_stale(path):
+                        self._retire(path)
+                        continue
+                    with open(path, encoding='utf-8') as snapshot_file:
+                        workers[os.path.basename(path)] = json.load(snapshot_file)
+                except (OSError, ValueError, sqlite3.Error):
+                    continue # Fichero a medio escribir o borrado
+            # El acumulado se lee después de los ficheros: uno sumado entre medias cuenta solo en el acumulado
+            try:
+                retired, retired_files = self._retired()
+                snapshots.append(retired)
+            except sqlite3.Error as e:
+                logger.warning(f"No se pudo leer el acumulado de métricas: {e}")
+                retired_files = set()
+            snapshots.extend(snapshot for file_name, snapshot in workers.items() if file_name not in retired_files)
+
+        counters, histograms = {}, {}
+        for snapshot in snapshots:
+            if snapshot.get('buckets') != list(self.buckets):
+                continue
+            for name, labels, value in snapshot['counters']:
+                key = (name, tuple(tuple(label) for label in labels))
+                counters[key] = counters.get(key, 0) + value
+            for name, labels, values in snapshot['histograms']:
+                key = (name, tuple(tuple(label) for label in labels))
+                total = histograms.setdefault(key, [0] * len(values))
+                for position, value in enumerate(values):
+                    total[position] += value
+        return {'counters': counters, 'histograms': histograms}
+
+    def render(self) -> str:
+        """Formato de texto de Prometheus"""
+        collected = self.collect()
+        lines = []
+        for name in sorted({name for name, _ in collected['counters']}):
+            lines.append(f"# HELP {name} {_HELP.get(name, name)}")
+            lines.append(f"# TYPE {name} counter")
+            for (metric, labels), value in sorted(collected['counters'].items()):
+                if metric == name:
+                    lines.append(f"{name}{_format_labels(labels)} {_format_value(value)}")
+
+        for name in sorted({name for name, _ in collected['histograms']}):
+            lines.append(f"# HELP {name} {_HELP.get(name, name)}")
+            lines.append(f"# TYPE {name} histogram")
+            for (metric, labels), values in sorted(collected['histograms'].items()):
+                if metric != name:
+                    continue
+                cumulative = 0
+                for bound, count in zip(list(self.buckets) + ['+Inf'], values[:-1]):
+                    cumulative += count
+                    lines.append(f"{name}_bucket{_format_labels(labels + (('le', str(bound)),))} {cumulative}")
+                lines.append(f"{name}_sum{_format_labels(labels)} {_format_value(values[-1])}")
+                lines.append(f"{name}_count{_format_labels(labels)} {cumulative}")
+        return '\n'.join(lines) + '\n'
+
+
+def _process_alive(pid: int) -> bool:
+    if pid == os.getpid():
+        return True # Otro registro de este proceso, o uno anterior con el PID reutilizado (lo descarta la antigüedad)
+    try:
+        os.kill(pid, 0)
+    except ProcessLookupError:
+        return False
+    except PermissionError:
+        return True
+    return True
+
+def _escape(value) -> str:
+    return str(value).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
+
+def _format_labels(labels) -> str:
+    if not labels:
+        return ''
+    return '{' + ','.join(f'{key}="{_escape(value)}"' for key, value in labels) + '}'
+
+def _format_value(value) -> str:
+    return str(int(value)) if float(value).is_integer() else repr(round(float(value), 6))
+
+
+_metrics_registry = None
+_metrics_registry_lock = threading.Lock()
+
+def get_metrics_registry(config=None) -> MetricsRegistry:
+    """Registro de métricas del proceso, creado (y arrancado su volcado) la primera vez"""
+    global _metrics_registry
+    with _metrics_registry_lock:
+        if _metrics_registry is None:
+            _metrics_registry = MetricsRegistry.from_config(config or {})
+            _metrics_registry.start()
+        return _metrics_registry
+
+def reset_metrics_registry():
+    global _metrics_registry
+    with _metrics_registry_lock:
+        if _metrics_registry is not None:
+            _metrics_registry.close()
+            atexit.unregister(_metrics_registry.close)
+        _metrics_registry = None
@@ -0,0 +1,82 @@
+from contextlib import contextmanager
+from contextvars import ContextVar
+from threading import Lock
+from typing import Dict, Optional
+import re
+import time
+
+_current_timing: ContextVar[Optional['RequestTiming']] = ContextVar('request_timing', default=None)
+
+
+class RequestTiming:
+    """
+    Tiempo gastado por una petición en cada fase (auth, db, llamadas a otros
+    microservicios...). Lo alimentan varios hilos si la petición hace fan-out,
+    así que una fase puede sumar más que el tiempo total de la petición
+    """
+    def __init__(self):
+        self.started = time.perf_counter()
+        self._phases: Dict[str, list] = {} # fase -> [segundos, veces]
+        self._lock = Lock()
+
+    def record(self, phase: str, seconds: float):
+        with self._lock:
+            totals = self._phases.setdefault(phase, [0.0, 0])
+            totals[0] += seconds
+            totals[1] += 1
+
+    def breakdown(self) -> Dict[str, dict]:
+        with self._lock:
+            phases = {phase: {'ms': round(seconds * 1000, 2), 'count': count}
+                      for phase, (seconds, count) in self._phases.items()}
+        phases['total'] = {'ms': round((time.perf_counter() - self.started) * 1000, 2), 'count': 1}
+        return phases
+
+    def header(self) -> str:
+        """Valor de la cabecera Server-Timing"""
+        entries = []
+        for phase, values in self.breakdown().items():
+            entry = f"{_metric_name(phase)};dur={values['ms']}"
+            if values['count'] > 1:
+                entry += f';desc="{values["count"]} llamadas"'
+            entries.append(entry)
+        return ', '.join(entries)
+
+
+def _metric_name(phase: str) -> str:
+    return re.sub(r'[^A-Za-z0-9_\-]', '_', phase).lower()
+
+
+def start_request_timing() -> RequestTiming:
+    timing = RequestTiming()
+    _current_timing.set(timing)
+    return timing
+
+def current_timing() -> Optional[RequestTiming]:
+    return _current_timing.get()
+
+def end_request_timing():
+    _current_timing.set(None)
+
+def record_timing(phase: str, seconds: float):
+    """Suma el tiempo a la fase de la petición en curso (nada fuera de una petición)"""
+    timing = _current_timing.get()
+    if timing is not None:
+        timing.record(phase, seconds)
+
+@contextmanager
+def timed(phase: str):
+    started = time.perf_counter()
+    try:
+        yield
+    finally:
+        record_timing(phase, time.perf_counter() - started)
+
+@contextmanager
+def bind_timing(timing: Optional[RequestTiming]):
+    """Usa en otro hilo (p.ej. del pool de fan-out) el contexto de tiempos de la petición"""
+    token = _current_timing.set(timing)
+    try:
+        yield
+    finally:
+        _current_timing.reset(token)
@@ -0,0 +1,63 @@
+from threading import Event, Lock
+from typing import Any, Callable, Hashable
+
+
+class _Call:
+    """Llamada en curso compartida entre los hilos que piden la misma clave"""
+    def __init__(self):
+        self.event = Event()
+        self.result = None
+        self.error = None
+
+
+class SingleFlight:
+    """
+    Agrupa llamadas concurrentes con la misma clave: solo la primera ejecuta la
+    función y el resto espera y recibe su mismo resultado (o excepción)
+    """
+    def __init__(self):
+        self._lock = Lock()
+        self._calls = {}
+        self.executed = 0 # Llamadas que realmente se ejecutaron
+        self.shared = 0 # Llamadas que reutilizaron una ejecución en curso
+
+    def do(self, key: Hashable, fn: Callable[[], Any]) -> Any:
+        with self._lock:
+            call = self._calls.get(key)
+            if call is not None:
+                self.shared += 1
+                leader = False
+            else:
+                call = _Call()
+                self._calls[key] = call
+                self.executed += 1
+                leader = True
+
+        if not leader:
+            call.event.wait()
+            if call.error is not None:
+                raise call.error
+            return call.result
+
+        try:
+            call.result = fn()
+            return call.result
+        except BaseException as e:
+            call.error = e
+            raise
+        finally:
+            with self._lock:
+                self._calls.pop(key, None)
+            call.event.set()
+
+    def in_flight(self) -> int:
+        with self._lock:
+            return len(self._calls)
+
+    def stats(self) -> dict:
+        with self._lock:
+            return {
+                'executed': self.executed,
+                'shared': self.shared,
+                'in_flight': len(self._calls)
+            }
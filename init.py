@@ -3,7 +3,29 @@ from flask import jsonify
 from flask_swagger_ui import get_swaggerui_blueprint
 from datetime import datetime
 from helpers.ApiExceptions import APIException
-from flask import request
+from flask import request, Response
+
+def create_app(config_name='default'):
+    """Construye la aplicación: configuración, base de datos, clientes, rutas y pool de conexiones ya abierto"""
+    from flask import Flask
+    from config import config, EurekaConfig
+    from db import db
+    from clients import init_client
+    from helpers.db_pool import warm_up_pool
+
+    app = Flask(__name__)
+    app.config.from_object(config[config_name])
+    db.init_app(app)
+    if str(app.config.get('SERVICE_DISCOVERY_MODE', 'static')).lower() == 'eureka':
+        EurekaConfig.init_eureka(app) # Los clientes resuelven las instancias con el registro de Eureka
+    init_client(app)
+    register_blueprints(app)
+    register_swagger(app)
+
+    # Conexiones del pool abiertas antes de la primera petición
+    with app.app_context():
+        warm_up_pool(db.engine, app.config.get('DB_POOL_WARMUP', 0))
+    return app
 
 def register_blueprints(app):
     """Registry all app's blueprints"""
@@ -53,7 +75,9 @@ def register_basic_routes(app):
             "status": "running",
             "endpoints-generales": {
                 "docs": app.config['SWAGGER_URL'],
-                "health": "/api/v1/health"
+                "health": "/api/v1/health",
+                "diagnostics": "/api/v1/diagnostics/clients",
+                "metrics": "/metrics"
             }
         })
     
@@ -64,6 +88,46 @@ def register_basic_routes(app):
             "service": app.config['SERVICE_NAME'],
             "timestamp": datetime.today()
         })
+
+    @app.route('/metrics')
+    def metrics():
+        """Métricas en formato Prometheus agregadas de todos los workers"""
+        from helpers.metrics import get_metrics_registry
+        return Response(get_metrics_registry(app.config).render(), mimetype='text/plain; version=0.0.4')
+
+    @app.route('/api/v1/diagnostics/clients')
+    def clients_diagnostics():
+        import clients # Acceso a las instancias creadas en init_client
+        from auth.token_manager import get_token_manager
+        from auth.verified_token_cache import get_verified_token_cache
+        from auth.jwks_store import get_jwks_store
+        from auth.introspection_cache import get_introspection_cache
+        from helpers.async_log_writer import log_writers_stats
+
+        diagnostics = {}
+        for name in ('content_client', 'payment_client', 'user_client', 'notification_client'):
+            client = getattr(clients, name, None)
+            if client is not None:
+                diagnostics[name] = client.get_diagnostics()
+
+        from service.outbox_worker import get_outbox_worker
+        from service.stock_saga import get_stock_saga_journal, get_stock_saga_recovery
+        outbox_worker = get_outbox_worker()
+        stock_saga_recovery = get_stock_saga_recovery()
+
+        return jsonify({
+            "service": app.config['SERVICE_NAME'],
+            "clients": diagnostics,
+            "service_token": get_token_manager(app).stats(),
+            "verified_tokens": get_verified_token_cache(app).stats(),
+            "jwks": get_jwks_store(app).stats(),
+            "introspection": get_introspection_cache(app).stats(),
+            "request_log": log_writers_stats(),
+            "outbox": outbox_worker.stats() if outbox_worker is not None else None,
+            "stock_saga_recovery": stock_saga_recovery.stats() if stock_saga_recovery is not None else None,
+            "stock_sagas_needing_repair": get_stock_saga_journal(app.config.get('STOCK_SAGA_JOURNAL_PATH') or None).needs_repair(),
+            "timestamp": datetime.today()
+        })
     
     # Manejador global de excepciones de tipo APIException, les da el formato de JSON para devolverlo
     @app.errorhandler(APIException)
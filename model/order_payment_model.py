@@ -0,0 +1,25 @@
+from db import db
+from datetime import datetime
+
+class OrderPayment(db.Model):
+    # Resultado del pago de cada vendedor de una compra: un reintento solo paga a los que faltan
+    __tablename__ = 'order_payments'
+
+    id = db.Column(db.Integer, primary_key=True)
+    order_public_id = db.Column(db.String(36), nullable = False, index = True)
+    seller_username = db.Column(db.String(50), nullable = False)
+    idempotency_key = db.Column(db.String(100), unique = True, nullable = False) # compra:vendedor, la misma en cada reintento
+    payment_id = db.Column(db.String(100), nullable = True)
+    status = db.Column(db.String(20), nullable = True) # Estado devuelto por el microservicio de pagos (COMPLETED...)
+    amount = db.Column(db.Float, nullable = False)
+    error = db.Column(db.String(500), nullable = True)
+    attempts = db.Column(db.Integer, default = 0, nullable = False)
+    created_at = db.Column(db.DateTime, default = datetime.now, nullable = False)
+    updated_at = db.Column(db.DateTime, default = datetime.now, onupdate = datetime.now, nullable = True)
+
+    __table_args__ = (
+        db.UniqueConstraint('order_public_id', 'seller_username', name='uq_order_payments_seller'),
+    )
+
+    def __repr__(self):
+        return f"<OrderPayment {self.order_public_id}:{self.seller_username} - {self.status}>"
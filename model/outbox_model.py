@@ -0,0 +1,34 @@
+from db import db
+from enum import Enum
+from datetime import datetime
+
+class OutboxStatus(str, Enum):
+    PENDING = "PENDING"
+    SENT = "SENT"
+    FAILED = "FAILED" # Agotados los reintentos
+
+class OutboxMessage(db.Model):
+    # Efectos secundarios pendientes, escritos en la misma transacción que el cambio de la compra
+    __tablename__ = 'outbox'
+
+    id = db.Column(db.Integer, primary_key=True)
+    destination = db.Column(db.String(50), nullable = False) # Microservicio destino: notification, payment...
+    event_type = db.Column(db.String(100), nullable = False)
+    aggregate_id = db.Column(db.String(36), nullable = False, index = True) # public_id de la compra
+    payload = db.Column(db.JSON, nullable = False)
+    idempotency_key = db.Column(db.String(100), unique = True, nullable = True)
+    status = db.Column(db.Enum(OutboxStatus), default = OutboxStatus.PENDING, nullable = False)
+    attempts = db.Column(db.Integer, default = 0, nullable = False)
+    available_at = db.Column(db.DateTime, default = datetime.now, nullable = False) # No se entrega antes (backoff)
+    locked_by = db.Column(db.String(100), nullable = True)
+    locked_until = db.Column(db.DateTime, nullable = True) # Lease del worker que lo está entregando
+    last_error = db.Column(db.String(500), nullable = True)
+    created_at = db.Column(db.DateTime, default = datetime.now, nullable = False)
+    sent_at = db.Column(db.DateTime, nullable = True)
+
+    __table_args__ = (
+        db.Index('ix_outbox_pending', 'status', 'destination', 'available_at'),
+    )
+
+    def __repr__(self):
+        return f"<OutboxMessage {self.id} {self.destination}:{self.event_type} - {self.status}>"
@@ -1,9 +1,14 @@
 from model.order_model_ import Order, OrderItem, OrderStatus
 from dao.order_dao import OrderDAO
+from dao.order_payment_dao import OrderPaymentDAO, PAYMENT_COMPLETED
 from dto.order_dto import CreateOrderRequestDTO
 from typing import Optional, List
 from datetime import datetime, UTC
 from clients import user_client, content_client, payment_client
+from helpers.fanout import fan_out, FanOutCancelled, FanOutTimeout
+from service.stock_saga import StockSaga
+from service.outbox_worker import DESTINATION_NOTIFICATION
+from flask import current_app, has_app_context
 #from helpers import ProductNotFoundException
 import uuid
 import logging
@@ -108,60 +113,91 @@ class OrderService:
         return order_paid.status is OrderStatus.PAID
     
     @staticmethod
-    def check_stock_availability(order_id: str) -> dict:
+    def _config_value(key: str, default):
+        """Valor de configuración de la app activa (o el valor por defecto fuera de contexto)"""
+        if has_app_context():
+            return current_app.config.get(key, default)
+        return default
+
+    @staticmethod
+    def _check_item_stock(item) -> dict:
+        """Comprueba el stock de un único item de la compra"""
+        try:
+            # Get product stock from content client response
+            stock_response = content_client.get_product_stock_by_id(item.product_public_id)
+
+            if not stock_response or not stock_response.get('success') is True:
+                return {
+                    'product_id': item.product_public_id,
+                    'available': False,
+                    'error': 'Servicio de contenido no disponible'
+                }
+
+            current_stock = stock_response.get('stock_product', 0)
+
+            if current_stock is None or current_stock < item.quantity:
+                return {
+                    'product_id': item.product_public_id,
+                    'available': False,
+                    'current_stock': current_stock,
+                    'required': item.quantity
+                }
+            return {
+                'product_id': item.product_public_id,
+                'available': True,
+                'current_stock': current_stock
+            }
+        except Exception as e:
+            logger.error(f'Error verificando el stock de {item.product_public_id}')
+            return {
+                'product_id': item.product_public_id,
+                'available': False,
+                'error': str(e)
+            }
+
+    @staticmethod
+    def check_stock_availability(order_id: str, timeout: Optional[float] = None) -> dict:
         """
-        Verifica la disponibilidad de stock antes de procesar el pago
+        Verifica la disponibilidad de stock antes de procesar el pago.
+        Las consultas se lanzan en paralelo (concurrencia acotada) y con un deadline
+        por petición; en cuanto un producto no está disponible se cancelan las pendientes
         """
         try:
             order = OrderService.find_order(order_id)
             if not order:
                 raise OrderNotFoundException(f"Orden {order_id} no encontrada")
             logger.info(f"Order para verificar el stock de sus productos: {order}")
+
+            items = list(order.items)
+            if timeout is None:
+                timeout = float(OrderService._config_value('STOCK_CHECK_DEADLINE_SECONDS', 8))
+
+            results = fan_out(
+                OrderService._check_item_stock,
+                items,
+                max_concurrency=int(OrderService._config_value('STOCK_CHECK_MAX_CONCURRENCY', 8)),
+                timeout=timeout,
+                stop_when=lambda result: isinstance(result, dict) and not result['available']
+            )
+
             availability_check = []
-            
-            for item in order.items:
-                try:
-                    # Get product stock from content client response
-                    stock_response = content_client.get_product_stock_by_id(item.product_public_id)
-
-                    if not stock_response or not stock_response.get('success') is True:
-                        availability_check.append({
-                            'product_id': item.product_public_id,
-                            'available': False,
-                            'error': 'Servicio de contenido no disponible'
-                        })
-                        continue
-                    
-                    current_stock = stock_response.get('stock_product', 0)
-
-                    if current_stock is None:
-                        availability_check.append({
-                            'product_id': item.product_public_id,
-                            'available': False,
-                            'current_stock': current_stock,
-                            'required': item.quantiy 
-                        })
-                    elif current_stock < item.quantity:
-                        availability_check.append({
-                            'product_id': item.product_public_id,
-                            'available': False,
-                            'current_stock': current_stock,
-                            'required': item.quantity
-                        })
-                    else:
-                        availability_check.append({
-                            'product_id': item.product_public_id,
-                            'available': True,
-                            'current_stock': current_stock
-                        })
-                except Exception as e:
-                    logger.error(f'Error verificando el stock de {item.product_public_id}')      
-                    availability_check.append({
-                        'product_id': item.product_public_id,
-                        'available': False,
-                        'error': str(e)
-                    })  
-            
+            for item, result in zip(items, results):
+                if isinstance(result, dict):
+                    availability_check.append(result)
+                    continue
+
+                if isinstance(result, FanOutCancelled):
+                    error = 'Comprobación cancelada: otro producto no está disponible'
+                elif isinstance(result, FanOutTimeout):
+                    error = 'Tiempo límite de comprobación de stock agotado'
+                else:
+                    error = str(result)
+                availability_check.append({
+                    'product_id': item.product_public_id,
+                    'available': False,
+                    'error': error
+                })
+
             all_available = all(item['available'] for item in availability_check)
             
             return {
@@ -191,11 +227,18 @@ class OrderService:
     def list_orders(size: int, page: int):
         return OrderDAO.get_all(size, page)
     
+    @staticmethod
+    def _stock_saga() -> StockSaga:
+        """Motor de sagas de stock (las abandonadas las termina StockSagaRecovery en segundo plano)"""
+        return StockSaga.from_config(content_client, current_app.config if has_app_context() else {})
+
     @staticmethod
     def update_product_stock(order_id: str, revertir: bool) -> dict:
 
         """
-        Solicita al microservicio de contenido que actualice el stock del producto
+        Solicita al microservicio de contenido que actualice el stock de los productos
+        de la compra. Los descuentos se aplican en paralelo como una saga: si alguno
+        falla se compensan los ya aplicados. Con revertir=True se repone el stock
         """
 
         try:
@@ -203,92 +246,29 @@ class OrderService:
 
             if not order:
                 raise ProductNotFoundException(order_id, f"Error al encontrar el producto {order_id}")
-            
-            results = [] # Almacenará los resultados que arroja el microservicio de contenido
-            successful_updates = [] # Almacenará todos los resultados exitosos que arroka el microservicio de contenido
-            for item in order.items:
-                try:
-                    if not revertir:
-                        stock_result = content_client.update_product_stock_by_id(
-                            item.product_public_id,
-                            -item.quantity)
-                        
-                        if stock_result is None:
-                            results.append({
-                                'product_id': item.product_public_id,
-                                'success': False,
-                                'error': 'Servicio de contenido no disponible'
-                            })
-
-                        success = stock_result.get('success', False)
-
-                        results.append({
-                            'product_id': item.product_public_id,
-                            'success': success,
-                            'error': stock_result.get('error') if not success else None
-                        })
-
-                        if success: 
-                            successful_updates.append({
-                                'product_id': item.product_public_id,
-                                'quantity_changed': item.quantity
-                            })
-                        else:
-                            OrderService._rollback_stock_updates(content_client, successful_updates) # Desacemos los que se hayan actualizado
-                            break # No nos interesa seguir actualizando si uno ya ha fallado
-                    else:
-                        stock_result = content_client.update_product_stock_by_id(
-                            item.product_public_id,
-                            +item.quantity)      
-                except Exception as e:
-                    logger.error(f"Error actualizando stock de {item.product_public_id}: {e}")
-                    results.append({
-                        'product_id': item.product_public_id,
-                        'success': False,
-                        'error': str(e)
-                    })
-                    # Rollback
-                    OrderService._rollback_stock_updates(
-                        content_client, 
-                        successful_updates
-                    )
-                    break
 
-            all_success = all(result['success'] for result in results)    
+            # Variación del stock por producto: negativa al descontar, positiva al reponer
+            steps = StockSaga.build_steps(order.items, sign=1 if revertir else -1)
+            saga_result = OrderService._stock_saga().execute(order_id, steps, compensate_on_failure=not revertir)
 
-            if all_success:
+            if saga_result['success']:
                 return {
                     'success': True,
                     'message': 'Stock de todos los productos de la compra actualizados correctamente',
-                    'details': results
+                    'details': saga_result['details']
                 }
             else:
                 return {
                     'success': False,
                     'message': 'Fallo en la actualización del stock sobre alguno o todos los productos de la compra',
-                    'details': results
+                    'details': saga_result['details']
                 }
             
-        except OrderNotFoundException:
+        except (OrderNotFoundException, ProductNotFoundException):
             raise    
         except Exception as e:
             logger.error(f"Error actualizando stock: {str(e)}")
-            raise ProductNotFoundException(f"Error actualizando stock: {str(e)}")
-        
-    @staticmethod
-    def _rollback_stock_updates(content_client, updates: List[dict]):
-        """Revierte actualizaciones de stock en caso de fallo"""
-        logger.warning(f"Iniciando rollback de {len(updates)} actualizaciones de stock")
-        
-        for update in updates:
-            try:
-                content_client.update_product_stock_by_id(
-                    update['product_id'],
-                    update['quantity_changed']  # Restaurar cantidad
-                )
-                logger.info(f"Rollback exitoso para {update['product_id']}")
-            except Exception as e:
-                logger.error(f"Error en rollback de {update['product_id']}: {e}")    
+            raise ProductNotFoundException('stock', f"Error actualizando stock: {str(e)}")
 
     @staticmethod
     def save(order: CreateOrderRequestDTO, username: str):
@@ -299,10 +279,13 @@ class OrderService:
             total_price = 0.0
             order_items = []
 
+            # Obtain all order's products info at once (ids sin repetir, en paralelo)
+            products = content_client.get_products_by_ids([item_dto.productId for item_dto in order.items])
+
             for item_dto in order.items:
-                # Obtain order's products info
                 #product_info = OrderService.find_order_item(item_dto.productId)
-                product_info = content_client.get_product_by_id(item_dto.productId)
+                product_entry = products.get(item_dto.productId) or {}
+                product_info = product_entry.get('data') if product_entry.get('success') else None
 
                 if not product_info or 'price' not in product_info:
                     raise ProductNotFoundException(
@@ -342,8 +325,12 @@ class OrderService:
                 created_at = datetime.now(UTC),
                 items = order_items
             )    
-            # Save info in database
-            saved_info = OrderDAO.add_order(new_order, username)
+            # Save info in database (la notificación va al outbox en la misma transacción)
+            saved_info = OrderDAO.add_order(
+                new_order,
+                username,
+                outbox_events=[OrderService._order_notification(new_order, 'order.created')]
+            )
             logger.info(f"Order {saved_info} creado correctamente")
 
             return saved_info
@@ -357,7 +344,11 @@ class OrderService:
     @staticmethod
     def process_order_payment(order_id: str, order_data: dict) -> dict:
         """
-        Procesa el pago de una compra utilizando el cliente de pagos
+        Procesa el pago de una compra utilizando el cliente de pagos.
+        Se hace un pago por vendedor y todos se envían en paralelo, cada uno con una
+        clave de idempotencia determinista (compra + vendedor) para que reintentar sea seguro.
+        El resultado de cada vendedor se guarda, así que si alguno falla un reintento solo
+        paga a los que faltan. payment_id es el del primer pago; todos van en payments
         """
         try:
             # Obtenemos la info de la compra
@@ -381,56 +372,134 @@ class OrderService:
                 pagos_por_vendedor[seller_key]['amount'] += item.total
                 pagos_por_vendedor[seller_key]['concept'].append(item.product_name)  
 
-            purchase_id = order_id
-
-            # Iterar y notificar el pago
-            for seller_username, data in pagos_por_vendedor.items():
-                # Comunicación con el microservicio de usuarios para obtener su id, en base a su nombre
-                #artist_id = user_client.get_seller_by_username(seller_username) # Produccion
-                artist_id = "1c3c7bfd-7f05-4c9e-b308-b708aea49242"
-
-                payment_dto = {
-                    'purchaseId': purchase_id,
-                    'artistId': artist_id,
-                    'artistName': data['artistName'],
-                    'concept': f"Venta de: {', '.join(data['concept'][:2])}...", # Une varios nombres de items en una cadena y solo coge los dos primeros, evita conceptos grandes
-                    'paymentDate': datetime.now().isoformat(),
-                    'amount': data['amount'],
-                    'paymentMethod': order_data.get("payment_method"),
-                    'status': "PENDING"
-                }
+            # Vendedores ya cobrados en un intento anterior: no se les vuelve a pagar
+            completed = OrderPaymentDAO.find_completed(order_id)
+            sellers = [(seller_username, data) for seller_username, data in pagos_por_vendedor.items()
+                       if seller_username not in completed]
+
+            # Ids de todos los vendedores de una vez (desde caché si están)
+            user_client.prefetch_sellers([seller_username for seller_username, _ in sellers])
+
+            results = fan_out(
+                lambda seller: OrderService._pay_seller(order_id, seller[0], seller[1], order_data),
+                sellers,
+                max_concurrency=int(OrderService._config_value('PAYMENT_MAX_CONCURRENCY', 8)),
+                drain=True # Un pago ya enviado no se abandona
+            )
+
+            attempted = []
+            for (seller_username, data), result in zip(sellers, results):
+                if isinstance(result, Exception):
+                    result = {'seller': seller_username, 'success': False, 'error': str(result)}
+                result['amount'] = data['amount']
+                result['idempotency_key'] = OrderService._payment_idempotency_key(order_id, seller_username)
+                attempted.append(result)
+            OrderPaymentDAO.record(order_id, attempted)
+
+            if attempted and all(payment.get('unavailable') for payment in attempted):
+                raise PaymentProcessingException("Servicio de pagos no disponible")
+
+            # En el orden de los items de la compra, con los cobrados antes marcados
+            by_seller = {payment['seller']: payment for payment in attempted}
+            payments = []
+            for seller_username in pagos_por_vendedor:
+                if seller_username in completed:
+                    previous = completed[seller_username]
+                    payments.append({'seller': seller_username, 'success': True, 'payment_id': previous.payment_id,
+                                     'status': previous.status, 'error': None, 'already_paid': True})
+                else:
+                    payments.append(by_seller[seller_username])
 
-                payment_result = payment_client.procesamiento_pagos(payment_dto)
+            if payments and all(payment['success'] and payment.get('status') == PAYMENT_COMPLETED for payment in payments):
+                payment_ids = [payment['payment_id'] for payment in payments]
+                order_info = OrderDAO.mark_order_as_paid(
+                    order_id,
+                    outbox_events=[OrderService._order_notification(order, 'order.paid', payment_ids=payment_ids)]
+                )
 
-                if payment_result is None:
-                    raise PaymentProcessingException("Servicio de pagos no disponible")
+                return {
+                    'success': True,
+                    'payment_id': payment_ids[0],
+                    'status': 'COMPLETED',
+                    'message': 'Pago realizado exitosamente',
+                    'transaction_data': order_info,
+                    'payments': payments
+                }
 
-                if payment_result['success'] and payment_result['status'] == 'COMPLETED':
-                    order_info = OrderDAO.mark_order_as_paid(order_id)
-                    
-                    return {
-                        'success': True,
-                        'payment_id': payment_result['payment_id'],
-                        'status': payment_result['status'],
-                        'message': 'Pago realizado exitosamente',
-                        'transaction_data': order_info
-                    }
-                else:
-                    return {
-                        'success': False,
-                        'error': payment_result.get('error'),
-                        'message': 'Error en el procesamiento de pagos'
-                    }
+            failed = [payment for payment in payments if not payment['success'] or payment.get('status') != PAYMENT_COMPLETED]
+            logger.error(f"Pagos fallidos en la compra {order_id}: {[payment['seller'] for payment in failed]}")
+            return {
+                'success': False,
+                'error': failed[0].get('error') if failed else 'Compra sin productos',
+                'message': 'Error en el procesamiento de pagos',
+                'transaction_data': None,
+                'payments': payments,
+                'pending_sellers': [payment['seller'] for payment in failed] # Los que pagará un reintento
+            }
          
         except (OrderNotFoundException, PaymentProcessingException):
             raise    
         except Exception as e:
             logger.error(f"Error procesando pago de orden: {str(e)}")
-            raise ProductNotFoundException(f"Error procesando pago: {str(e)}")    
+            raise ProductNotFoundException('pago', f"Error procesando pago: {str(e)}")
 
+    @staticmethod
+    def _order_notification(order: Order, event_type: str, **extra) -> dict:
+        """Evento del outbox para notificar un cambio de la compra (lo entrega OutboxWorker)"""
+        return {
+            'destination': DESTINATION_NOTIFICATION,
+            'event_type': event_type,
+            'payload': {
+                'type': event_type,
+                'orderId': order.public_id,
+                'username': order.made_by_username,
+                'sellers': sorted({item.seller_username for item in order.items}),
+                'total': float(order.total) if order.total else 0.0,
+                **extra
+            },
+            'idempotency_key': f"{order.public_id}:{event_type}"
+        }
 
+    @staticmethod
+    def _payment_idempotency_key(order_id: str, seller_username: str) -> str:
+        return f"{order_id}:{seller_username}"
+
+    @staticmethod
+    def _pay_seller(order_id: str, seller_username: str, data: dict, order_data: dict) -> dict:
+        """Pago de la parte de un vendedor: resuelve su id en usuarios y envía el pago"""
+        # Comunicación con el microservicio de usuarios para obtener su id, en base a su nombre
+        seller = user_client.get_seller_by_username(seller_username)
+        if isinstance(seller, dict) and isinstance(seller.get('data'), dict):
+            seller = seller['data']
+        artist_id = seller.get('id') if isinstance(seller, dict) else None
+        if not artist_id:
+            return {'seller': seller_username, 'success': False, 'error': f'Vendedor {seller_username} no encontrado'}
+
+        payment_dto = {
+            'purchaseId': order_id,
+            'artistId': artist_id,
+            'artistName': data['artistName'],
+            'concept': f"Venta de: {', '.join(data['concept'][:2])}...", # Une varios nombres de items en una cadena y solo coge los dos primeros, evita conceptos grandes
+            'paymentDate': datetime.now().isoformat(),
+            'amount': data['amount'],
+            'paymentMethod': order_data.get("payment_method"),
+            'status': "PENDING"
+        }
+
+        payment_result = payment_client.procesamiento_pagos(
+            payment_dto, idempotency_key=OrderService._payment_idempotency_key(order_id, seller_username))
+
+        if payment_result is None:
+            return {'seller': seller_username, 'success': False, 'unavailable': True, 'error': 'Servicio de pagos no disponible'}
+
+        return {
+            'seller': seller_username,
+            'success': payment_result.get('success', False),
+            'payment_id': payment_result.get('payment_id'),
+            'status': payment_result.get('status'),
+            'error': payment_result.get('error')
+        }
 
-    
     @staticmethod
     def delete(public_id: str):
         return OrderDAO.delete_order(public_id)
@@ -0,0 +1,237 @@
+import atexit
+import os
+import socket
+import threading
+import time
+import uuid
+import logging
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime
+from typing import Callable, Dict, List, Optional
+from dao.outbox_dao import OutboxDAO
+
+logger = logging.getLogger(__name__)
+
+# Destinos del outbox
+DESTINATION_NOTIFICATION = 'notification'
+
+THROUGHPUT_WINDOW_SECONDS = 60
+
+
+def parse_destination_limits(value) -> Dict[str, int]:
+    """'notification=2,payment=4' -> {'notification': 2, 'payment': 4}"""
+    if isinstance(value, dict):
+        return {destination: int(limit) for destination, limit in value.items()}
+    limits = {}
+    for part in str(value or '').split(','):
+        if '=' in part:
+            destination, limit = part.split('=', 1)
+            limits[destination.strip()] = int(limit)
+    return limits
+
+
+class OutboxWorker:
+    """
+    Vacía la tabla outbox en segundo plano: un hilo reserva lotes de mensajes
+    pendientes (con lease) y un pool de hilos los entrega con el handler de
+    cada destino, con un límite de lotes en vuelo por destino. Un lote fallido
+    se reintenta con backoff exponencial; la entrega es al menos una vez, así
+    que los destinos deben tolerar duplicados (idempotency_key).
+    Es también la cola de notificaciones del proceso: la petición solo inserta
+    en la tabla, los lotes se forman por tamaño (batch_size) o por ventana
+    (poll_interval), la cola no descarta nada y al apagar se terminan los lotes en vuelo
+    """
+    def __init__(self, app, handlers: Dict[str, Callable[[List[dict]], bool]],
+                 destination_limits: Optional[Dict[str, int]] = None, default_limit: int = 1,
+                 max_workers: int = 4, batch_size: int = 50, poll_interval: float = 1.0,
+                 lease_seconds: float = 60, max_attempts: int = 10,
+                 retry_backoff: float = 5, retry_backoff_max: float = 300):
+        self.app = app
+        self.handlers = dict(handlers)
+        self.batch_size = batch_size
+        self.poll_interval = poll_interval
+        self.lease_seconds = lease_seconds
+        self.max_attempts = max_attempts
+        self.retry_backoff = retry_backoff
+        self.retry_backoff_max = retry_backoff_max
+        self.max_workers = max_workers
+        self.worker_id = f"{socket.gethostname()}:{os.getpid()}:{uuid.uuid4().hex[:8]}"
+        limits = destination_limits or {}
+        self._slots = {destination: threading.BoundedSemaphore(max(1, limits.get(destination, default_limit)))
+                       for destination in self.handlers}
+        self._limits = {destination: max(1, limits.get(destination, default_limit)) for destination in self.handlers}
+        self._executor = None
+        self._thread = None
+        self._stop = threading.Event()
+        self._lock = threading.Lock()
+
+        # Métricas
+        self.delivered = {destination: 0 for destination in self.handlers}
+        self.failed = {destination: 0 for destination in self.handlers}
+        self.batches = 0
+        self.last_delivery_lag = None # Segundos entre que se escribió el mensaje y se entregó
+        self._recent = deque() # (instante, mensajes entregados) para el throughput
+
+    @classmethod
+    def from_config(cls, app, handlers) -> 'OutboxWorker':
+        config = app.config
+        return cls(
+            app,
+            handlers,
+            destination_limits = parse_destination_limits(config.get('OUTBOX_DESTINATION_CONCURRENCY', '')),
+            default_limit = int(config.get('OUTBOX_DEFAULT_CONCURRENCY', 1)),
+            max_workers = int(config.get('OUTBOX_MAX_WORKERS', 4)),
+            batch_size = int(config.get('OUTBOX_BATCH_SIZE', 50)),
+            poll_interval = float(config.get('OUTBOX_POLL_INTERVAL_SECONDS', 1.0)),
+            lease_seconds = float(config.get('OUTBOX_LEASE_SECONDS', 60)),
+            max_attempts = int(config.get('OUTBOX_MAX_ATTEMPTS', 10)),
+            retry_backoff = float(config.get('OUTBOX_RETRY_BACKOFF_SECONDS', 5)),
+            retry_backoff_max = float(config.get('OUTBOX_RETRY_BACKOFF_MAX_SECONDS', 300))
+        )
+
+    def start(self):
+        with self._lock:
+            if self._thread is not None:
+                return
+            self._executor = ThreadPoolExecutor(max_workers=self.max_workers, thread_name_prefix='outbox')
+            self._thread = threading.Thread(target=self._poll_loop, name='outbox-poller', daemon=True)
+            self._thread.start()
+        atexit.register(self.stop)
+
+    def stop(self, timeout: float = 5):
+        """Deja de reservar lotes y espera a que terminen de entregarse los que están en vuelo"""
+        self._stop.set()
+        if self._thread is not None:
+            self._thread.join(timeout)
+        if self._executor is not None:
+            self._executor.shutdown(wait=True)
+
+    def _poll_loop(self):
+        idle = False
+        # Sin mensajes se espera poll_interval; si hubo trabajo se sigue de inmediato
+        while not self._stop.wait(self.poll_interval if idle else 0.01):
+            try:
+                idle = not self.run_once()
+            except Exception as e:
+                idle = True
+                logger.error(f"Error en el worker del outbox: {e}")
+
+    def run_once(self) -> bool:
+        """
+        Reserva un lote por destino con hueco libre y lo entrega (en el pool si el
+        worker está arrancado, si no en este hilo). True si se reservó algún lote
+        """
+        claimed_any = False
+        for destination in self.handlers:
+            slot = self._slots[destination]
+            if not slot.acquire(blocking=False):
+                continue # Destino con todos sus lotes en vuelo
+
+            try:
+                with self.app.app_context():
+                    batch = OutboxDAO.claim_batch(destination, self.worker_id, self.batch_size, self.lease_seconds)
+            except Exception:
+                slot.release()
+                raise
+
+            if not batch:
+                slot.release()
+                continue
+
+            claimed_any = True
+            if self._executor is not None:
+                self._executor.submit(self._deliver, destination, batch)
+            else:
+                self._deliver(destination, batch)
+        return claimed_any
+
+    def _deliver(self, destination: str, batch: List[dict]):
+        try:
+            try:
+                with self.app.app_context():
+                    ok = self.handlers[destination](batch)
+                error = None if ok else 'El destino rechazó el lote'
+            except Exception as e:
+                ok, error = False, str(e)
+
+            ids = [message['id'] for message in batch]
+            with self.app.app_context():
+                if ok:
+                    OutboxDAO.mark_sent(ids, self.worker_id)
+                else:
+                    attempts = max(message['attempts'] for message in batch)
+                    retry_in = min(self.retry_backoff * (2 ** (attempts - 1)), self.retry_backoff_max)
+                    OutboxDAO.mark_failed(ids, self.worker_id, error, retry_in, self.max_attempts)
+                    logger.warning(f"Lote de {len(batch)} mensajes a {destination} fallido (intento {attempts}): {error}")
+
+            self._record(destination, batch, ok)
+        except Exception as e:
+            # El lease vencerá y el lote se volverá a entregar
+            logger.error(f"Error cerrando un lote del outbox para {destination}: {e}")
+        finally:
+            self._slots[destination].release()
+
+    def _record(self, destination: str, batch: List[dict], ok: bool):
+        now = time.monotonic()
+        with self._lock:
+            self.batches += 1
+            if not ok:
+                self.failed[destination] += len(batch)
+                return
+            self.delivered[destination] += len(batch)
+            self._recent.append((now, len(batch)))
+            oldest = min((message['created_at'] for message in batch if message.get('created_at')), default=None)
+            if oldest is not None:
+                self.last_delivery_lag = round((datetime.now() - oldest).total_seconds(), 3)
+
+    def stats(self) -> dict:
+        now = time.monotonic()
+        with self._lock:
+            while self._recent and now - self._recent[0][0] > THROUGHPUT_WINDOW_SECONDS:
+                self._recent.popleft()
+            stats = {
+                'worker_id': self.worker_id,
+                'running': self._thread is not None and not self._stop.is_set(),
+                'destination_limits': dict(self._limits),
+                'delivered': dict(self.delivered),
+                'failed_deliveries': dict(self.failed),
+                'batches': self.batches,
+                'throughput_per_second': round(sum(count for _, count in self._recent) / THROUGHPUT_WINDOW_SECONDS, 3),
+                'last_delivery_lag_seconds': self.last_delivery_lag
+            }
+        try:
+            with self.app.app_context():
+                stats.update(OutboxDAO.pending_stats())
+        except Exception as e:
+            stats['error'] = str(e)
+        return stats
+
+
+_outbox_worker = None
+_outbox_worker_lock = threading.Lock()
+
+def init_outbox_worker(app, notification_client) -> OutboxWorker:
+    """Arranca el worker del outbox del proceso con los handlers de cada destino"""
+    global _outbox_worker
+    with _outbox_worker_lock:
+        if _outbox_worker is None:
+            handlers = {
+                DESTINATION_NOTIFICATION: lambda batch: notification_client.realizar_notificaciones(
+                    [message['payload'] for message in batch])
+            }
+            _outbox_worker = OutboxWorker.from_config(app, handlers)
+            if app.config.get('OUTBOX_WORKER_ENABLED', True):
+                _outbox_worker.start()
+        return _outbox_worker
+
+def get_outbox_worker() -> Optional[OutboxWorker]:
+    return _outbox_worker
+
+def reset_outbox_worker():
+    global _outbox_worker
+    with _outbox_worker_lock:
+        if _outbox_worker is not None:
+            _outbox_worker.stop()
+            atexit.unregister(_outbox_worker.stop)
+        _outbox_worker = None
@@ -0,0 +1,472 @@
+import os
+import sqlite3
+import tempfile
+import threading
+import time
+import uuid
+import logging
+import requests
+from typing import Dict, List, Optional, Tuple
+from helpers.fanout import fan_out, FanOutCancelled
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_JOURNAL_PATH = os.path.join(tempfile.gettempdir(), 'orders-service-stock-saga.db')
+
+# Estados de la saga
+SAGA_RUNNING = 'running'
+SAGA_COMPLETED = 'completed'
+SAGA_COMPENSATING = 'compensating'
+SAGA_COMPENSATED = 'compensated'
+SAGA_FAILED = 'failed' # Compensación incompleta: se reintenta al recuperar
+SAGA_INCOMPLETE = 'incomplete' # Saga sin compensación (reposición) con pasos fallidos
+SAGA_NEEDS_REPAIR = 'needs_repair' # Con pasos de resultado desconocido: hay que revisar el stock a mano
+
+# Estados de cada paso
+STEP_PENDING = 'pending'
+STEP_APPLIED = 'applied'
+STEP_FAILED = 'failed'
+STEP_SKIPPED = 'skipped'
+STEP_COMPENSATED = 'compensated'
+STEP_COMPENSATION_FAILED = 'compensation_failed'
+STEP_UNKNOWN = 'unknown' # Sin respuesta (timeout) o en vuelo cuando cayó el worker: no se sabe si se aplicó
+
+# Identidad de este proceso en el diario: el PID solo no basta porque tras reiniciar
+# el contenedor se reutiliza (a menudo es el 1) y un dueño muerto parecería vivo
+_process_token = uuid.uuid4().hex
+
+def _new_process_token():
+    global _process_token
+    _process_token = uuid.uuid4().hex
+
+os.register_at_fork(after_in_child=_new_process_token) # Cada worker de un servidor con preload tiene el suyo
+
+def process_token() -> str:
+    return _process_token
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS stock_sagas (
+    saga_id TEXT PRIMARY KEY,
+    order_id TEXT NOT NULL,
+    status TEXT NOT NULL,
+    owner_pid INTEGER NOT NULL,
+    owner_token TEXT NOT NULL DEFAULT '',
+    compensable INTEGER NOT NULL,
+    created_at REAL NOT NULL,
+    updated_at REAL NOT NULL
+);
+CREATE TABLE IF NOT EXISTS stock_saga_steps (
+    saga_id TEXT NOT NULL,
+    product_id TEXT NOT NULL,
+    delta INTEGER NOT NULL,
+    status TEXT NOT NULL,
+    error TEXT,
+    PRIMARY KEY (saga_id, product_id)
+);
+"""
+
+
+class StockSagaJournal:
+    """
+    Diario local (SQLite) de las sagas de stock: cada paso se anota antes y
+    después de llamar al microservicio de contenido, de modo que un worker que
+    se reinicia sabe qué descuentos quedaron aplicados y debe compensar
+    """
+    def __init__(self, path: str = DEFAULT_JOURNAL_PATH):
+        self.path = path
+        self._local = threading.local()
+        self._connection().executescript(_SCHEMA)
+
+    def _connection(self) -> sqlite3.Connection:
+        conn = getattr(self._local, 'conn', None)
+        if conn is None:
+            conn = sqlite3.connect(self.path, timeout=5, isolation_level=None)
+            conn.execute('PRAGMA journal_mode=WAL')
+            self._local.conn = conn
+        return conn
+
+    def begin(self, saga_id: str, order_id: str, steps: List[Tuple[str, int]], compensable: bool = True):
+        conn = self._connection()
+        now = time.time()
+        conn.execute('BEGIN IMMEDIATE')
+        try:
+            conn.execute(
+                'INSERT INTO stock_sagas (saga_id, order_id, status, owner_pid, owner_token, compensable, created_at, updated_at) '
+                'VALUES (?, ?, ?, ?, ?, ?, ?, ?)',
+                (saga_id, order_id, SAGA_RUNNING, os.getpid(), process_token(), int(compensable), now, now)
+            )
+            conn.executemany(
+                'INSERT INTO stock_saga_steps (saga_id, product_id, delta, status) VALUES (?, ?, ?, ?)',
+                [(saga_id, product_id, delta, STEP_PENDING) for product_id, delta in steps]
+            )
+            conn.execute('COMMIT')
+        except Exception:
+            conn.execute('ROLLBACK')
+            raise
+
+    def mark_step(self, saga_id: str, product_id: str, status: str, error: Optional[str] = None):
+        """Anota el paso y renueva updated_at: una saga que avanza no se da por abandonada"""
+        conn = self._connection()
+        conn.execute('BEGIN IMMEDIATE')
+        try:
+            conn.execute(
+                'UPDATE stock_saga_steps SET status = ?, error = ? WHERE saga_id = ? AND product_id = ?',
+                (status, error, saga_id, product_id)
+            )
+            conn.execute('UPDATE stock_sagas SET updated_at = ? WHERE saga_id = ?', (time.time(), saga_id))
+            conn.execute('COMMIT')
+        except Exception:
+            conn.execute('ROLLBACK')
+            raise
+
+    def set_status(self, saga_id: str, status: str):
+        self._connection().execute(
+            'UPDATE stock_sagas SET status = ?, updated_at = ? WHERE saga_id = ?',
+            (status, time.time(), saga_id)
+        )
+
+    def steps(self, saga_id: str) -> List[dict]:
+        rows = self._connection().execute(
+            'SELECT product_id, delta, status, error FROM stock_saga_steps WHERE saga_id = ? ORDER BY product_id',
+            (saga_id,)
+        ).fetchall()
+        return [{'product_id': product_id, 'delta': delta, 'status': status, 'error': error}
+                for product_id, delta, status, error in rows]
+
+    def unfinished(self) -> List[Tuple[str, str, int, str, int, float]]:
+        """Sagas sin completar ni compensar del todo: (saga_id, order_id, owner_pid, owner_token, compensable, updated_at)"""
+        return self._connection().execute(
+            'SELECT saga_id, order_id, owner_pid, owner_token, compensable, updated_at FROM stock_sagas '
+            'WHERE status IN (?, ?, ?) ORDER BY created_at',
+            (SAGA_RUNNING, SAGA_COMPENSATING, SAGA_FAILED)
+        ).fetchall()
+
+    def claim(self, saga_id: str, updated_at: float, status: str) -> bool:
+        """Toma la saga para este proceso si nadie la ha tocado desde updated_at"""
+        return self._connection().execute(
+            'UPDATE stock_sagas SET status = ?, owner_pid = ?, owner_token = ?, updated_at = ? WHERE saga_id = ? AND updated_at = ?',
+            (status, os.getpid(), process_token(), time.time(), saga_id, updated_at)
+        ).rowcount == 1
+
+    def prune(self, older_than: float) -> int:
+        """Borra las sagas terminadas sin cambios desde older_than (las que esperan reparación se conservan)"""
+        finished = (SAGA_COMPLETED, SAGA_COMPENSATED, SAGA_INCOMPLETE)
+        conn = self._connection()
+        conn.execute('BEGIN IMMEDIATE')
+        try:
+            conn.execute(
+                'DELETE FROM stock_saga_steps WHERE saga_id IN '
+                '(SELECT saga_id FROM stock_sagas WHERE status IN (?, ?, ?) AND updated_at < ?)',
+                (*finished, older_than)
+            )
+            pruned = conn.execute(
+                'DELETE FROM stock_sagas WHERE status IN (?, ?, ?) AND updated_at < ?',
+                (*finished, older_than)
+            ).rowcount
+            conn.execute('COMMIT')
+        except Exception:
+            conn.execute('ROLLBACK')
+            raise
+        return pruned
+
+    def needs_repair(self) -> List[dict]:
+        """Sagas con pasos de resultado desconocido, pendientes de revisión manual del stock"""
+        rows = self._connection().execute(
+            'SELECT s.saga_id, s.order_id, st.product_id, st.delta, st.error FROM stock_sagas s '
+            'JOIN stock_saga_steps st ON st.saga_id = s.saga_id '
+            'WHERE s.status = ? AND st.status = ? ORDER BY s.created_at, st.product_id',
+            (SAGA_NEEDS_REPAIR, STEP_UNKNOWN)
+        ).fetchall()
+        return [{'saga_id': saga_id, 'order_id': order_id, 'product_id': product_id, 'delta': delta, 'error': error}
+                for saga_id, order_id, product_id, delta, error in rows]
+
+    def status(self, saga_id: str) -> Optional[str]:
+        row = self._connection().execute('SELECT status FROM stock_sagas WHERE saga_id = ?', (saga_id,)).fetchone()
+        return row[0] if row else None
+
+
+class StockSaga:
+    """
+    Aplica las variaciones de stock de una compra en paralelo (concurrencia
+    acotada). Si algún paso falla se dejan de lanzar pasos, se esperan los que
+    estaban en curso y se compensan en paralelo todos los aplicados.
+
+    Cada paso es una variación (delta) sobre el stock actual: negativa para
+    descontar y positiva para reponer; compensar un paso es aplicar -delta.
+    Se envía tal cual como newStock porque el microservicio de contenido lo
+    suma al stock (ver ContentClient.update_product_stock_by_id). Restaurar el
+    valor previo al paso no serviría: pisaría las compras concurrentes del producto
+    """
+    def __init__(self, content_client, journal: StockSagaJournal, max_concurrency: int = 8,
+                 stale_after: float = 300):
+        self.content_client = content_client
+        self.journal = journal
+        self.max_concurrency = max_concurrency
+        self.stale_after = stale_after # Una saga sin cambios en este tiempo se da por abandonada
+
+    @classmethod
+    def from_config(cls, content_client, config) -> 'StockSaga':
+        return cls(
+            content_client,
+            get_stock_saga_journal(config.get('STOCK_SAGA_JOURNAL_PATH', '') or None),
+            max_concurrency = int(config.get('STOCK_SAGA_MAX_CONCURRENCY', 8)),
+            stale_after = float(config.get('STOCK_SAGA_STALE_SECONDS', 300))
+        )
+
+    @staticmethod
+    def build_steps(items, sign: int) -> List[Tuple[str, int]]:
+        """Un paso por producto (se suman las cantidades de items repetidos)"""
+        deltas: Dict[str, int] = {}
+        for item in items:
+            deltas[item.product_public_id] = deltas.get(item.product_public_id, 0) + sign * item.quantity
+        return list(deltas.items())
+
+    def execute(self, order_id: str, steps: List[Tuple[str, int]], compensate_on_failure: bool = True) -> dict:
+        """
+        Ejecuta la saga. Con compensate_on_failure=False (p.ej. al reponer el stock
+        de una compra) se intentan todos los pasos aunque alguno falle
+        """
+        saga_id = str(uuid.uuid4())
+        self.journal.begin(saga_id, order_id, steps, compensable=compensate_on_failure)
+
+        outcomes = fan_out(
+            lambda step: self._apply_step(saga_id, *step),
+            steps,
+            max_concurrency=self.max_concurrency,
+            stop_when=(lambda outcome: not isinstance(outcome, dict) or not outcome['success']) if compensate_on_failure else None,
+            drain=True
+        )
+
+        details = []
+        for (product_id, delta), outcome in zip(steps, outcomes):
+            if isinstance(outcome, FanOutCancelled):
+                self.journal.mark_step(saga_id, product_id, STEP_SKIPPED)
+                outcome = {'product_id': product_id, 'success': False, 'error': 'No aplicado: otro producto falló'}
+            elif isinstance(outcome, Exception):
+                outcome = {'product_id': product_id, 'success': False, 'error': str(outcome)}
+            details.append(outcome)
+
+        if all(detail['success'] for detail in details):
+            self.journal.set_status(saga_id, SAGA_COMPLETED)
+            return {'success': True, 'saga_id': saga_id, 'details': details}
+
+        if not compensate_on_failure:
+            unknown = any(detail.get('outcome_unknown') for detail in details)
+            self.journal.set_status(saga_id, SAGA_NEEDS_REPAIR if unknown else SAGA_INCOMPLETE)
+            return {'success': False, 'saga_id': saga_id, 'details': details}
+
+        compensated = self.compensate(saga_id)
+        return {'success': False, 'saga_id': saga_id, 'compensated': compensated, 'details': details}
+
+    def _apply_step(self, saga_id: str, product_id: str, delta: int) -> dict:
+        try:
+            result = self.content_client.update_product_stock_by_id(product_id, delta)
+        except (requests.exceptions.Timeout, requests.exceptions.ConnectionError) as e:
+            result = {'success': False, 'outcome_unknown': True, 'error': str(e)}
+        except Exception as e:
+            result = {'success': False, 'error': str(e)}
+
+        if result is None:
+            result = {'success': False, 'error': 'Servicio de contenido no disponible'}
+
+        success = result.get('success', False)
+        unknown = not success and result.get('outcome_unknown', False)
+        error = None if success else result.get('error', 'Error actualizando stock')
+        if unknown:
+            # El PATCH pudo aplicarse: ni se da por fallido ni se compensa a ciegas
+            logger.error(f"Saga {saga_id}: estado desconocido del stock de {product_id} ({delta:+d}): {error}")
+            status = STEP_UNKNOWN
+        else:
+            status = STEP_APPLIED if success else STEP_FAILED
+        self.journal.mark_step(saga_id, product_id, status, error)
+        return {'product_id': product_id, 'success': success, 'outcome_unknown': unknown, 'error': error}
+
+    def compensate(self, saga_id: str) -> bool:
+        """Deshace en paralelo los pasos aplicados; True si todos se compensaron"""
+        self.journal.set_status(saga_id, SAGA_COMPENSATING)
+        to_compensate = [step for step in self.journal.steps(saga_id)
+                         if step['status'] in (STEP_APPLIED, STEP_COMPENSATION_FAILED)]
+        logger.warning(f"Compensando {len(to_compensate)} actualizaciones de stock de la saga {saga_id}")
+
+        outcomes = fan_out(
+            lambda step: self._compensate_step(saga_id, step['product_id'], step['delta']),
+            to_compensate,
+            max_concurrency=self.max_concurrency,
+            drain=True
+        )
+        compensated = all(outcome is True for outcome in outcomes)
+        if not compensated:
+            self.journal.set_status(saga_id, SAGA_FAILED)
+        elif any(step['status'] == STEP_UNKNOWN for step in self.journal.steps(saga_id)):
+            self.journal.set_status(saga_id, SAGA_NEEDS_REPAIR)
+        else:
+            self.journal.set_status(saga_id, SAGA_COMPENSATED)
+        return compensated
+
+    def _compensate_step(self, saga_id: str, product_id: str, delta: int) -> bool:
+        try:
+            result = self.content_client.update_product_stock_by_id(product_id, -delta)
+        except Exception as e:
+            result = {'success': False, 'error': str(e)}
+
+        if result and result.get('success'):
+            self.journal.mark_step(saga_id, product_id, STEP_COMPENSATED)
+            logger.info(f"Rollback exitoso para {product_id}")
+            return True
+
+        error = result.get('error') if result else 'Servicio de contenido no disponible'
+        self.journal.mark_step(saga_id, product_id, STEP_COMPENSATION_FAILED, error)
+        logger.error(f"Error en rollback de {product_id}: {error}")
+        return False
+
+    def recover(self) -> int:
+        """
+        Termina las sagas que un worker dejó a medias (proceso muerto o sin cambios en
+        stale_after): compensa los pasos aplicados. Los pasos que estaban en vuelo se marcan
+        como desconocidos para revisarlos a mano (compensarlos sin saber si se aplicaron
+        podría inflar el stock). Las sagas de reposición no se compensan, solo se cierran.
+        Devuelve el número de sagas recuperadas
+        """
+        recovered = 0
+        now = time.time()
+        for saga_id, order_id, owner_pid, owner_token, compensable, updated_at in self.journal.unfinished():
+            abandoned = not _owner_alive(owner_pid, owner_token) or now - updated_at >= self.stale_after
+            status = SAGA_COMPENSATING if compensable else SAGA_INCOMPLETE
+            if not abandoned or not self.journal.claim(saga_id, updated_at, status):
+                continue # La sigue otro worker vivo o ya la ha tomado otro
+            recovered += 1
+            for step in self.journal.steps(saga_id):
+                if step['status'] == STEP_PENDING:
+                    self.journal.mark_step(saga_id, step['product_id'], STEP_UNKNOWN)
+                    logger.error(f"Saga {saga_id} (compra {order_id}): estado desconocido del stock de {step['product_id']}")
+            logger.warning(f"Recuperando la saga de stock {saga_id} de la compra {order_id}")
+            if compensable:
+                self.compensate(saga_id)
+            elif any(step['status'] == STEP_UNKNOWN for step in self.journal.steps(saga_id)):
+                self.journal.set_status(saga_id, SAGA_NEEDS_REPAIR)
+        return recovered
+
+
+def _owner_alive(pid: int, token: str) -> bool:
+    if token == process_token():
+        return True
+    if pid == os.getpid():
+        return False # Mismo PID pero otro token: un proceso anterior que ya no existe
+    try:
+        os.kill(pid, 0)
+    except ProcessLookupError:
+        return False
+    except PermissionError:
+        return True
+    return True
+
+
+_journal = None
+_journal_lock = threading.Lock()
+
+def get_stock_saga_journal(path: Optional[str] = None) -> StockSagaJournal:
+    """Diario compartido del proceso (el fichero lo comparten todos los workers)"""
+    global _journal
+    with _journal_lock:
+        if _journal is None:
+            _journal = StockSagaJournal(path or DEFAULT_JOURNAL_PATH)
+        return _journal
+
+def reset_stock_saga_journal():
+    global _journal
+    with _journal_lock:
+        _journal = None
+
+
+class StockSagaRecovery:
+    """
+    Hilo de fondo que cada interval segundos termina las sagas abandonadas por
+    workers caídos y borra del diario las terminadas hace más de retention
+    """
+    def __init__(self, saga: StockSaga, interval: float = 60, retention: float = 86400):
+        self.saga = saga
+        self.interval = interval
+        self.retention = retention
+        self._thread = None
+        self._stop = threading.Event()
+        self._lock = threading.Lock()
+
+        # Métricas
+        self.runs = 0
+        self.recovered = 0
+        self.pruned = 0
+        self.errors = 0
+
+    @classmethod
+    def from_config(cls, content_client, config) -> 'StockSagaRecovery':
+        return cls(
+            StockSaga.from_config(content_client, config),
+            interval = float(config.get('STOCK_SAGA_RECOVERY_INTERVAL_SECONDS', 60)),
+            retention = float(config.get('STOCK_SAGA_RETENTION_SECONDS', 86400))
+        )
+
+    def start(self):
+        with self._lock:
+            if self._thread is not None:
+                return
+            self._thread = threading.Thread(target=self._loop, name='stock-saga-recovery', daemon=True)
+            self._thread.start()
+
+    def stop(self, timeout: float = 5):
+        self._stop.set()
+        if self._thread is not None:
+            self._thread.join(timeout)
+
+    def _loop(self):
+        # La primera pasada es inmediata: recoge lo que dejó el proceso anterior
+        wait = 0
+        while not self._stop.wait(wait):
+            self.run_once()
+            wait = self.interval
+
+    def run_once(self):
+        try:
+            recovered = self.saga.recover()
+            pruned = self.saga.journal.prune(time.time() - self.retention)
+            with self._lock:
+                self.runs += 1
+                self.recovered += recovered
+                self.pruned += pruned
+        except Exception as e:
+            with self._lock:
+                self.errors += 1
+            logger.error(f"Error recuperando sagas de stock pendientes: {e}")
+
+    def stats(self) -> dict:
+        with self._lock:
+            return {
+                'runs': self.runs,
+                'recovered': self.recovered,
+                'pruned': self.pruned,
+                'errors': self.errors,
+                'interval_seconds': self.interval
+            }
+
+
+_recovery = None
+_recovery_lock = threading.Lock()
+
+def init_stock_saga_recovery(app, content_client) -> StockSagaRecovery:
+    """Arranca la recuperación periódica de sagas del proceso"""
+    global _recovery
+    with _recovery_lock:
+        if _recovery is None:
+            _recovery = StockSagaRecovery.from_config(content_client, app.config)
+            if app.config.get('STOCK_SAGA_RECOVERY_ENABLED', True):
+                _recovery.start()
+        return _recovery
+
+def get_stock_saga_recovery() -> Optional[StockSagaRecovery]:
+    return _recovery
+
+def reset_stock_saga_recovery():
+    global _recovery
+    with _recovery_lock:
+        if _recovery is not None:
+            _recovery.stop()
+        _recovery = None
@@ -13,4 +13,37 @@ def app():
 @pytest.fixture
 def client(app):
     """Crear cliente de testing"""
-    return app.test_client()
\ No newline at end of file
+    return app.test_client()
+
+@pytest.fixture(autouse=True)
+def reset_shared_client_state(tmp_path, monkeypatch):
+    """Cada test parte de un estado compartido limpio: tokens, reintentos, circuitos, registro, sagas, JWT verificados, JWKS, introspección y métricas"""
+    from auth.token_manager import reset_token_manager
+    from clients.retry_policy import reset_retry_budget
+    from clients import circuit_breaker
+    from clients.service_registry import reset_service_registry
+    from service import stock_saga
+    from auth.verified_token_cache import reset_verified_token_cache
+    from auth.jwks_store import reset_jwks_store
+    from auth.introspection_cache import reset_introspection_cache
+    from helpers.async_log_writer import reset_log_writers
+    from helpers import metrics
+    monkeypatch.setattr(circuit_breaker, 'DEFAULT_STATE_PATH', str(tmp_path / 'circuits.db'))
+    monkeypatch.setattr(stock_saga, 'DEFAULT_JOURNAL_PATH', str(tmp_path / 'stock-saga.db'))
+    monkeypatch.setattr(metrics, 'DEFAULT_METRICS_DIR', str(tmp_path / 'metrics'))
+    stock_saga.reset_stock_saga_recovery()
+    stock_saga.reset_stock_saga_journal()
+    reset_token_manager()
+    reset_retry_budget()
+    circuit_breaker.reset_circuit_store()
+    reset_service_registry()
+    reset_verified_token_cache()
+    reset_jwks_store()
+    reset_introspection_cache()
+    metrics.reset_metrics_registry()
+    yield
+    reset_log_writers()
+    reset_token_manager()
+    circuit_breaker.reset_circuit_store()
+    reset_service_registry()
+    reset_jwks_store()
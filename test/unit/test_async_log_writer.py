@@ -0,0 +1,84 @@
+import gzip
+import json
+import os
+import subprocess
+import sys
+from helpers.async_log_writer import AsyncLogWriter, get_log_writer
+
+
+class TestAsyncLogWriter:
+
+    def test_records_are_written_in_batches_on_close(self, tmp_path):
+        """Test que los registros encolados se escriben (por lotes) al cerrar"""
+        path = str(tmp_path / 'logs' / 'peticiones.log')
+        writer = AsyncLogWriter(path, batch_size=10, flush_interval=5)
+        writer.start()
+
+        for i in range(25):
+            assert writer.write({'path': f'/orders/{i}', 'status_code': 200}) is True
+        writer.close()
+
+        with open(path, encoding='utf-8') as log_file:
+            lines = [json.loads(line) for line in log_file]
+        assert [line['path'] for line in lines] == [f'/orders/{i}' for i in range(25)]
+        assert writer.stats()['written'] == 25
+        assert writer.stats()['batches'] >= 3
+
+    def test_full_queue_drops_instead_of_blocking(self, tmp_path):
+        """Test que con la cola llena (disco lento) el registro se descarta y se cuenta"""
+        writer = AsyncLogWriter(str(tmp_path / 'peticiones.log'), max_queue_size=2)
+
+        assert writer.write({'n': 1}) is True
+        assert writer.write({'n': 2}) is True
+        assert writer.write({'n': 3}) is False
+        stats = writer.stats()
+        assert stats['dropped'] == 1
+        assert stats['queue_depth'] == 2
+
+    def test_rotation_by_size_with_compression(self, tmp_path):
+        """Test que al superar max_bytes el fichero se rota y la copia se comprime"""
+        path = str(tmp_path / 'peticiones.log')
+        writer = AsyncLogWriter(path, batch_size=1, max_bytes=50, compress=True, backup_count=2)
+
+        for i in range(4):
+            writer._write_batch([{'path': f'/orders/{i}', 'padding': 'x' * 40}])
+        writer._close_file()
+
+        backups = sorted(name for name in os.listdir(tmp_path) if name.endswith('.gz'))
+        assert len(backups) == 2 # Solo se conservan backup_count copias
+        with gzip.open(tmp_path / backups[-1], 'rt', encoding='utf-8') as backup:
+            assert json.loads(backup.readline())['path'] == '/orders/2'
+        with open(path, encoding='utf-8') as log_file:
+            assert json.loads(log_file.readline())['path'] == '/orders/3'
+        assert writer.stats()['rotations'] == 3
+
+    def test_each_process_writes_its_own_file(self, tmp_path):
+        """Test que cada worker escribe y rota su propio fichero (sufijo con el PID)"""
+        writer = get_log_writer(str(tmp_path / 'peticiones.log'), {})
+        writer.write({'path': '/orders/1'})
+        writer.close()
+
+        assert writer.path == str(tmp_path / f'peticiones.{os.getpid()}.log')
+        assert os.listdir(tmp_path) == [f'peticiones.{os.getpid()}.log']
+
+    def test_files_of_dead_workers_are_adopted_as_backups(self, tmp_path):
+        """Test que los ficheros de PIDs muertos pasan a copias del worker y cuentan en su backup_count"""
+        finished = subprocess.run([sys.executable, '-c', 'import os; print(os.getpid())'], capture_output=True, text=True)
+        dead_pid = finished.stdout.strip()
+        (tmp_path / f'peticiones.{dead_pid}.log').write_text('{"path": "/orders/viejo"}\n', encoding='utf-8')
+        (tmp_path / f'peticiones.{dead_pid}.log.20240101-000000-000000').write_text('{}\n', encoding='utf-8')
+
+        writer = AsyncLogWriter(str(tmp_path / 'peticiones.log'), per_process=True, backup_count=5)
+        writer.start()
+        writer.write({'path': '/orders/1'})
+        writer.close()
+
+        own = f'peticiones.{os.getpid()}.log'
+        names = sorted(os.listdir(tmp_path))
+        assert not any(name.startswith(f'peticiones.{dead_pid}.') for name in names)
+        assert own in names
+        assert f'{own}.20240101-000000-000000' in names
+        backups = [name for name in names if name.startswith(f'{own}.')]
+        assert len(backups) == 2
+        adopted = [name for name in backups if not name.endswith('20240101-000000-000000')]
+        assert json.loads((tmp_path / adopted[0]).read_text(encoding='utf-8'))['path'] == '/orders/viejo'
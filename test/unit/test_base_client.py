@@ -1,7 +1,9 @@
 # tests/unit/test_base_client.py
 import pytest
+import time
 from unittest.mock import Mock, patch
 from clients.base_client import BaseClient
+from auth.token_manager import get_token_manager
 
 class TestBaseClient:
     
@@ -20,10 +22,10 @@ class TestBaseClient:
         assert client.service_name == "TEST-SERVICE"
         assert client.timeout == 10
         assert client.app == mock_app
-        assert client._token is None
+        assert client.token_manager is get_token_manager(mock_app)
 
-    @patch('clients.base_client.requests.request')
-    @patch('clients.base_client.KeycloakService')
+    @patch('clients.base_client.requests.Session.request')
+    @patch('auth.token_manager.KeycloakService')
     def test_make_request_with_token(self, mock_keycloak_class, mock_request):
         """Test que _make_request incluye el token JWT"""
         # Configurar mocks
@@ -31,7 +33,7 @@ class TestBaseClient:
         mock_app.config = {'KEYCLOAK_SERVER_URL': 'http://test'}
         
         mock_keycloak = Mock()
-        mock_keycloak._get_token.return_value = "mock-jwt-token"
+        mock_keycloak.get_token_data.return_value = {'access_token': "mock-jwt-token", 'expires_in': 300}
         mock_keycloak_class.return_value = mock_keycloak
         
         mock_response = Mock()
@@ -50,16 +52,35 @@ class TestBaseClient:
         assert headers['X-Service-Name'] == "TEST-SERVICE"
         assert response.status_code == 200
 
-    @patch('clients.base_client.requests.request')
-    @patch('clients.base_client.KeycloakService')
+    @patch('clients.base_client.requests.Session.request')
+    @patch('auth.token_manager.KeycloakService')
+    def test_debug_log_redacts_token_and_body(self, mock_keycloak_class, mock_request, caplog):
+        """Test que el log de depuración de cada intento no incluye el token de servicio ni el cuerpo"""
+        mock_app = Mock()
+        mock_app.config = {'KEYCLOAK_SERVER_URL': 'http://test'}
+        mock_keycloak_class.return_value.get_token_data.return_value = {'access_token': "mock-jwt-token", 'expires_in': 300}
+        mock_request.return_value = Mock(status_code=200)
+
+        client = BaseClient(mock_app, "TEST-SERVICE")
+        with caplog.at_level('DEBUG', logger='clients.base_client'):
+            client._make_request('POST', 'http://test-service/api/pay', json={'card': '4111111111111111'})
+
+        assert 'POST http://test-service/api/pay' in caplog.text
+        assert 'mock-jwt-token' not in caplog.text
+        assert '4111111111111111' not in caplog.text
+
+    @patch('clients.base_client.requests.Session.request')
+    @patch('auth.token_manager.KeycloakService')
     def test_make_request_token_refresh_on_401(self, mock_keycloak_class, mock_request):
         """Test en el que el token se refresca automaticamente al producirse 401"""
         mock_app = Mock()
         mock_app.config = {'KEYCLOAK_SERVER_URL': 'http://test'}
 
         mock_keycloak = Mock()
-        mock_keycloak._get_token.return_value = "old_token"
-        mock_keycloak._refresh_token.return_value = "new_token"
+        mock_keycloak.get_token_data.side_effect = [
+            {'access_token': "old_token", 'expires_in': 300},
+            {'access_token': "new_token", 'expires_in': 300}
+        ]
         mock_keycloak_class.return_value = mock_keycloak
 
         # Primera respuesta 401
@@ -78,5 +99,102 @@ class TestBaseClient:
         # Verificar que se hicieron 2 llamadas
         assert mock_request.call_count == 2
         # Verificar que se refrescó el token
-        mock_keycloak._get_token.assert_called_once()
-        assert response.status_code == 200
\ No newline at end of file
+        assert mock_keycloak.get_token_data.call_count == 2
+        assert mock_request.call_args[1]['headers']['Authorization'] == 'Bearer new_token'
+        assert response.status_code == 200
+
+    @patch('auth.token_manager.KeycloakService')
+    def test_session_is_reused_between_requests(self, mock_keycloak_class):
+        """Test que el cliente reutiliza la misma sesión con pool configurado"""
+        mock_app = Mock()
+        mock_app.config = {'HTTP_POOL_CONNECTIONS': 4, 'HTTP_POOL_MAXSIZE': 8}
+
+        client = BaseClient(mock_app, "TEST-SERVICE")
+        session = client._get_session()
+
+        assert client._get_session() is session
+        adapter = session.get_adapter('http://content-service/products')
+        assert adapter._pool_connections == 4
+        assert adapter._pool_maxsize == 8
+
+        stats = client.get_pool_stats()
+        assert stats['new_connections'] == 0
+        assert stats['reused_connections'] == 0
+        assert stats['pool_maxsize'] == 8
+
+    @patch('clients.base_client.time.monotonic')
+    @patch('auth.token_manager.KeycloakService')
+    def test_session_recycled_after_keepalive(self, mock_keycloak_class, mock_monotonic):
+        """Test que la sesión se renueva al superar la vida keep-alive"""
+        mock_app = Mock()
+        mock_app.config = {'HTTP_KEEPALIVE_SECONDS': 30}
+
+        mock_monotonic.return_value = 100.0
+        client = BaseClient(mock_app, "TEST-SERVICE")
+        first_session = client._get_session()
+
+        mock_monotonic.return_value = 140.0
+        second_session = client._get_session()
+
+        assert second_session is not first_session
+        assert client.get_pool_stats()['session_recycles'] == 1
+
+    @patch('clients.base_client.requests.Session.request')
+    @patch('auth.token_manager.KeycloakService')
+    def test_coalesced_get_honours_raise_errors(self, mock_keycloak_class, mock_request):
+        """Test que un GET agrupado con raise_errors propaga el error de red como el no agrupado"""
+        import requests
+        mock_app = Mock()
+        mock_app.config = {'RETRY_BUDGET_RATIO': 0}
+        mock_keycloak_class.return_value.get_token_data.return_value = {'access_token': "mock-jwt-token", 'expires_in': 300}
+        mock_request.side_effect = requests.exceptions.ReadTimeout('sin respuesta')
+
+        client = BaseClient(mock_app, "TEST-SERVICE")
+        assert client.coalesce_gets
+        with pytest.raises(requests.exceptions.ReadTimeout):
+            client._make_request('GET', 'http://test-service/api/products/1', raise_errors=True)
+        assert client._make_request('GET', 'http://test-service/api/products/1') is None
+
+    @patch('clients.base_client.requests.Session.request')
+    @patch('auth.token_manager.KeycloakService')
+    def test_concurrent_identical_gets_are_coalesced(self, mock_keycloak_class, mock_request):
+        """Test que GETs idénticos simultáneos comparten una única petición"""
+        from threading import Event, Thread
+
+        mock_app = Mock()
+        mock_app.config = {}
+        mock_keycloak = Mock()
+        mock_keycloak.get_token_data.return_value = {'access_token': "mock-jwt-token", 'expires_in': 300}
+        mock_keycloak_class.return_value = mock_keycloak
+
+        release = Event()
+        mock_response = Mock()
+        mock_response.status_code = 200
+
+        def slow_request(**kwargs):
+            release.wait(2)
+            return mock_response
+
+        mock_request.side_effect = slow_request
+
+        client = BaseClient(mock_app, "TEST-SERVICE")
+        responses = []
+        threads = [
+            Thread(target=lambda: responses.append(client._make_request('GET', 'http://test-service/api/products/1')))
+            for _ in range(5)
+        ]
+        for thread in threads:
+            thread.start()
+        # Se libera la respuesta cuando los otros 4 ya esperan la petición en curso
+        deadline = time.monotonic() + 2
+        while client._get_flight.shared < 4 and time.monotonic() < deadline:
+            time.sleep(0.001)
+        release.set()
+        for thread in threads:
+            thread.join()
+
+        assert mock_request.call_count == 1
+        assert responses == [mock_response] * 5
+        coalescing = client.get_diagnostics()['coalescing']
+        assert coalescing['requests_sent'] == 1
+        assert coalescing['requests_collapsed'] == 4
@@ -0,0 +1,85 @@
+from unittest.mock import Mock, patch
+import requests
+from clients.base_client import BaseClient
+from clients.circuit_breaker import CircuitBreakerStore, CLOSED, OPEN, HALF_OPEN
+
+
+class TestCircuitBreakerStore:
+
+    def test_failures_from_all_workers_open_the_circuit(self, tmp_path):
+        """Test que dos workers con el mismo fichero comparten el estado del circuito"""
+        path = str(tmp_path / 'circuits.db')
+        worker_a = CircuitBreakerStore(path, failure_threshold=4)
+        worker_b = CircuitBreakerStore(path, failure_threshold=4)
+
+        for _ in range(2):
+            worker_a.record_failure('content-service:product.get')
+            worker_b.record_failure('content-service:product.get')
+
+        assert worker_a.state('content-service:product.get') == OPEN
+        assert worker_b.allow('content-service:product.get') is False
+        # Otros endpoints del mismo microservicio no se ven afectados
+        assert worker_b.allow('content-service:album.get') is True
+
+    def test_half_open_allows_a_single_probe(self, tmp_path):
+        """Test que tras el recovery timeout solo un llamante envía la prueba"""
+        now = [1000.0]
+        path = str(tmp_path / 'circuits.db')
+        worker_a = CircuitBreakerStore(path, failure_threshold=1, recovery_timeout=30, clock=lambda: now[0])
+        worker_b = CircuitBreakerStore(path, failure_threshold=1, recovery_timeout=30, clock=lambda: now[0])
+
+        worker_a.record_failure('payment-service:payment.get')
+        now[0] += 31
+
+        assert worker_a.allow('payment-service:payment.get') is True
+        assert worker_b.allow('payment-service:payment.get') is False
+        assert worker_b.state('payment-service:payment.get') == HALF_OPEN
+
+        worker_a.record_success('payment-service:payment.get')
+        snapshot = worker_b.snapshot('payment-service:')['payment-service:payment.get']
+        assert snapshot['state'] == CLOSED
+        assert snapshot['transitions'] == {'opened': 1, 'half_opened': 1, 'closed': 1}
+        assert snapshot['rejected_calls'] == 1
+
+    def test_closed_state_is_cached_in_process(self, tmp_path):
+        """Test que un circuito cerrado no se vuelve a leer de SQLite hasta pasado closed_cache_seconds"""
+        now = [1000.0]
+        path = str(tmp_path / 'circuits.db')
+        worker_a = CircuitBreakerStore(path, failure_threshold=1, closed_cache_seconds=1, clock=lambda: now[0])
+        worker_b = CircuitBreakerStore(path, failure_threshold=1, closed_cache_seconds=1, clock=lambda: now[0])
+
+        assert worker_b.allow('content-service:product.get') is True
+        with patch.object(worker_b, '_connection') as mock_connection:
+            assert worker_b.allow('content-service:product.get') is True
+            mock_connection.assert_not_called()
+
+        # Abierto por otro worker: este lo ve al caducar su caché; el que lo abre, al momento
+        worker_a.allow('content-service:product.get')
+        worker_a.record_failure('content-service:product.get')
+        assert worker_a.allow('content-service:product.get') is False
+        assert worker_b.allow('content-service:product.get') is True
+        now[0] += 1.5
+        assert worker_b.allow('content-service:product.get') is False
+
+
+class TestClientCircuit:
+
+    @patch('clients.base_client.requests.Session.request')
+    @patch('auth.token_manager.KeycloakService')
+    def test_open_circuit_short_circuits_requests(self, mock_keycloak_class, mock_request):
+        """Test que con el circuito abierto no se envían más peticiones al endpoint"""
+        mock_app = Mock()
+        mock_app.config = {'CIRCUIT_FAILURE_THRESHOLD': 2, 'RETRY_MAX_ATTEMPTS': 1}
+        mock_keycloak = Mock()
+        mock_keycloak.get_token_data.return_value = {'access_token': "mock-jwt-token", 'expires_in': 300}
+        mock_keycloak_class.return_value = mock_keycloak
+        mock_request.side_effect = requests.exceptions.ConnectionError("caído")
+
+        client = BaseClient(mock_app, "TEST-SERVICE")
+        for _ in range(3):
+            assert client._make_request('GET', 'http://test-service/api/products/1', endpoint='product.get') is None
+
+        assert mock_request.call_count == 2
+        circuits = client.get_diagnostics()['circuits']
+        assert circuits['TEST-SERVICE:product.get']['state'] == OPEN
+        assert circuits['TEST-SERVICE:product.get']['rejected_calls'] == 1
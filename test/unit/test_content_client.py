@@ -1,18 +1,18 @@
 from unittest.mock import Mock, patch
-from clients.content_client import ContentClient
+from clients.content_client import ContentClient, STATIC_FIELDS
 
 
 class TestContentClient:
     
-    @patch('clients.base_client.requests.request')
-    @patch('clients.base_client.KeycloakService')
+    @patch('clients.base_client.requests.Session.request')
+    @patch('auth.token_manager.KeycloakService')
     def test_get_product_by_id_success(self, mock_keycloak_class, mock_request_get):
         # Configuro del mock request
         mock_app = Mock()
         mock_app.config = {'CONTENT_SERVICE_URL': 'http://content-service'}
         
         mock_keycloak = Mock()
-        mock_keycloak._get_token.return_value = "mock-token"
+        mock_keycloak.get_token_data.return_value = {'access_token': "mock-token", 'expires_in': 300}
         mock_keycloak_class.return_value = mock_keycloak
         
         mock_response = Mock()
@@ -48,15 +48,15 @@ class TestContentClient:
         assert result.get('name') == "test-product"
         assert result.get('price') == 19.99
 
-    @patch('clients.base_client.requests.request')
-    @patch('clients.base_client.KeycloakService')
+    @patch('clients.base_client.requests.Session.request')
+    @patch('auth.token_manager.KeycloakService')
     def test_get_product_by_id_not_found(self, mock_keycloak_class, mock_get_product):
         """Test de producto no encontrado"""
         mock_app = Mock()
         mock_app.config = {'CONTENT_SERVICE_URL': 'http://content-service'}
 
         mock_keycloak = Mock()
-        mock_keycloak._get_token.return_value = "mock-token"
+        mock_keycloak.get_token_data.return_value = {'access_token': "mock-token", 'expires_in': 300}
         mock_keycloak_class.return_value = mock_keycloak
 
         mock_response = Mock()
@@ -69,15 +69,15 @@ class TestContentClient:
 
         assert result is None
 
-    @patch('clients.base_client.requests.request')
-    @patch('clients.base_client.KeycloakService')
+    @patch('clients.base_client.requests.Session.request')
+    @patch('auth.token_manager.KeycloakService')
     def test_get_product_stock_by_id(self, mock_keycloak_class, mock_request):
         """Test para obtener exitosamente el stock de un producto""" 
         mock_app = Mock()
         mock_app.config = {'CONTENT_SERVICE_URL': 'http://content-service'}
         
         mock_keycloak = Mock()
-        mock_keycloak._get_token.return_value = "mock-token"
+        mock_keycloak.get_token_data.return_value = {'access_token': "mock-token", 'expires_in': 300}
         mock_keycloak_class.return_value = mock_keycloak
 
         mock_response = Mock()
@@ -97,15 +97,15 @@ class TestContentClient:
         assert result['success'] is True
         assert result['stock_product'] == 50
 
-    @patch('clients.base_client.requests.request')
-    @patch('clients.base_client.KeycloakService')
+    @patch('clients.base_client.requests.Session.request')
+    @patch('auth.token_manager.KeycloakService')
     def test_get_songs_by_id_success(self, mock_keycloak_class, mock_request_get):
         """Test de obtencion de una cancion por su id"""
         mock_app = Mock()
         mock_app.config = {'CONTENT_SERVICE_URL': 'http://content-service'}
 
         mock_keycloak = Mock()
-        mock_keycloak._get_token.return_value = "mock-token"
+        mock_keycloak.get_token_data.return_value = {'access_token': "mock-token", 'expires_in': 300}
         mock_keycloak_class.return_value = mock_keycloak
 
         mock_response = Mock()
@@ -144,15 +144,15 @@ class TestContentClient:
         
         assert result['name'] == "Hey Jude"
 
-    @patch('clients.base_client.requests.request')
-    @patch('clients.base_client.KeycloakService')
+    @patch('clients.base_client.requests.Session.request')
+    @patch('auth.token_manager.KeycloakService')
     def test_get_album_by_id_success(self, mock_keycloak_class, mock_request_get):
         """Test para comprobar la obtención de un album por su id"""
         mock_app = Mock()
         mock_app.config = {'CONTENT_SERVICE_URL': 'http://content-service'}
 
         mock_keycloak = Mock()
-        mock_keycloak._get_token.return_value = "mock-token"
+        mock_keycloak.get_token_data.return_value = {'access_token': "mock-token", 'expires_in': 300}
         mock_keycloak_class.return_vale = mock_keycloak
 
         mock_response = Mock()
@@ -189,4 +189,175 @@ class TestContentClient:
 
         assert result is not None
         assert result['name'] == "Greatest Hits"
-        assert result['price'] == 9.99
\ No newline at end of file
+        assert result['price'] == 9.99
+    @patch('clients.base_client.requests.Session.request')
+    @patch('auth.token_manager.KeycloakService')
+    def test_get_products_by_ids_deduplicates(self, mock_keycloak_class, mock_request):
+        """Test de consulta múltiple: ids repetidos se piden una sola vez y los errores van por id"""
+        mock_app = Mock()
+        mock_app.config = {'CONTENT_SERVICE_URL': 'http://content-service'}
+
+        mock_keycloak = Mock()
+        mock_keycloak.get_token_data.return_value = {'access_token': "mock-token", 'expires_in': 300}
+        mock_keycloak_class.return_value = mock_keycloak
+
+        def fake_request(method, url, **kwargs):
+            response = Mock()
+            if url.endswith('/missing'):
+                response.status_code = 404
+            else:
+                response.status_code = 200
+                response.json.return_value = {'success': True, 'data': {'id': url.rsplit('/', 1)[1], 'price': 5}}
+            return response
+
+        mock_request.side_effect = fake_request
+
+        client = ContentClient(mock_app)
+        result = client.get_products_by_ids(['prod-1', 'missing', 'prod-1'])
+
+        assert mock_request.call_count == 2
+        assert list(result) == ['prod-1', 'missing']
+        assert result['prod-1']['success'] is True
+        assert result['prod-1']['data']['price'] == 5
+        assert result['missing']['success'] is False
+        assert result['missing']['status_code'] == 404
+
+    @patch('clients.base_client.requests.Session.request')
+    @patch('auth.token_manager.KeycloakService')
+    def test_get_products_by_ids_uses_bulk_endpoint(self, mock_keycloak_class, mock_request):
+        """Test de consulta múltiple con endpoint bulk configurado"""
+        mock_app = Mock()
+        mock_app.config = {
+            'CONTENT_SERVICE_URL': 'http://content-service',
+            'CONTENT_BULK_PRODUCTS_PATH': '/products/public/bulk'
+        }
+
+        mock_keycloak = Mock()
+        mock_keycloak.get_token_data.return_value = {'access_token': "mock-token", 'expires_in': 300}
+        mock_keycloak_class.return_value = mock_keycloak
+
+        mock_response = Mock()
+        mock_response.status_code = 200
+        mock_response.json.return_value = {'success': True, 'data': [{'id': 'prod-1', 'price': 5}]}
+        mock_request.return_value = mock_response
+
+        client = ContentClient(mock_app)
+        result = client.get_products_by_ids(['prod-1', 'prod-2'])
+
+        mock_request.assert_called_once()
+        assert mock_request.call_args[1]['url'] == 'http://content-service/products/public/bulk'
+        assert mock_request.call_args[1]['params'] == {'ids': 'prod-1,prod-2'}
+        assert result['prod-1']['data']['price'] == 5
+        assert result['prod-2']['success'] is False
+
+    @patch('auth.token_manager.KeycloakService')
+    def test_unavailable_service_returns_none(self, mock_keycloak_class):
+        """Test que sin respuesta (circuito abierto o sin presupuesto de reintentos) las consultas no fallan con AttributeError"""
+        mock_app = Mock()
+        mock_app.config = {'CONTENT_SERVICE_URL': 'http://content-service'}
+
+        client = ContentClient(mock_app)
+        client._make_request = Mock(return_value=None)
+
+        assert client.get_product_by_id('prod-1') is None
+        assert client.get_songs_by_id('song-1') is None
+        assert client.get_albums_by_id('album-1') is None
+        assert client.get_product_stock_by_id('prod-1') == {'success': False, 'error': 'Servicio de contenido no disponible'}
+
+    @patch('auth.token_manager.KeycloakService')
+    def test_failed_bulk_does_not_get_a_second_timeout(self, mock_keycloak_class):
+        """Test que si el bulk agota el plazo no se lanzan consultas individuales con otro plazo completo"""
+        import time
+        mock_app = Mock()
+        mock_app.config = {
+            'CONTENT_SERVICE_URL': 'http://content-service',
+            'CONTENT_BULK_PRODUCTS_PATH': '/products/public/bulk'
+        }
+
+        client = ContentClient(mock_app)
+        client._get_products_bulk = Mock(side_effect=lambda ids, timeout: time.sleep(timeout) or None)
+        client._get_product_entry = Mock(return_value={'success': True, 'data': {}})
+        result = client.get_products_by_ids(['prod-1', 'prod-2'], timeout=0.05)
+
+        client._get_product_entry.assert_not_called()
+        assert result['prod-1'] == {'success': False, 'error': 'Tiempo límite de consulta agotado'}
+
+    @patch('clients.base_client.requests.Session.request')
+    @patch('auth.token_manager.KeycloakService')
+    def test_get_product_by_id_served_from_cache(self, mock_keycloak_class, mock_request):
+        """Test que la segunda consulta del mismo producto no llama al microservicio"""
+        mock_app = Mock()
+        mock_app.config = {'CONTENT_SERVICE_URL': 'http://content-service'}
+
+        mock_keycloak = Mock()
+        mock_keycloak.get_token_data.return_value = {'access_token': "mock-token", 'expires_in': 300}
+        mock_keycloak_class.return_value = mock_keycloak
+
+        mock_response = Mock()
+        mock_response.status_code = 200
+        mock_response.json.return_value = {'success': True, 'data': {'name': 'test-product', 'price': 19.99}}
+        mock_request.return_value = mock_response
+
+        client = ContentClient(mock_app)
+        client.get_product_by_id("prod-1")
+        result = client.get_product_by_id("prod-1")
+
+        assert mock_request.call_count == 1
+        assert result['price'] == 19.99
+        assert client.get_diagnostics()['product_cache']['hits'] == 1
+
+    @patch('clients.base_client.requests.Session.request')
+    @patch('auth.token_manager.KeycloakService')
+    def test_get_product_by_id_revalidates_with_etag(self, mock_keycloak_class, mock_request):
+        """Test que al caducar el precio se revalida con If-None-Match y un 304 reutiliza el documento"""
+        mock_app = Mock()
+        mock_app.config = {'CONTENT_SERVICE_URL': 'http://content-service', 'PRODUCT_CACHE_PRICE_TTL': 0}
+
+        mock_keycloak = Mock()
+        mock_keycloak.get_token_data.return_value = {'access_token': "mock-token", 'expires_in': 300}
+        mock_keycloak_class.return_value = mock_keycloak
+
+        full_response = Mock()
+        full_response.status_code = 200
+        full_response.headers = {'ETag': '"v1"'}
+        full_response.json.return_value = {'success': True, 'data': {'name': 'test-product', 'price': 19.99}}
+        not_modified = Mock()
+        not_modified.status_code = 304
+        not_modified.headers = {'ETag': '"v1"'}
+        mock_request.side_effect = [full_response, not_modified]
+
+        client = ContentClient(mock_app)
+        client.get_product_by_id("prod-1")
+        result = client.get_product_by_id("prod-1")
+
+        assert result == {'name': 'test-product', 'price': 19.99}
+        assert mock_request.call_args[1]['headers']['If-None-Match'] == '"v1"'
+        not_modified.json.assert_not_called()
+        assert client.get_diagnostics()['conditional_gets']['product.get'] == {
+            'cache_hits': 0, 'not_modified': 1, 'full_responses': 1
+        }
+
+    @patch('clients.base_client.requests.Session.request')
+    @patch('auth.token_manager.KeycloakService')
+    def test_static_reads_outlive_the_price_ttl(self, mock_keycloak_class, mock_request):
+        """Test que las lecturas que solo usan datos estáticos siguen en caché aunque haya caducado el precio"""
+        mock_app = Mock()
+        mock_app.config = {'CONTENT_SERVICE_URL': 'http://content-service', 'PRODUCT_CACHE_PRICE_TTL': 0}
+
+        mock_keycloak = Mock()
+        mock_keycloak.get_token_data.return_value = {'access_token': "mock-token", 'expires_in': 300}
+        mock_keycloak_class.return_value = mock_keycloak
+
+        mock_response = Mock()
+        mock_response.status_code = 200
+        mock_response.json.return_value = {'success': True, 'data': {'name': 'test-product', 'price': 19.99}}
+        mock_request.return_value = mock_response
+
+        client = ContentClient(mock_app)
+        client.get_product_by_id("prod-1")
+        result = client.get_product_by_id("prod-1", fields=STATIC_FIELDS)
+        assert mock_request.call_count == 1
+        assert result['name'] == 'test-product'
+
+        client.get_product_by_id("prod-1") # Con el precio exigido fresco se vuelve a pedir
+        assert mock_request.call_count == 2
@@ -0,0 +1,79 @@
+import time
+from flask import Flask, current_app
+from helpers.fanout import fan_out, FanOutCancelled, FanOutTimeout
+
+
+class TestFanOut:
+
+    def test_results_keep_item_order(self):
+        """Test que los resultados respetan el orden de entrada aunque terminen desordenados"""
+        def slow_double(value):
+            time.sleep(0.05 * (3 - value))
+            return value * 2
+
+        assert fan_out(slow_double, [0, 1, 2], max_concurrency=3) == [0, 2, 4]
+
+    def test_exceptions_are_returned_in_place(self):
+        """Test que una excepción ocupa la posición de su item"""
+        def fail_on_two(value):
+            if value == 2:
+                raise ValueError("fallo")
+            return value
+
+        results = fan_out(fail_on_two, [1, 2, 3])
+        assert results[0] == 1
+        assert isinstance(results[1], ValueError)
+        assert results[2] == 3
+
+    def test_stop_when_cancels_pending_items(self):
+        """Test que al cumplirse la condición de parada no se lanzan más tareas"""
+        calls = []
+
+        def check(value):
+            calls.append(value)
+            return value != 'agotado'
+
+        results = fan_out(check, ['agotado', 'b', 'c'], max_concurrency=1,
+                          stop_when=lambda available: available is False)
+
+        assert results[0] is False
+        assert isinstance(results[1], FanOutCancelled)
+        assert isinstance(results[2], FanOutCancelled)
+        assert calls == ['agotado']
+
+    def test_deadline_marks_unfinished_items(self):
+        """Test que al agotarse el deadline las tareas pendientes se marcan como timeout"""
+        def sleepy(value):
+            time.sleep(value)
+            return value
+
+        start = time.monotonic()
+        results = fan_out(sleepy, [0, 1], max_concurrency=2, timeout=0.2)
+
+        assert time.monotonic() - start < 0.9
+        assert results[0] == 0
+        assert isinstance(results[1], FanOutTimeout)
+
+    def test_app_context_is_propagated(self):
+        """Test que las tareas se ejecutan dentro del contexto de la app"""
+        app = Flask(__name__)
+        app.config['MARCA'] = 'orders'
+
+        with app.app_context():
+            results = fan_out(lambda _: current_app.config['MARCA'], [1, 2])
+
+        assert results == ['orders', 'orders']
+
+    def test_drain_waits_for_running_tasks(self):
+        """Test que con drain=True las tareas en curso al parar devuelven su resultado real"""
+        def task(value):
+            if value == 0:
+                return 'fallo'
+            time.sleep(0.1)
+            return value
+
+        results = fan_out(task, [0, 1, 2], max_concurrency=2, stop_when=lambda result: result == 'fallo', drain=True)
+
+        assert results[0] == 'fallo'
+        assert results[1] == 1
+        assert isinstance(results[2], FanOutCancelled)
@@ -0,0 +1,82 @@
+from threading import Event
+from unittest.mock import Mock, patch
+from clients.base_client import BaseClient
+from clients.hedging import HedgePolicy
+from clients.latency_tracker import LatencyTracker
+
+
+def _hedging_client(extra_config=None):
+    mock_app = Mock()
+    mock_app.config = {'HEDGE_ENABLED': True, 'ADAPTIVE_TIMEOUT_MIN_SAMPLES': 5, 'HEDGE_MIN_DELAY_SECONDS': 0.01}
+    mock_app.config.update(extra_config or {})
+    client = BaseClient(mock_app, "TEST-SERVICE")
+    client.hedged_endpoints = {'product.get'}
+    for _ in range(10):
+        client.latency.record('product.get', 0.02)
+    return client
+
+
+class TestHedging:
+
+    def test_policy_stops_when_error_rate_too_high(self):
+        """Test que no se duplican peticiones si el endpoint está fallando"""
+        policy = HedgePolicy(enabled=True, max_error_rate=0.2)
+        latency = LatencyTracker(min_samples=1)
+        for i in range(10):
+            latency.record('product.get', 0.05, error=i < 5)
+
+        assert policy.try_hedge('product.get', latency) is False
+        assert policy.stats()['suppressed'] == 1
+
+    def test_policy_limits_hedge_ratio(self):
+        """Test que la fracción de peticiones duplicadas no supera el máximo"""
+        policy = HedgePolicy(enabled=True, max_ratio=0.1, window=20)
+        latency = LatencyTracker(min_samples=1)
+
+        allowed = [policy.try_hedge('product.get', latency) for _ in range(5)]
+        assert allowed == [True, True, False, False, False]
+
+    @patch('clients.base_client.requests.Session.request')
+    @patch('auth.token_manager.KeycloakService')
+    def test_slow_request_is_hedged_and_fastest_wins(self, mock_keycloak_class, mock_request):
+        """Test que una lectura lenta se duplica y gana la primera respuesta"""
+        mock_keycloak = Mock()
+        mock_keycloak.get_token_data.return_value = {'access_token': "mock-jwt-token", 'expires_in': 300}
+        mock_keycloak_class.return_value = mock_keycloak
+
+        client = _hedging_client({'HTTP_COALESCE_GETS': False})
+        release = Event()
+        slow_response, fast_response = Mock(status_code=200), Mock(status_code=200)
+        calls = []
+
+        def request(**kwargs):
+            calls.append(kwargs)
+            if len(calls) == 1:
+                release.wait(2)
+                return slow_response
+            return fast_response
+
+        mock_request.side_effect = request
+        response = client._make_request('GET', 'http://content/products/1', endpoint='product.get')
+        release.set()
+
+        assert response is fast_response
+        assert mock_request.call_count == 2
+        stats = client.get_diagnostics()['hedging']
+        assert stats['hedges_sent'] == 1
+        assert stats['hedge_wins'] == 1
+
+    @patch('clients.base_client.requests.Session.request')
+    @patch('auth.token_manager.KeycloakService')
+    def test_fast_request_not_hedged(self, mock_keycloak_class, mock_request):
+        """Test que una respuesta rápida no genera una segunda petición"""
+        mock_keycloak = Mock()
+        mock_keycloak.get_token_data.return_value = {'access_token': "mock-jwt-token", 'expires_in': 300}
+        mock_keycloak_class.return_value = mock_keycloak
+        mock_request.return_value = Mock(status_code=200)
+
+        client = _hedging_client({'HEDGE_MIN_DELAY_SECONDS': 1})
+        client._make_request('GET', 'http://content/products/1', endpoint='product.get')
+
+        assert mock_request.call_count == 1
+        assert client.hedging.stats()['hedges_sent'] == 0
@@ -0,0 +1,74 @@
+import threading
+import time
+from unittest.mock import Mock, patch
+from flask import Flask, jsonify, request
+from auth.introspection_cache import IntrospectionCache
+from decorator.tokenDecorator import token_required, VERIFY_INTROSPECTION
+
+
+class TestIntrospectionCache:
+
+    def test_active_and_inactive_tokens_are_cached(self):
+        """Test que los tokens activos e inactivos se cachean y los errores no"""
+        cache = IntrospectionCache(max_ttl=60, negative_ttl=10)
+        loader = Mock(side_effect=lambda token: {'active': token == 'bueno', 'exp': time.time() + 600})
+
+        assert cache.get_or_load('bueno', loader)['active'] is True
+        assert cache.get_or_load('bueno', loader)['active'] is True
+        assert cache.get_or_load('revocado', loader) is None
+        assert cache.get_or_load('revocado', loader) is None
+        assert loader.call_count == 2
+
+        failing = Mock(side_effect=ConnectionError("keycloak caído"))
+        for _ in range(2):
+            try:
+                cache.get_or_load('otro', failing)
+            except ConnectionError:
+                pass
+        assert failing.call_count == 2
+
+    def test_concurrent_identical_tokens_share_one_introspection(self):
+        """Test que los hilos que validan a la vez el mismo token hacen una sola introspección"""
+        cache = IntrospectionCache()
+
+        def slow_introspection(token):
+            time.sleep(0.1)
+            return {'active': True, 'username': 'svc', 'exp': time.time() + 600}
+        loader = Mock(side_effect=slow_introspection)
+
+        results = []
+        threads = [threading.Thread(target=lambda: results.append(cache.get_or_load('opaco', loader))) for _ in range(5)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+
+        assert [result['username'] for result in results] == ['svc'] * 5
+        assert loader.call_count == 1
+
+
+class TestIntrospectionRoute:
+
+    @patch('auth.keycloak_service.requests.post')
+    def test_route_can_use_cached_introspection(self, mock_post):
+        """Test que un endpoint configurado con introspección valida el token opaco una sola vez"""
+        mock_post.return_value = Mock(
+            status_code=200,
+            json=Mock(return_value={'active': True, 'username': 'content-service', 'roles': ['internal_service'],
+                                    'exp': time.time() + 600})
+        )
+        app = Flask(__name__)
+        app.config.update({'KEYCLOAK_SERVER_URL': 'http://keycloak:8080', 'KEYCLOAK_REALM': 'undersounds'})
+
+        @app.route('/internal')
+        @token_required(roles=['internal_service'], verification=VERIFY_INTROSPECTION)
+        def internal_only():
+            return jsonify(request.user_claims)
+
+        client = app.test_client()
+        for _ in range(3):
+            response = client.get('/internal', headers={'Authorization': 'Bearer opaco-123'})
+            assert response.status_code == 200
+            assert response.json['username'] == 'content-service'
+
+        assert mock_post.call_count == 1
@@ -0,0 +1,77 @@
+import threading
+import time
+from unittest.mock import Mock, patch
+from auth.jwks_store import JWKSStore, UnknownKeyError
+import pytest
+
+
+def _jwks(*kids):
+    return {'keys': [{'kty': 'oct', 'kid': kid, 'alg': 'HS256', 'use': 'sig', 'k': 'c2VjcmV0'} for kid in kids]}
+
+
+def _response(jwks):
+    return Mock(status_code=200, json=Mock(return_value=jwks), raise_for_status=Mock())
+
+
+class TestJWKSStore:
+
+    @patch('auth.jwks_store.requests.get')
+    def test_keys_are_indexed_by_kid(self, mock_get):
+        """Test que tras la precarga cada kid se resuelve sin volver a Keycloak"""
+        mock_get.return_value = _response(_jwks('kid-1', 'kid-2'))
+        store = JWKSStore('http://keycloak/certs', ttl=0)
+
+        assert store.warm_up() is True
+        assert store.get_key('kid-2') is store.get_key('kid-2')
+        assert mock_get.call_count == 1
+
+    @patch('auth.jwks_store.requests.get')
+    def test_unknown_kid_refetches_once_and_is_rate_limited(self, mock_get):
+        """Test que un kid nuevo (rotación) provoca una única descarga, limitada en frecuencia"""
+        now = [0.0]
+        mock_get.return_value = _response(_jwks('kid-1'))
+        store = JWKSStore('http://keycloak/certs', ttl=0, min_refetch_interval=30, clock=lambda: now[0])
+        store.warm_up()
+
+        now[0] += 31
+        mock_get.return_value = _response(_jwks('kid-1', 'kid-2'))
+        assert store.get_key('kid-2') is not None
+
+        with pytest.raises(UnknownKeyError):
+            store.get_key('kid-3')
+        assert mock_get.call_count == 2
+        assert store.stats()['rate_limited_refetches'] == 1
+
+    @patch('auth.jwks_store.requests.get')
+    def test_concurrent_unknown_kids_share_one_fetch(self, mock_get):
+        """Test que los hilos que piden a la vez un kid desconocido comparten la descarga"""
+        started = threading.Event()
+
+        def slow_get(url, timeout):
+            started.set()
+            time.sleep(0.1)
+            return _response(_jwks('kid-1'))
+        mock_get.side_effect = slow_get
+        store = JWKSStore('http://keycloak/certs', ttl=0, min_refetch_interval=0)
+
+        keys = []
+        threads = [threading.Thread(target=lambda: keys.append(store.get_key('kid-1'))) for _ in range(5)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+
+        assert len(keys) == 5
+        assert mock_get.call_count == 1
+
+    @patch('auth.jwks_store.requests.get')
+    def test_failed_refresh_keeps_previous_keys(self, mock_get):
+        """Test que si Keycloak falla al refrescar se siguen usando las claves conocidas"""
+        mock_get.return_value = _response(_jwks('kid-1'))
+        store = JWKSStore('http://keycloak/certs', ttl=0)
+        store.warm_up()
+
+        mock_get.side_effect = ConnectionError("keycloak caído")
+        assert store.warm_up() is False
+        assert store.get_key('kid-1') is not None
+        assert store.stats()['fetch_errors'] == 1
@@ -0,0 +1,56 @@
+from unittest.mock import Mock, patch
+from clients.base_client import BaseClient
+from clients.latency_tracker import LatencyTracker
+
+
+class TestLatencyTracker:
+
+    def test_default_timeout_until_enough_samples(self):
+        """Test que sin muestras suficientes se usa el timeout fijo del cliente"""
+        tracker = LatencyTracker(min_samples=10, connect_timeout=1.0)
+        for _ in range(5):
+            tracker.record('product.get', 0.05)
+
+        assert tracker.timeouts_for('product.get', 5) == (1.0, 5)
+
+    def test_timeout_follows_percentile_with_floor_and_ceiling(self):
+        """Test que el timeout de lectura es percentil * multiplicador acotado"""
+        tracker = LatencyTracker(percentile=99, multiplier=2.0, min_samples=10, floor=0.5, connect_timeout=1.0)
+        for _ in range(99):
+            tracker.record('product.get', 0.4)
+        tracker.record('product.get', 1.2)
+
+        connect_timeout, read_timeout = tracker.timeouts_for('product.get', 5)
+        assert read_timeout == 0.8
+        assert connect_timeout == 0.8
+
+        for _ in range(100):
+            tracker.record('slow.get', 4.0)
+        assert tracker.timeouts_for('slow.get', 5)[1] == 5
+
+        for _ in range(100):
+            tracker.record('fast.get', 0.01)
+        assert tracker.timeouts_for('fast.get', 5)[1] == 0.5
+
+    @patch('clients.base_client.requests.Session.request')
+    @patch('auth.token_manager.KeycloakService')
+    def test_client_sends_adaptive_timeout(self, mock_keycloak_class, mock_request):
+        """Test que el cliente envía el timeout calculado para el endpoint"""
+        mock_app = Mock()
+        mock_app.config = {'ADAPTIVE_TIMEOUT_MIN_SAMPLES': 3, 'ADAPTIVE_TIMEOUT_FLOOR_SECONDS': 0.25}
+        mock_keycloak = Mock()
+        mock_keycloak.get_token_data.return_value = {'access_token': "mock-jwt-token", 'expires_in': 300}
+        mock_keycloak_class.return_value = mock_keycloak
+        mock_request.return_value = Mock(status_code=200)
+
+        client = BaseClient(mock_app, "TEST-SERVICE")
+        client._make_request('POST', 'http://test-service/api/test', endpoint='test.create')
+        assert mock_request.call_args[1]['timeout'] == (1.0, 10)
+
+        for _ in range(3):
+            client._make_request('POST', 'http://test-service/api/test', endpoint='test.create')
+        assert mock_request.call_args[1]['timeout'] == (0.25, 0.25)
+
+        diagnostics = client.get_diagnostics()['timeouts']['endpoints']['test.create']
+        assert diagnostics['calls'] == 4
+        assert diagnostics['read_timeout_s'] == 0.25
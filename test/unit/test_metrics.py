@@ -0,0 +1,110 @@
+import os
+import subprocess
+import sys
+import threading
+from flask import Flask, jsonify
+from sqlalchemy import create_engine, text
+from decorator.logRequestDecorator import log
+from helpers.metrics import MetricsRegistry, get_metrics_registry
+
+
+class TestMetricsRegistry:
+
+    def test_histogram_buckets_are_cumulative(self, tmp_path):
+        """Test que el histograma se exporta con buckets acumulados, suma y cuenta"""
+        registry = MetricsRegistry(str(tmp_path), buckets=(0.1, 1.0))
+        for seconds in (0.05, 0.5, 0.7, 3.0):
+            registry.observe_request('get_order', 'GET', 200, seconds)
+
+        text_format = registry.render()
+        labels = 'endpoint="get_order",method="GET",status="2xx"'
+        assert f'http_requests_total{{{labels}}} 4' in text_format
+        assert f'http_request_duration_seconds_bucket{{{labels},le="0.1"}} 1' in text_format
+        assert f'http_request_duration_seconds_bucket{{{labels},le="1.0"}} 3' in text_format
+        assert f'http_request_duration_seconds_bucket{{{labels},le="+Inf"}} 4' in text_format
+        assert f'http_request_duration_seconds_count{{{labels}}} 4' in text_format
+
+    def test_threads_and_workers_are_aggregated(self, tmp_path):
+        """Test que se suman los shards de cada hilo y los snapshots de otros workers"""
+        worker_a = MetricsRegistry(str(tmp_path))
+        worker_b = MetricsRegistry(str(tmp_path))
+
+        threads = [threading.Thread(target=lambda: [worker_a.inc('http_requests_total', {'endpoint': 'x'}) for _ in range(100)])
+                   for _ in range(4)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        worker_b.inc('http_requests_total', {'endpoint': 'x'}, 10)
+        worker_b.flush()
+
+        assert 'http_requests_total{endpoint="x"} 410' in worker_a.render()
+
+    def test_shards_of_finished_threads_are_folded(self, tmp_path):
+        """Test que con un hilo por petición los shards no crecen y no se pierde lo que contaron"""
+        registry = MetricsRegistry(str(tmp_path))
+        for _ in range(50):
+            thread = threading.Thread(target=lambda: registry.inc('http_requests_total', {'endpoint': 'x'}))
+            thread.start()
+            thread.join()
+
+        assert len(registry._shards) <= 1
+        assert registry.snapshot()['counters'] == [['http_requests_total', [('endpoint', 'x')], 50]]
+        assert registry._shards == []
+
+    def test_snapshots_of_dead_or_stale_workers_are_retired(self, tmp_path):
+        """Test que lo contado por workers terminados o sin actualizar pasa al acumulado y los contadores no bajan"""
+        worker = MetricsRegistry(str(tmp_path), flush_interval=5)
+        worker.inc('http_requests_total', {'endpoint': 'x'})
+
+        dead = MetricsRegistry(str(tmp_path))
+        dead.inc('http_requests_total', {'endpoint': 'x'}, 100)
+        dead.flush()
+        finished = subprocess.run([sys.executable, '-c', 'import os; print(os.getpid())'], capture_output=True, text=True)
+        dead_file = tmp_path / f"metrics-{finished.stdout.strip()}-deadbeef.json"
+        os.replace(dead._worker_file, dead_file)
+
+        stale = MetricsRegistry(str(tmp_path))
+        stale.inc('http_requests_total', {'endpoint': 'x'}, 10)
+        stale.flush()
+        os.utime(stale._worker_file, (0, 0))
+
+        assert 'http_requests_total{endpoint="x"} 111' in worker.render()
+        assert not dead_file.exists()
+        assert not os.path.exists(stale._worker_file)
+        assert 'http_requests_total{endpoint="x"} 111' in worker.render()
+
+        # Al cerrar, el worker suma lo suyo al acumulado antes de borrar su fichero
+        worker.close()
+        assert [path.name for path in tmp_path.iterdir()] == ['metrics-retired.db']
+        assert 'http_requests_total{endpoint="x"} 111' in MetricsRegistry(str(tmp_path)).render()
+
+    def test_db_queries_are_timed(self):
+        """Test que las consultas SQL quedan en el histograma de la base de datos"""
+        engine = create_engine('sqlite:///:memory:')
+        with engine.connect() as conn:
+            conn.execute(text('SELECT 1'))
+
+        assert 'db_query_duration_seconds_count{operation="SELECT"}' in get_metrics_registry().render()
+
+
+class TestLogMetrics:
+
+    def test_logged_requests_feed_the_histograms(self, tmp_path):
+        """Test que @log registra la latencia de cada petición por endpoint y clase de estado"""
+        app = Flask(__name__)
+
+        @app.route('/orders/<order_id>')
+        @log(str(tmp_path / 'peticiones.log'))
+        def get_order(order_id):
+            if order_id == 'missing':
+                return jsonify({'error': 'Not Found'}), 404
+            return jsonify({'id': order_id})
+
+        client = app.test_client()
+        client.get('/orders/1')
+        client.get('/orders/missing')
+
+        text_format = get_metrics_registry().render()
+        assert 'http_requests_total{endpoint="get_order",method="GET",status="2xx"} 1' in text_format
+        assert 'http_requests_total{endpoint="get_order",method="GET",status="4xx"} 1' in text_format
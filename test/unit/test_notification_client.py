@@ -0,0 +1,26 @@
+from unittest.mock import Mock, patch
+from clients.notification_client import NotificationClient
+
+
+class TestNotificationClientBatch:
+
+    @patch('clients.base_client.requests.Session.request')
+    @patch('auth.token_manager.KeycloakService')
+    def test_falls_back_to_single_posts_without_batch_endpoint(self, mock_keycloak_class, mock_request):
+        """Test que si el microservicio no tiene endpoint de lotes se envían una a una"""
+        mock_app = Mock()
+        mock_app.config = {'NOTIFICATION_SERVICE_URL': 'http://notifications-service:8085'}
+        mock_keycloak = Mock()
+        mock_keycloak.get_token_data.return_value = {'access_token': "mock-jwt-token", 'expires_in': 300}
+        mock_keycloak_class.return_value = mock_keycloak
+        mock_request.side_effect = lambda method, url, **kwargs: Mock(
+            status_code=404 if url.endswith('/batch') else 201, json=Mock(return_value={}))
+
+        client = NotificationClient(mock_app)
+        assert client.realizar_notificaciones([{'id': 1}, {'id': 2}]) is True
+        assert client.batch_supported is False
+        assert [call.kwargs['url'] for call in mock_request.call_args_list] == [
+            'http://notifications-service:8085/batch',
+            'http://notifications-service:8085/',
+            'http://notifications-service:8085/'
+        ]
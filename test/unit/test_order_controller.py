@@ -3,8 +3,10 @@ from unittest.mock import patch, Mock
 
 class TestOrderController:
 
+    @patch('decorator.logRequestDecorator.get_log_writer')
+    @patch('decorator.tokenDecorator.verify_jwt', return_value={'roles': ['artist'], 'preferred_username': 'test_user'})
     @patch('controllers.order_controller.order_service.OrderService')
-    def test_get_order_success(self, mock_order_service, client):
+    def test_get_order_success(self, mock_order_service, mock_verify_jwt, mock_log_writer, client):
         # Mockear order_to_dict para que retorne un dict válido
         mock_order_service.order_to_dict.return_value = {
             "publicId": "order1",
@@ -22,7 +24,7 @@ class TestOrderController:
         mock_order = Mock()
         mock_order_service.find_order.return_value = mock_order
 
-        response = client.get('/orders/order1')
+        response = client.get('/orders/order1', headers={'Authorization': 'Bearer token'})
 
         assert response.status_code == 200
         mock_order_service.find_order.assert_called_once_with("order1")
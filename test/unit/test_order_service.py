@@ -2,7 +2,7 @@ import pytest
 from unittest.mock import Mock, patch
 from service.order_service import OrderService, ProductNotFoundException
 from dto.order_dto import CreateOrderRequestDTO, CreateOrderItemRequestDTO
-from models.order_model_ import OrderItem, OrderStatus
+from model.order_model_ import OrderItem, OrderStatus
 
 """ USO DE PATCH"""
 #  Simulan componentes en funcionamiento pero en realidad no lo están
@@ -15,7 +15,7 @@ from models.order_model_ import OrderItem, OrderStatus
 # Qué hace: Evita llamadas HTTP reales al servicio de usuarios
 # Qué simula: La respuesta del microservicio de usuarios
 """@patch('service.order_service.content_client')"""
-# Por qué: OrderService.save() llama a content_client.get_product_by_id()
+# Por qué: OrderService.save() llama a content_client.get_products_by_ids()
 # Qué hace: Evita llamadas HTTP reales al servicio de contenido
 # Qué simula: La respuesta del microservicio de contenido
 
@@ -33,7 +33,7 @@ class TestOrderService:
             "artisticName": "Test User",
         }
         
-        mock_content_client.get_product_by_id.return_value = {
+        mock_content_client.get_products_by_ids.return_value = {"prod_123": {"success": True, "data": {
             "price": 15.99,
             "product_name": "Álbum de Música",
             "product_image_src": "album.jpg",
@@ -43,7 +43,7 @@ class TestOrderService:
                 "artisticName": "Artista Famoso",
                 "pfp": "artist.jpg"
             }
-        }
+        }}}
         
         # Mock del OrderDAO.add_order para devolver una orden simulada
         mock_order = Mock()
@@ -62,27 +62,12 @@ class TestOrderService:
         result = OrderService.save(order_dto, "test_user")
         
         # Verificar
-        mock_user_client.get_seller_by_username.assert_called_once_with("test_user")
-        mock_content_client.get_product_by_id.assert_called_once_with("prod_123")
+        mock_content_client.get_products_by_ids.assert_called_once_with(["prod_123"])
         mock_order_dao.add_order.assert_called_once()
+        [item] = mock_order_dao.add_order.call_args.args[0].items
+        assert item.seller_username == "artista_famoso" # El vendedor sale del propio producto
         assert result.total == 31.98
 
-    @patch('service.order_service.OrderDAO')
-    @patch('service.order_service.user_client')
-    @patch('service.order_service.content_client')
-    def test_create_order_user_not_found(self, mock_content_client, mock_user_client, mock_order_dao):
-        """Test cuando usuario no existe"""
-        mock_user_client.get_seller_by_username.return_value = None
-        
-        order_items = [CreateOrderItemRequestDTO(productId="prod_123", quantity=1)]
-        order_dto = CreateOrderRequestDTO(items=order_items)
-        
-        with pytest.raises(ValueError, match="usuario test_user no encontrado"):
-            OrderService.save(order_dto, "test_user")
-        
-        # Verificar que NO se llamó al DAO
-        mock_order_dao.add_order.assert_not_called()
-
     @patch('service.order_service.OrderDAO')
     @patch('service.order_service.user_client')
     @patch('service.order_service.content_client')
@@ -91,7 +76,9 @@ class TestOrderService:
         mock_user_client.get_seller_by_username.return_value = {
             "username": "test_user", "name": "Test User"
         }
-        mock_content_client.get_product_by_id.return_value = None
+        mock_content_client.get_products_by_ids.return_value = {
+            "prod_inexistente": {"success": False, "error": "Producto no encontrado", "status_code": 404}
+        }
         
         order_items = [CreateOrderItemRequestDTO(productId="prod_inexistente", quantity=1)]
         order_dto = CreateOrderRequestDTO(items=order_items)
@@ -104,10 +91,11 @@ class TestOrderService:
 
     @patch('service.order_service.OrderDAO')
     @patch('service.order_service.content_client')
-    def test_check_stock_availability_success(self, mock_content_client, mock_order_dao):
+    def test_check_stock_availability_success(self, mock_content_client, mock_order_dao, app):
         """Test verificación stock exitosa"""    
 
-        mock_item = Mock(spec=OrderItem)
+        with app.app_context(): # spec de un modelo SQLAlchemy necesita contexto
+            mock_item = Mock(spec=OrderItem)
         mock_item.product_public_id = "prod-123"
         mock_item.quantity = 2
         mock_order = Mock()
@@ -127,10 +115,11 @@ class TestOrderService:
 
     @patch('service.order_service.OrderDAO')
     @patch('service.order_service.content_client')
-    def test_check_stock_availability_inssuficient(self, mock_content_client, mock_order_dao):
+    def test_check_stock_availability_inssuficient(self, mock_content_client, mock_order_dao, app):
         """Test verificación insuficiencia de stock"""
 
-        mock_item = Mock(spec=OrderItem)
+        with app.app_context(): # spec de un modelo SQLAlchemy necesita contexto
+            mock_item = Mock(spec=OrderItem)
         mock_item.product_public_id = "prod-123"
         mock_item.quantity = 101
         mock_order = Mock()
@@ -147,26 +136,39 @@ class TestOrderService:
         assert result['all_available'] is False
         assert len(result['details']) == 1
         
+    @patch('service.order_service.OrderPaymentDAO')
     @patch('service.order_service.OrderDAO')
+    @patch('service.order_service.user_client')
     @patch('service.order_service.payment_client')
-    def test_process_order_payment_success(self, mock_payment_client, mock_order_dao):
-        """Test procesamiento de pagos exitoso"""
+    def test_process_order_payment_success(self, mock_payment_client, mock_user_client, mock_order_dao, mock_payment_dao):
+        """Test procesamiento de pagos exitoso: un pago por vendedor con clave de idempotencia"""
         
-        # 1. Mock de la orden
+        # 1. Mock de la orden con productos de dos vendedores
+        items = []
+        for seller, product, total in [('artista-1', 'Disco A', 20.0), ('artista-2', 'Disco B', 10.0), ('artista-1', 'Disco C', 20.0)]:
+            item = Mock()
+            item.seller_username = seller
+            item.seller_name = seller.title()
+            item.product_name = product
+            item.total = total
+            items.append(item)
         mock_order = Mock()
         mock_order.public_id = "order-123"    
-        mock_order.total = 50.0
+        mock_order.items = items
         mock_order.status = OrderStatus.PENDING
+        mock_order.made_by_username = "antonio"
+        mock_order.total = 50.0
 
-        # 2. Configurar DAO
+        # 2. Configurar DAO y usuarios
         mock_order_dao.find_by_public_id.return_value = mock_order
         mock_order_dao.mark_order_as_paid.return_value = mock_order
+        mock_payment_dao.find_completed.return_value = {}
+        mock_user_client.get_seller_by_username.side_effect = lambda username: {'id': f'id-{username}'}
 
-        # 3. Configurar payment_client - SI ES UNA INSTANCIA
-        # El mock ya representa la instancia, solo configura el método
-        mock_payment_client.procesamiento_pagos.return_value = {
+        # 3. Configurar payment_client
+        mock_payment_client.procesamiento_pagos.side_effect = lambda dto, idempotency_key: {
             'success': True,
-            'payment_id': 'payment_123',
+            'payment_id': f"payment-{dto['artistId']}",
             'status': 'COMPLETED'
         }
 
@@ -183,5 +185,102 @@ class TestOrderService:
         
         # 5. Aserciones
         assert result['success'] is True
-        assert result['payment_id'] == 'payment_123'
-        mock_payment_client.procesamiento_pagos.assert_called_once_with(order_data)
\ No newline at end of file
+        assert result['payment_id'] == 'payment-id-artista-1'
+        assert [payment['payment_id'] for payment in result['payments']] == ['payment-id-artista-1', 'payment-id-artista-2']
+        assert mock_payment_client.procesamiento_pagos.call_count == 2
+        calls = {call.kwargs['idempotency_key']: call.args[0] for call in mock_payment_client.procesamiento_pagos.call_args_list}
+        assert set(calls) == {'order-123:artista-1', 'order-123:artista-2'}
+        assert calls['order-123:artista-1']['amount'] == 40.0
+        # La notificación del pago se guarda en el outbox en la misma transacción
+        mock_order_dao.mark_order_as_paid.assert_called_once()
+        assert mock_order_dao.mark_order_as_paid.call_args.args == ("order-123",)
+        [event] = mock_order_dao.mark_order_as_paid.call_args.kwargs['outbox_events']
+        assert event['event_type'] == 'order.paid'
+        assert event['idempotency_key'] == 'order-123:order.paid'
+        assert event['payload']['sellers'] == ['artista-1', 'artista-2']
+
+    @patch('service.order_service.OrderPaymentDAO')
+    @patch('service.order_service.OrderDAO')
+    @patch('service.order_service.user_client')
+    @patch('service.order_service.payment_client')
+    def test_process_order_payment_partial_failure_retries_only_missing(self, mock_payment_client, mock_user_client,
+                                                                         mock_order_dao, mock_payment_dao):
+        """Test pago parcial: si falla un vendedor se guarda el resultado y el reintento solo paga al que falta"""
+        items = []
+        for seller in ('artista-1', 'artista-2'):
+            item = Mock()
+            item.seller_username = seller
+            item.seller_name = seller.title()
+            item.product_name = 'Disco'
+            item.total = 10.0
+            items.append(item)
+        mock_order = Mock()
+        mock_order.public_id = "order-123"
+        mock_order.items = items
+        mock_order.made_by_username = "antonio"
+        mock_order.total = 20.0
+        mock_order_dao.find_by_public_id.return_value = mock_order
+        mock_order_dao.mark_order_as_paid.return_value = mock_order
+        mock_user_client.get_seller_by_username.side_effect = lambda username: {'id': f'id-{username}'}
+
+        # Resultados guardados (lo que haría OrderPaymentDAO en la base de datos)
+        recorded = {}
+        mock_payment_dao.record.side_effect = lambda order_id, outcomes: recorded.update(
+            {outcome['seller']: outcome for outcome in outcomes})
+        mock_payment_dao.find_completed.side_effect = lambda order_id: {
+            seller: Mock(payment_id=outcome['payment_id'], status=outcome['status'])
+            for seller, outcome in recorded.items() if outcome['success'] and outcome['status'] == 'COMPLETED'}
+
+        artista_2_down = True
+        def pay(dto, idempotency_key):
+            if dto['artistId'] == 'id-artista-2' and artista_2_down:
+                return {'success': False, 'error': 'Fondos insuficientes', 'status': 'FAILED'}
+            return {'success': True, 'payment_id': f"payment-{dto['artistId']}", 'status': 'COMPLETED'}
+        mock_payment_client.procesamiento_pagos.side_effect = pay
+
+        # 1. Primer intento: artista-1 cobra, artista-2 falla
+        result = OrderService.process_order_payment("order-123", {'payment_method': 'PLATFORM_BALANCE'})
+        assert result['success'] is False
+        assert result['pending_sellers'] == ['artista-2']
+        assert recorded['artista-1']['idempotency_key'] == 'order-123:artista-1'
+        mock_order_dao.mark_order_as_paid.assert_not_called()
+
+        # 2. Reintento: solo se paga a artista-2, con la misma clave de idempotencia
+        artista_2_down = False
+        mock_payment_client.procesamiento_pagos.reset_mock()
+        result = OrderService.process_order_payment("order-123", {'payment_method': 'PLATFORM_BALANCE'})
+
+        assert result['success'] is True
+        [call] = mock_payment_client.procesamiento_pagos.call_args_list
+        assert call.kwargs['idempotency_key'] == 'order-123:artista-2'
+        assert result['payment_id'] == 'payment-id-artista-1'
+        assert [payment.get('already_paid', False) for payment in result['payments']] == [True, False]
+        mock_order_dao.mark_order_as_paid.assert_called_once()
+
+    @patch('service.order_service.OrderDAO')
+    @patch('service.order_service.content_client')
+    def test_check_stock_availability_concurrent_keeps_item_order(self, mock_content_client, mock_order_dao):
+        """Test verificación concurrente: detalles en el orden de los items de la compra"""
+        stock_by_product = {'prod-1': 10, 'prod-2': 0, 'prod-3': 10}
+
+        items = []
+        for product_id in stock_by_product:
+            item = Mock()
+            item.product_public_id = product_id
+            item.quantity = 1
+            items.append(item)
+        mock_order = Mock()
+        mock_order.items = items
+        mock_order_dao.find_by_public_id.return_value = mock_order
+
+        mock_content_client.get_product_stock_by_id.side_effect = lambda product_id: {
+            'success': True,
+            'stock_product': stock_by_product[product_id]
+        }
+
+        result = OrderService.check_stock_availability("order-123")
+
+        assert result['all_available'] is False
+        assert [detail['product_id'] for detail in result['details']] == ['prod-1', 'prod-2', 'prod-3']
+        assert result['details'][1]['available'] is False
+        assert result['details'][1]['required'] == 1
@@ -0,0 +1,125 @@
+import pytest
+import threading
+import time
+from datetime import datetime, timedelta
+from unittest.mock import Mock
+from flask import Flask
+from db import db
+from dao.order_dao import OrderDAO
+from dao.outbox_dao import OutboxDAO
+from model.order_model_ import Order, OrderItem, OrderStatus
+from model.outbox_model import OutboxMessage, OutboxStatus
+from service.outbox_worker import OutboxWorker, parse_destination_limits
+
+
+@pytest.fixture
+def db_app():
+    """Aplicación con base de datos SQLite en memoria"""
+    app = Flask(__name__)
+    app.config['SQLALCHEMY_DATABASE_URI'] = 'sqlite:///:memory:'
+    db.init_app(app)
+    with app.app_context():
+        db.create_all()
+    yield app
+    with app.app_context():
+        db.drop_all()
+
+
+def _order(public_id='order-1'):
+    item = OrderItem(product_public_id='prod-1', product_name='Disco', seller_username='artista',
+                     seller_name='Artista', price=10, quantity=1, total=10)
+    return Order(public_id=public_id, made_by_username='antonio', status=OrderStatus.PENDING,
+                 total=10.0, items=[item])
+
+
+def _event(event_type='order.created'):
+    return {'destination': 'notification', 'event_type': event_type,
+            'payload': {'type': event_type}, 'idempotency_key': f'order-1:{event_type}'}
+
+
+class TestOutbox:
+
+    def test_outbox_event_is_written_with_the_order(self, db_app):
+        """Test que el mensaje del outbox se guarda en la misma transacción que la compra"""
+        with db_app.app_context():
+            OrderDAO.add_order(_order(), 'antonio', outbox_events=[_event()])
+            OrderDAO.mark_order_as_paid('order-1', outbox_events=[_event('order.paid')])
+
+            messages = OutboxMessage.query.order_by(OutboxMessage.id).all()
+            assert [message.event_type for message in messages] == ['order.created', 'order.paid']
+            assert all(message.aggregate_id == 'order-1' for message in messages)
+
+    def test_failed_order_write_discards_outbox_event(self, db_app):
+        """Test que si la compra no se guarda tampoco queda el mensaje"""
+        with db_app.app_context():
+            OrderDAO.add_order(_order(), 'antonio')
+            with pytest.raises(Exception):
+                OrderDAO.add_order(_order(), 'antonio', outbox_events=[_event()]) # public_id duplicado
+            assert OutboxMessage.query.count() == 0
+
+    def test_worker_delivers_batches_and_retries_failures(self, db_app):
+        """Test que el worker entrega por lotes y reprograma con backoff los lotes fallidos"""
+        with db_app.app_context():
+            for i in range(3):
+                OutboxDAO.add('notification', 'order.created', f'order-{i}', {'n': i}, f'order-{i}:created')
+            db.session.commit()
+
+        handler = Mock(side_effect=[False, True])
+        worker = OutboxWorker(db_app, {'notification': handler}, batch_size=2, retry_backoff=30)
+
+        assert worker.run_once() is True # Lote de 2 rechazado
+        assert worker.run_once() is True # Lote con el tercero
+        with db_app.app_context():
+            assert OutboxDAO.pending_stats()['pending']['notification']['messages'] == 2
+            OutboxMessage.query.update({'available_at': datetime.now() - timedelta(seconds=1)})
+            db.session.commit()
+
+        handler.side_effect = None
+        handler.return_value = True
+        assert worker.run_once() is True
+        assert worker.run_once() is False
+
+        stats = worker.stats()
+        assert stats['delivered'] == {'notification': 3}
+        assert stats['failed_deliveries'] == {'notification': 2}
+        assert stats['pending'] == {}
+        with db_app.app_context():
+            assert {message.status for message in OutboxMessage.query.all()} == {OutboxStatus.SENT}
+
+    def test_stop_drains_batches_in_flight(self, db_app):
+        """Test que al apagar el worker el lote que se está entregando termina y queda como enviado"""
+        with db_app.app_context():
+            OutboxDAO.add('notification', 'order.created', 'order-1', {'n': 1}, 'order-1:created')
+            db.session.commit()
+
+        delivering = threading.Event()
+        def slow_handler(batch):
+            delivering.set()
+            time.sleep(0.2)
+            return True
+
+        worker = OutboxWorker(db_app, {'notification': slow_handler}, poll_interval=0.05)
+        worker.start()
+        assert delivering.wait(2)
+        worker.stop()
+
+        assert worker.stats()['delivered'] == {'notification': 1}
+        with db_app.app_context():
+            assert OutboxMessage.query.one().status == OutboxStatus.SENT
+
+    def test_expired_lease_is_claimed_again(self, db_app):
+        """Test que un lote reservado por un worker caído se vuelve a entregar al vencer el lease"""
+        with db_app.app_context():
+            OutboxDAO.add('notification', 'order.paid', 'order-1', {'n': 1})
+            db.session.commit()
+            assert len(OutboxDAO.claim_batch('notification', 'caido', 10, lease_seconds=60)) == 1
+            assert OutboxDAO.claim_batch('notification', 'otro', 10, lease_seconds=60) == []
+
+            OutboxMessage.query.update({'locked_until': datetime.now() - timedelta(seconds=1)})
+            db.session.commit()
+            [message] = OutboxDAO.claim_batch('notification', 'otro', 10, lease_seconds=60)
+            assert message['attempts'] == 2
+
+    def test_parse_destination_limits(self):
+        assert parse_destination_limits('notification=2, payment=4') == {'notification': 2, 'payment': 4}
+        assert parse_destination_limits('') == {}
@@ -0,0 +1,72 @@
+from clients.product_cache import ProductCache
+
+
+class FakeClock:
+    def __init__(self):
+        self.now = 1000.0
+
+    def __call__(self):
+        return self.now
+
+
+class TestProductCache:
+
+    def _cache(self, clock, **kwargs):
+        options = {'max_entries': 10, 'static_ttl': 600, 'price_ttl': 30, 'stock_ttl': 0, 'negative_ttl': 20}
+        options.update(kwargs)
+        return ProductCache(clock=clock, **options)
+
+    def test_price_expires_before_static_fields(self):
+        """Test TTL por campo: el precio caduca antes que los datos descriptivos"""
+        clock = FakeClock()
+        cache = self._cache(clock)
+        cache.put('prod-1', {'name': 'Disco', 'price': 10, 'stock': 3})
+
+        assert cache.lookup('prod-1', fields=('price',)) == (True, {'name': 'Disco', 'price': 10, 'stock': 3})
+
+        clock.now += 31
+        assert cache.lookup('prod-1', fields=('price',)) == (False, None)
+        assert cache.lookup('prod-1')[0] is True # Solo datos estáticos
+
+    def test_stock_bypassed_by_default(self):
+        """Test que con TTL 0 el stock nunca se sirve de caché"""
+        cache = self._cache(FakeClock())
+        cache.put('prod-1', {'name': 'Disco', 'stock': 3})
+
+        assert cache.lookup('prod-1', fields=('stock',)) == (False, None)
+
+    def test_negative_caching(self):
+        """Test que los 404 se cachean con su propio TTL"""
+        clock = FakeClock()
+        cache = self._cache(clock)
+        cache.put_not_found('missing')
+
+        assert cache.lookup('missing') == (True, None)
+        clock.now += 21
+        assert cache.lookup('missing') == (False, None)
+        assert cache.stats()['negative_hits'] == 1
+
+    def test_lru_eviction(self):
+        """Test que al llenarse se expulsa el producto menos usado"""
+        cache = self._cache(FakeClock(), max_entries=2)
+        cache.put('a', {'name': 'A'})
+        cache.put('b', {'name': 'B'})
+        cache.lookup('a')
+        cache.put('c', {'name': 'C'})
+
+        assert cache.lookup('b') == (False, None)
+        assert cache.lookup('a')[0] is True
+        assert cache.stats()['evictions'] == 1
+
+    def test_invalidation_hooks(self):
+        """Test de invalidación completa y por campos"""
+        cache = self._cache(FakeClock(), stock_ttl=60)
+        cache.put('a', {'name': 'A', 'stock': 5})
+        cache.put('b', {'name': 'B'})
+
+        cache.invalidate_fields('a', ['stock'])
+        assert cache.lookup('a', fields=('stock',)) == (False, None)
+        assert cache.lookup('a')[0] is True
+
+        cache.invalidate('b')
+        assert cache.lookup('b') == (False, None)
@@ -0,0 +1,60 @@
+import time
+from unittest.mock import Mock, patch
+from flask import Flask, jsonify
+from controllers.order_controller import order_bp
+from helpers.fanout import fan_out
+from helpers.request_timing import RequestTiming, bind_timing, current_timing, start_request_timing, end_request_timing, timed
+
+
+class TestRequestTiming:
+
+    def test_header_sums_phases_recorded_from_fan_out_threads(self):
+        """Test que los tiempos registrados en los hilos del fan-out llegan a la petición"""
+        timing = start_request_timing()
+        try:
+            def call(_):
+                with timed('content-service'):
+                    time.sleep(0.01)
+            fan_out(call, range(3), max_concurrency=3)
+        finally:
+            end_request_timing()
+
+        breakdown = timing.breakdown()
+        assert breakdown['content-service']['count'] == 3
+        assert breakdown['content-service']['ms'] >= 30
+        assert 'content-service;dur=' in timing.header()
+        assert 'desc="3 llamadas"' in timing.header()
+        assert current_timing() is None
+
+    def test_nothing_is_recorded_outside_a_request(self):
+        """Test que fuera de una petición registrar tiempos no hace nada"""
+        with timed('db'):
+            pass
+        assert current_timing() is None
+
+
+class TestServerTimingHeader:
+
+    @patch('decorator.logRequestDecorator.get_log_writer')
+    @patch('controllers.order_controller.order_service.OrderService')
+    @patch('decorator.tokenDecorator.verify_jwt')
+    def test_order_endpoints_return_server_timing(self, mock_verify, mock_service, mock_log_writer):
+        """Test que las respuestas de los endpoints de compras llevan la cabecera Server-Timing"""
+        mock_verify.return_value = {'username': 'ana', 'roles': ['artist']}
+        mock_service.find_order.return_value = None
+
+        app = Flask(__name__)
+        app.register_blueprint(order_bp)
+        from helpers.ApiExceptions import APIException
+
+        @app.errorhandler(APIException)
+        def handle(e):
+            return jsonify({'message': e.message}), e.status
+
+        response = app.test_client().get('/orders/no-existe', headers={'Authorization': 'Bearer token'})
+
+        assert response.status_code == 404
+        assert 'auth;dur=' in response.headers['Server-Timing']
+        assert 'total;dur=' in response.headers['Server-Timing']
+        # El mismo desglose queda en el registro de @log
+        assert 'auth' in mock_log_writer.return_value.write.call_args.args[0]['timings']
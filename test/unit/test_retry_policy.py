@@ -0,0 +1,84 @@
+from unittest.mock import Mock, patch
+from clients.base_client import BaseClient
+from clients.retry_policy import RetryPolicy, RetryBudget
+
+
+def _response(status_code, headers=None):
+    response = Mock()
+    response.status_code = status_code
+    response.headers = headers or {}
+    return response
+
+
+class TestRetryPolicy:
+
+    def test_backoff_is_bounded(self):
+        """Test que el backoff con jitter nunca supera el máximo"""
+        policy = RetryPolicy(base_delay=0.1, max_delay=0.5)
+        for attempt in range(1, 10):
+            assert 0 <= policy.backoff(attempt) <= 0.5
+
+    def test_retry_after_seconds(self):
+        """Test lectura de Retry-After en segundos"""
+        assert RetryPolicy.retry_after(_response(503, {'Retry-After': '2'})) == 2.0
+        assert RetryPolicy.retry_after(_response(503)) is None
+
+    def test_budget_limits_retry_ratio(self):
+        """Test que el presupuesto impide reintentar por encima del ratio"""
+        budget = RetryBudget(ratio=0.5, window_seconds=60, min_retries=0)
+        for _ in range(4):
+            budget.record_request()
+
+        assert budget.try_acquire_retry() is True
+        assert budget.try_acquire_retry() is True
+        assert budget.try_acquire_retry() is False
+        assert budget.stats()['rejected_retries'] == 1
+
+
+class TestBaseClientRetries:
+
+    def _client(self, config=None):
+        mock_app = Mock()
+        mock_app.config = config or {}
+        return BaseClient(mock_app, "TEST-SERVICE")
+
+    @patch('clients.base_client.time.sleep')
+    @patch('clients.base_client.requests.Session.request')
+    @patch('auth.token_manager.KeycloakService')
+    def test_get_retried_on_503(self, mock_keycloak_class, mock_request, mock_sleep):
+        """Test que un GET se reintenta tras un 503 transitorio"""
+        mock_request.side_effect = [_response(503), _response(200)]
+
+        response = self._client()._make_request('GET', 'http://test-service/api/test')
+
+        assert response.status_code == 200
+        assert mock_request.call_count == 2
+        mock_sleep.assert_called_once()
+
+    @patch('clients.base_client.time.sleep')
+    @patch('clients.base_client.requests.Session.request')
+    @patch('auth.token_manager.KeycloakService')
+    def test_post_without_idempotency_key_not_retried(self, mock_keycloak_class, mock_request, mock_sleep):
+        """Test que un POST sin clave de idempotencia no se reintenta"""
+        mock_request.return_value = _response(503)
+
+        response = self._client()._make_request('POST', 'http://test-service/api/payments', json={})
+
+        assert response.status_code == 503
+        assert mock_request.call_count == 1
+        mock_sleep.assert_not_called()
+
+    @patch('clients.base_client.time.sleep')
+    @patch('clients.base_client.requests.Session.request')
+    @patch('auth.token_manager.KeycloakService')
+    def test_post_with_idempotency_key_honors_retry_after(self, mock_keycloak_class, mock_request, mock_sleep):
+        """Test que un POST con clave se reintenta esperando lo indicado en Retry-After"""
+        mock_request.side_effect = [_response(429, {'Retry-After': '1'}), _response(200)]
+
+        response = self._client()._make_request(
+            'POST', 'http://test-service/api/payments', idempotency_key='order-1:seller', json={}
+        )
+
+        assert response.status_code == 200
+        mock_sleep.assert_called_once_with(1.0)
+        assert mock_request.call_args[1]['headers']['Idempotency-Key'] == 'order-1:seller'
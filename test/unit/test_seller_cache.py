@@ -0,0 +1,71 @@
+from unittest.mock import Mock, patch
+from clients.seller_cache import SellerCache, SELLER_FOUND, SELLER_NOT_FOUND, SELLER_ERROR
+from clients.user_client import UserClient
+
+
+class TestSellerCache:
+
+    def test_fresh_entry_is_served_from_cache(self):
+        """Test que dentro del TTL no se vuelve a consultar el vendedor"""
+        loader = Mock(return_value=(SELLER_FOUND, {'id': 7, 'username': 'artista'}))
+        cache = SellerCache(ttl=60)
+
+        assert cache.get('artista', loader)['id'] == 7
+        assert cache.get('artista', loader)['id'] == 7
+        assert loader.call_count == 1
+        assert cache.stats()['hits'] == 1
+
+    def test_stale_entry_is_served_while_refreshing(self):
+        """Test que una entrada caducada se devuelve al momento y se refresca en segundo plano"""
+        now = [0.0]
+        loader = Mock(side_effect=[(SELLER_FOUND, {'id': 7}), (SELLER_FOUND, {'id': 8})])
+        cache = SellerCache(ttl=60, stale_ttl=600, clock=lambda: now[0])
+        cache.get('artista', loader)
+
+        now[0] += 61
+        with patch('clients.seller_cache.get_executor') as mock_executor:
+            mock_executor.return_value.submit.side_effect = lambda fn: fn()
+            assert cache.get('artista', loader)['id'] == 7
+
+        assert cache.get('artista', loader)['id'] == 8
+        assert cache.stats()['stale_hits'] == 1
+
+    def test_not_found_is_cached_but_errors_are_not(self):
+        """Test que los 404 se cachean negative_ttl y los fallos transitorios no se cachean"""
+        cache = SellerCache(negative_ttl=60)
+        not_found = Mock(return_value=(SELLER_NOT_FOUND, None))
+        assert cache.get('nadie', not_found) is None
+        assert cache.get('nadie', not_found) is None
+        assert not_found.call_count == 1
+
+        failing = Mock(return_value=(SELLER_ERROR, None))
+        assert cache.get('artista', failing) is None
+        assert cache.get('artista', failing) is None
+        assert failing.call_count == 2
+
+
+class TestPrefetchSellers:
+
+    @patch('clients.base_client.requests.Session.request')
+    @patch('auth.token_manager.KeycloakService')
+    def test_prefetch_only_fetches_unknown_sellers(self, mock_keycloak_class, mock_request):
+        """Test que se consultan una sola vez los vendedores distintos que no están en caché"""
+        mock_app = Mock()
+        mock_app.config = {'USERS_SERVICE_URL': 'http://users-service:5001'}
+        mock_keycloak = Mock()
+        mock_keycloak.get_token_data.return_value = {'access_token': "mock-jwt-token", 'expires_in': 300}
+        mock_keycloak_class.return_value = mock_keycloak
+
+        def response_for(method, url, **kwargs):
+            username = url.rsplit('/', 1)[-1]
+            return Mock(status_code=200, json=Mock(return_value={'id': len(username), 'username': username}))
+        mock_request.side_effect = response_for
+
+        client = UserClient(mock_app)
+        client.get_seller_by_username('ana')
+        sellers = client.prefetch_sellers(['ana', 'bruno', 'bruno', 'carla'])
+
+        assert sellers == {'ana': {'id': 3, 'username': 'ana'},
+                           'bruno': {'id': 5, 'username': 'bruno'},
+                           'carla': {'id': 5, 'username': 'carla'}}
+        assert mock_request.call_count == 3
@@ -0,0 +1,89 @@
+import json
+import pytest
+from unittest.mock import Mock, patch
+from clients.base_client import BaseClient
+from clients.service_registry import ServiceRegistry, get_service_registry, FileRegistrySource, STRATEGY_LEAST_OUTSTANDING
+
+
+def _registry_file(tmp_path, registry):
+    path = tmp_path / 'registry.json'
+    path.write_text(json.dumps(registry))
+    return str(path)
+
+
+class TestServiceRegistry:
+
+    def test_least_outstanding_spreads_requests(self, tmp_path):
+        """Test que se elige la instancia con menos peticiones en curso"""
+        path = _registry_file(tmp_path, {'CONTENT-SERVICE': ['http://content-1:8080', 'http://content-2:8080']})
+        registry = ServiceRegistry(FileRegistrySource(path), refresh_interval=0, strategy=STRATEGY_LEAST_OUTSTANDING)
+        registry.watch('content-service')
+
+        first = registry.acquire('content-service')
+        second = registry.acquire('content-service')
+        assert {first, second} == {'http://content-1:8080', 'http://content-2:8080'}
+
+        registry.release('content-service', first, success=True)
+        assert registry.acquire('content-service') == first
+
+    def test_failing_instance_is_ejected_temporarily(self, tmp_path):
+        """Test que una instancia que falla seguido deja de recibir peticiones hasta que vence la expulsión"""
+        now = [100.0]
+        path = _registry_file(tmp_path, {'content-service': ['http://content-1:8080', 'http://content-2:8080']})
+        registry = ServiceRegistry(FileRegistrySource(path), refresh_interval=0, eject_after_failures=2,
+                                   eject_seconds=30, clock=lambda: now[0])
+        registry.watch('content-service')
+
+        for _ in range(2):
+            registry.acquire('content-service')
+            registry.release('content-service', 'http://content-1:8080', success=False)
+
+        assert all(registry.acquire('content-service') == 'http://content-2:8080' for _ in range(5))
+        assert registry.snapshot('content-service')['instances']['http://content-1:8080']['ejected'] is True
+
+        now[0] += 31
+        assert registry.snapshot('content-service')['instances']['http://content-1:8080']['ejected'] is False
+
+    def test_failed_refresh_keeps_last_snapshot(self, tmp_path):
+        """Test que si el registro no se puede leer se mantienen las instancias conocidas"""
+        path = tmp_path / 'registry.json'
+        path.write_text(json.dumps({'payment-service': ['http://payment-1:8082']}))
+        registry = ServiceRegistry(FileRegistrySource(str(path)), refresh_interval=0)
+        registry.watch('payment-service')
+
+        path.write_text('{ no es json')
+        registry.refresh()
+
+        assert registry.acquire('payment-service') == 'http://payment-1:8082'
+        assert registry.refresh_errors == 1
+
+    @patch('clients.base_client.requests.Session.request')
+    @patch('auth.token_manager.KeycloakService')
+    def test_client_rewrites_base_url_to_instance(self, mock_keycloak_class, mock_request, tmp_path):
+        """Test que el cliente envía la petición a una instancia del registro"""
+        mock_app = Mock()
+        mock_app.config = {
+            'SERVICE_DISCOVERY_MODE': 'file',
+            'EUREKA_REGISTRY_FILE': _registry_file(tmp_path, {'test-service': ['http://10.0.0.7:8080']}),
+            'SERVICE_REGISTRY_REFRESH_SECONDS': 0
+        }
+        mock_keycloak = Mock()
+        mock_keycloak.get_token_data.return_value = {'access_token': "mock-jwt-token", 'expires_in': 300}
+        mock_keycloak_class.return_value = mock_keycloak
+        mock_request.return_value = Mock(status_code=200)
+
+        client = BaseClient(mock_app, "TEST-SERVICE")
+        client.base_url = 'http://test-service:8080'
+        client._make_request('GET', 'http://test-service:8080/api/products/1')
+
+        assert mock_request.call_args[1]['url'] == 'http://10.0.0.7:8080/api/products/1'
+        assert client.get_diagnostics()['instances']['instances']['http://10.0.0.7:8080']['requests'] == 1
+
+    def test_eureka_mode_without_client_fails_at_startup(self):
+        """Test que en modo eureka sin cliente inicializado se falla al arrancar en vez de usar las URLs fijas"""
+        mock_app = Mock()
+        mock_app.config = {'SERVICE_DISCOVERY_MODE': 'eureka'}
+
+        with patch('config.eureka_client.get_client', return_value=None):
+            with pytest.raises(RuntimeError, match='Eureka'):
+                get_service_registry(mock_app)
@@ -0,0 +1,144 @@
+import requests
+from threading import Lock
+from unittest.mock import Mock, patch
+from clients.content_client import ContentClient
+from service.stock_saga import (StockSaga, StockSagaJournal, StockSagaRecovery, SAGA_COMPENSATED, SAGA_COMPLETED,
+                                SAGA_NEEDS_REPAIR, SAGA_RUNNING, STEP_COMPENSATED, STEP_UNKNOWN)
+
+
+def _content_client(failing=()):
+    calls = []
+    lock = Lock()
+
+    def update(product_id, delta):
+        with lock:
+            calls.append((product_id, delta))
+        if product_id in failing and delta < 0:
+            return {'success': False, 'error': 'Stock insuficiente'}
+        return {'success': True}
+
+    client = Mock()
+    client.update_product_stock_by_id.side_effect = update
+    return client, calls
+
+
+class TestStockSaga:
+
+    def test_all_steps_applied(self, tmp_path):
+        """Test que una saga sin fallos descuenta el stock de cada producto una sola vez"""
+        client, calls = _content_client()
+        journal = StockSagaJournal(str(tmp_path / 'saga.db'))
+        items = [Mock(product_public_id='p1', quantity=2), Mock(product_public_id='p2', quantity=1),
+                 Mock(product_public_id='p1', quantity=1)]
+
+        result = StockSaga(client, journal).execute('order-1', StockSaga.build_steps(items, sign=-1))
+
+        assert result['success'] is True
+        assert sorted(calls) == [('p1', -3), ('p2', -1)]
+        assert journal.status(result['saga_id']) == SAGA_COMPLETED
+
+    def test_failure_compensates_applied_steps(self, tmp_path):
+        """Test que al fallar un paso se reponen los descuentos ya aplicados con el signo contrario"""
+        client, calls = _content_client(failing={'p3'})
+        journal = StockSagaJournal(str(tmp_path / 'saga.db'))
+        steps = [('p1', -2), ('p2', -1), ('p3', -4)]
+
+        result = StockSaga(client, journal, max_concurrency=3).execute('order-1', steps)
+
+        assert result['success'] is False
+        assert result['compensated'] is True
+        assert ('p1', 2) in calls and ('p2', 1) in calls
+        assert ('p3', 4) not in calls # El paso fallido no se compensa
+        assert journal.status(result['saga_id']) == SAGA_COMPENSATED
+
+    def test_recover_compensates_abandoned_saga(self, tmp_path):
+        """Test que al reiniciar se compensan los pasos aplicados de una saga abandonada"""
+        journal = StockSagaJournal(str(tmp_path / 'saga.db'))
+        journal.begin('saga-1', 'order-1', [('p1', -2), ('p2', -1)])
+        journal.mark_step('saga-1', 'p1', 'applied')
+
+        client, calls = _content_client()
+        recovered = StockSaga(client, journal, stale_after=0).recover()
+
+        assert recovered == 1
+        assert calls == [('p1', 2)]
+        steps = {step['product_id']: step['status'] for step in journal.steps('saga-1')}
+        assert steps == {'p1': STEP_COMPENSATED, 'p2': STEP_UNKNOWN}
+        assert journal.status('saga-1') == SAGA_NEEDS_REPAIR # p2 queda para revisión manual
+
+    @patch('clients.base_client.requests.Session.request')
+    @patch('auth.token_manager.KeycloakService')
+    def test_timed_out_step_is_unknown_not_failed(self, mock_keycloak_class, mock_request, tmp_path):
+        """Test que un PATCH sin respuesta (timeout) no se da por fallido: no se compensa y queda para revisión"""
+        mock_keycloak_class.return_value.get_token_data.return_value = {'access_token': 'mock-token', 'expires_in': 300}
+        app = Mock()
+        app.config = {'CONTENT_SERVICE_URL': 'http://content-service'}
+
+        def request(method, url, **kwargs):
+            if url.endswith('/p2/stock') and kwargs['params']['newStock'] < 0:
+                raise requests.Timeout('Read timed out')
+            response = Mock()
+            response.status_code = 200
+            response.json.return_value = {}
+            return response
+        mock_request.side_effect = request
+
+        journal = StockSagaJournal(str(tmp_path / 'saga.db'))
+        result = StockSaga(ContentClient(app), journal, max_concurrency=1).execute('order-1', [('p1', -2), ('p2', -1)])
+
+        assert result['success'] is False
+        assert result['details'][1]['outcome_unknown'] is True
+        patched = [(call.kwargs['url'].rsplit('/', 2)[1], call.kwargs['params']['newStock']) for call in mock_request.call_args_list]
+        assert patched == [('p1', -2), ('p2', -1), ('p1', 2)] # Solo se repone p1; p2 no se toca a ciegas
+        steps = {step['product_id']: step['status'] for step in journal.steps(result['saga_id'])}
+        assert steps == {'p1': STEP_COMPENSATED, 'p2': STEP_UNKNOWN}
+        assert journal.status(result['saga_id']) == SAGA_NEEDS_REPAIR
+        assert [(entry['order_id'], entry['product_id'], entry['delta']) for entry in journal.needs_repair()] == [('order-1', 'p2', -1)]
+
+    def test_recover_detects_dead_owner_with_reused_pid(self, tmp_path):
+        """Test que una saga de un proceso anterior con el mismo PID (reinicio del contenedor) se recupera sin esperar"""
+        journal = StockSagaJournal(str(tmp_path / 'saga.db'))
+        journal.begin('saga-1', 'order-1', [('p1', -2)])
+        journal.mark_step('saga-1', 'p1', 'applied')
+        journal.begin('saga-2', 'order-2', [('p2', -1)]) # De este mismo proceso: sigue en curso
+        journal._connection().execute("UPDATE stock_sagas SET owner_token = 'boot-anterior' WHERE saga_id = 'saga-1'")
+
+        client, calls = _content_client()
+        recovered = StockSaga(client, journal, stale_after=300).recover()
+
+        assert recovered == 1
+        assert calls == [('p1', 2)]
+        assert journal.status('saga-1') == SAGA_COMPENSATED
+        assert journal.status('saga-2') == SAGA_RUNNING
+
+    def test_progressing_saga_is_not_taken_over(self, tmp_path):
+        """Test que cada paso anotado renueva la saga y otro worker no la compensa mientras su dueño avanza"""
+        journal = StockSagaJournal(str(tmp_path / 'saga.db'))
+        journal.begin('saga-1', 'order-1', [('p1', -2), ('p2', -1)])
+        journal._connection().execute("UPDATE stock_sagas SET updated_at = 0 WHERE saga_id = 'saga-1'")
+        journal.mark_step('saga-1', 'p1', 'applied') # El dueño sigue aplicando pasos
+
+        client, calls = _content_client()
+        recovered = StockSaga(client, journal, stale_after=300).recover()
+
+        assert recovered == 0
+        assert calls == []
+        assert journal.status('saga-1') == SAGA_RUNNING
+
+    def test_periodic_recovery_prunes_finished_sagas(self, tmp_path):
+        """Test que la pasada periódica borra las sagas terminadas antiguas y conserva las que esperan reparación"""
+        journal = StockSagaJournal(str(tmp_path / 'saga.db'))
+        for saga_id, status in [('old', SAGA_COMPLETED), ('repair', SAGA_NEEDS_REPAIR), ('recent', SAGA_COMPLETED)]:
+            journal.begin(saga_id, f'order-{saga_id}', [('p1', -1)])
+            journal.set_status(saga_id, status)
+        journal._connection().execute("UPDATE stock_sagas SET updated_at = 0 WHERE saga_id IN ('old', 'repair')")
+
+        client, _ = _content_client()
+        recovery = StockSagaRecovery(StockSaga(client, journal), retention=3600)
+        recovery.run_once()
+
+        assert journal.status('old') is None
+        assert journal.steps('old') == []
+        assert journal.status('repair') == SAGA_NEEDS_REPAIR
+        assert journal.status('recent') == SAGA_COMPLETED
+        assert recovery.stats()['pruned'] == 1
@@ -0,0 +1,91 @@
+import time
+from threading import Thread, Event
+from unittest.mock import Mock
+from auth.token_manager import ServiceTokenManager
+
+
+class TestServiceTokenManager:
+
+    def test_token_cached_until_expiry(self):
+        """Test que el token se reutiliza mientras no caduca"""
+        mock_keycloak = Mock()
+        mock_keycloak.get_token_data.return_value = {'access_token': 'token-1', 'expires_in': 300}
+
+        manager = ServiceTokenManager(mock_keycloak, 'orders', 'secret')
+        try:
+            assert manager.get_token() == 'token-1'
+            assert manager.get_token() == 'token-1'
+            assert mock_keycloak.get_token_data.call_count == 1
+            assert manager.stats()['refreshes'] == 1
+        finally:
+            manager.shutdown()
+
+    def test_expired_token_is_renewed(self):
+        """Test que un token caducado se renueva antes de usarse"""
+        mock_keycloak = Mock()
+        mock_keycloak.get_token_data.side_effect = [
+            {'access_token': 'token-1', 'expires_in': 1},
+            {'access_token': 'token-2', 'expires_in': 300}
+        ]
+
+        manager = ServiceTokenManager(mock_keycloak, 'orders', 'secret')
+        try:
+            # expires_in menor que el margen de seguridad -> no es reutilizable
+            assert manager.get_token() == 'token-1'
+            assert manager.get_token() == 'token-2'
+        finally:
+            manager.shutdown()
+
+    def test_concurrent_requests_single_keycloak_call(self):
+        """Test que una ráfaga de peticiones provoca una única llamada a Keycloak"""
+        release = Event()
+
+        def slow_token(client_id, client_secret):
+            release.wait(2)
+            return {'access_token': 'token-1', 'expires_in': 300}
+
+        mock_keycloak = Mock()
+        mock_keycloak.get_token_data.side_effect = slow_token
+
+        manager = ServiceTokenManager(mock_keycloak, 'orders', 'secret')
+        results = []
+        threads = [Thread(target=lambda: results.append(manager.get_token())) for _ in range(10)]
+        try:
+            for thread in threads:
+                thread.start()
+            time.sleep(0.1)
+            release.set()
+            for thread in threads:
+                thread.join()
+
+            assert results == ['token-1'] * 10
+            assert mock_keycloak.get_token_data.call_count == 1
+        finally:
+            manager.shutdown()
+
+    def test_force_refresh_skips_already_renewed_token(self):
+        """Test que un 401 con un token ya sustituido no vuelve a llamar a Keycloak"""
+        mock_keycloak = Mock()
+        mock_keycloak.get_token_data.side_effect = [
+            {'access_token': 'token-1', 'expires_in': 300},
+            {'access_token': 'token-2', 'expires_in': 300}
+        ]
+
+        manager = ServiceTokenManager(mock_keycloak, 'orders', 'secret')
+        try:
+            manager.get_token()
+            assert manager.force_refresh('token-1') == 'token-2'
+            assert manager.force_refresh('token-1') == 'token-2'
+            assert mock_keycloak.get_token_data.call_count == 2
+        finally:
+            manager.shutdown()
+
+    def test_init_client_fails_without_service_secret(self):
+        """Test que el arranque falla con un error claro si falta el secreto del cliente de servicio"""
+        import pytest
+        from clients import init_client
+
+        mock_app = Mock()
+        mock_app.config = {'KEYCLOAK_SERVICE_CLIENT_SECRET': ''}
+        with pytest.raises(RuntimeError, match='KEYCLOAK_SERVICE_CLIENT_SECRET'):
+            init_client(mock_app)
@@ -5,15 +5,15 @@ from clients.user_client import UserClient
 
 class TestUserClient:
 
-    @patch('clients.base_client.requests.request')
-    @patch('clients.base_client.KeycloakService')
+    @patch('clients.base_client.requests.Session.request')
+    @patch('auth.token_manager.KeycloakService')
     def test_get_seller_by_username_success(self, mock_keycloak_class, mock_request):
         """Test obtener vendedor exitosamente"""
         mock_app = Mock()
         mock_app.config = {'USERS_SERVICE_URL': 'http://users-service:5001'}
         
         mock_keycloak = Mock()
-        mock_keycloak._get_token.return_value = "mock-jwt-token"
+        mock_keycloak.get_token_data.return_value = {'access_token': "mock-jwt-token", 'expires_in': 300}
         mock_keycloak_class.return_value = mock_keycloak
         
         mock_response = Mock()
@@ -32,15 +32,15 @@ class TestUserClient:
         assert result['username'] == "test_user"
         assert result['name'] == "Test User"
 
-    @patch('clients.base_client.requests.request')
-    @patch('clients.base_client.KeycloakService')
+    @patch('clients.base_client.requests.Session.request')
+    @patch('auth.token_manager.KeycloakService')
     def test_get_user_by_username_not_found(self, mock_keycloak_class, mock_request):
         """Test cuando usuario no existe"""
         mock_app = Mock()
         mock_app.config = {'USERS_SERVICE_URL': 'http://users-service:5001'}
         
         mock_keycloak = Mock()
-        mock_keycloak._get_token.return_value = "mock-jwt-token"
+        mock_keycloak.get_token_data.return_value = {'access_token': "mock-jwt-token", 'expires_in': 300}
         mock_keycloak_class.return_value = mock_keycloak
         
         mock_response = Mock()
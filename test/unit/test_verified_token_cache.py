@@ -0,0 +1,54 @@
+import time
+from unittest.mock import patch
+from flask import Flask, jsonify, request
+from auth.verified_token_cache import VerifiedTokenCache
+from decorator.tokenDecorator import token_required
+
+
+def _app():
+    app = Flask(__name__)
+    app.config['TESTING'] = True
+
+    @app.route('/artist')
+    @token_required(roles=['artist'])
+    def artist_only():
+        return jsonify(request.user_claims)
+
+    @app.route('/internal')
+    @token_required(roles=['internal_service'])
+    def internal_only():
+        return jsonify(request.user_claims)
+
+    return app
+
+
+class TestVerifiedTokenCache:
+
+    def test_entry_never_outlives_token_exp(self):
+        """Test que la entrada caduca con el exp del token aunque max_ttl sea mayor"""
+        now = [1000.0]
+        cache = VerifiedTokenCache(max_ttl=300, clock=lambda: now[0])
+
+        cache.put('token-a', {'username': 'ana', 'exp': 1010})
+        cache.put('token-b', {'username': 'bruno', 'exp': 990})
+
+        assert cache.get('token-a')['username'] == 'ana'
+        assert cache.get('token-b') is None # Ya caducado: no se cachea
+
+    @patch('decorator.tokenDecorator.get_public_key', return_value='public-key')
+    @patch('decorator.tokenDecorator.jwt.decode')
+    def test_token_is_verified_once_and_roles_checked_per_endpoint(self, mock_decode, mock_key):
+        """Test que el mismo token se verifica una vez y cada endpoint sigue comprobando sus roles"""
+        mock_decode.return_value = {'username': 'ana', 'roles': ['artist'], 'exp': time.time() + 600}
+        client = _app().test_client()
+        headers = {'Authorization': 'Bearer token-ana'}
+
+        assert client.get('/artist', headers=headers).status_code == 200
+        assert client.get('/artist', headers=headers).json['username'] == 'ana'
+        assert client.get('/internal', headers=headers).status_code == 401
+
+        assert mock_decode.call_count == 1
+        from auth.verified_token_cache import get_verified_token_cache
+        stats = get_verified_token_cache(_app()).stats()
+        assert stats['verifications'] == 1
+        assert stats['hits'] == 2